@@ -0,0 +1,102 @@
+import asyncio
+
+from django.conf import settings
+
+
+def get_notification_group_name(user_id):
+    return str(user_id) + "__notifications"
+
+
+class TypingThrottle:
+    """
+    This sends the typing state of a connection only once it changed and at most every CHAT_TYPING_INTERVAL seconds,
+    the states received meanwhile are coalesced into the last one which is sent once the interval is over
+    """
+
+    def __init__(self, publish):
+        #  the coroutine function which sends the typing state to the conversation
+        self.publish = publish
+        #  the user is not typing when he connects
+        self.state = False
+        self.sent_at = None
+        self.pending = None
+        self.timer = None
+        #  the flushes started by the timer, kept so they are not garbage collected before they are done
+        self.flushes = set()
+
+    async def update(self, typing):
+        interval = settings.CHAT_TYPING_INTERVAL
+        if interval <= 0:
+            await self.publish(typing)
+            return
+        if self.timer is None and typing == self.state:
+            return
+        self.pending = typing
+        if self.timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+        wait = 0 if self.sent_at is None else self.sent_at + interval - loop.time()
+        if wait <= 0:
+            await self.flush()
+        else:
+            self.timer = loop.call_later(wait, self.start_flush)
+
+    def start_flush(self):
+        flush = asyncio.ensure_future(self.flush())
+        self.flushes.add(flush)
+        flush.add_done_callback(self.flushes.discard)
+
+    async def flush(self):
+        self.timer = None
+        typing, self.pending = self.pending, None
+        if typing is None or typing == self.state:
+            return
+        self.state = typing
+        self.sent_at = asyncio.get_running_loop().time()
+        await self.publish(typing)
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+class UnreadCountDebouncer:
+    """
+    This sends the unread counts of a user to his notifications CHAT_UNREAD_COUNT_DEBOUNCE seconds after the first
+    of a burst, with the last total and the last count of every conversation received meanwhile.
+    it is kept by the process, so the counts of a user sent from every consumer of the worker are coalesced
+    """
+
+    def __init__(self):
+        #  user id -> the unread_count event waiting to be sent
+        self.pending = {}
+        self.publishes = set()
+
+    async def send(self, channel_layer, user_id, unread_count, conversations):
+        delay = settings.CHAT_UNREAD_COUNT_DEBOUNCE
+        event = {"type": "unread_count", "unread_count": unread_count, "conversations": dict(conversations)}
+        if delay <= 0:
+            await channel_layer.group_send(get_notification_group_name(user_id), event)
+            return
+        user_id = str(user_id)
+        if user_id in self.pending:
+            self.pending[user_id]["unread_count"] = unread_count
+            self.pending[user_id]["conversations"].update(conversations)
+            return
+        self.pending[user_id] = event
+        asyncio.get_running_loop().call_later(delay, self.publish, channel_layer, user_id)
+
+    def publish(self, channel_layer, user_id):
+        event = self.pending.pop(user_id, None)
+        if event is None:
+            return
+        publish = asyncio.ensure_future(channel_layer.group_send(get_notification_group_name(user_id), event))
+        self.publishes.add(publish)
+        publish.add_done_callback(self.publishes.discard)
+
+    def clear(self):
+        self.pending = {}
+
+
+unread_count_debouncer = UnreadCountDebouncer()
@@ -1,15 +1,32 @@
+import asyncio
+import base64
+import binascii
 import json
+import uuid
+from datetime import datetime
 from uuid import UUID
 
-from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from channels.generic.websocket import JsonWebsocketConsumer
-from chats.serializers import MessageSerializer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from chats.serializers import MessageSerializer, get_message_payload
 
+from chats.coalescing import TypingThrottle, unread_count_debouncer
 from chats.models import Conversation, Message
+from chats.presence import get_chat_presence
+from chats.unread import get_user_unread_counts, increment_unread_count, mark_conversation_read
+from chats.write_behind import get_message_write_behind
+from users.serializers import UserSerializer
 
 User = get_user_model()
 
+#  the number of messages sent on connect and for every load_before
+MESSAGE_HISTORY_SIZE = 10
+
 
 # Note: You might notice we are always converting the user.id to string
 # and that is because the user.id is a UUID and  UUID cant be serialized
@@ -24,84 +41,125 @@ class UUIDEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-def get_or_create_conversation(user, name):
+def get_or_create_conversation(name):
     """
-    :param user: The logged-in user
     :param name: user1_id__user2__id
     :return: conversation
+    the conversation is found by the sorted ids of its users, so user2__id__user1_id is the same conversation
     """
-    #  filter base on the conversation
-    conversation = Conversation.objects.filter(name=name)
-    if conversation.exists():
-        #  this returns the conversation
-        return conversation.first()
-    user_ids = name.split("__")
-    #  Get all the user conversations in which the logged-in user is in the conversation
-    user_conversation_qs = Conversation.objects.filter(name__icontains=str(user.id))
-    #  if the user conversation exists
-    if user_conversation_qs.exists():
-        for user_id in user_ids:
-            # use the order user id
-            if user_id != str(user.id):
-                conversation_qs = user_conversation_qs.filter(name__icontains=user_id)
-                if conversation_qs.exists():
-                    return conversation_qs.first()
-    else:
-        # if the conversation does not exist from the above then we create a new one
-        conversation, created = Conversation.objects.get_or_create(name=name)
-        return conversation
-
-
-class ChatConsumer(JsonWebsocketConsumer):
+    conversation, created = Conversation.objects.get_or_create_for_participants(name.split("__"))
+    return conversation
+
+
+def get_message_content_error(content):
+    """
+    This returns why the content of a chat message can't be saved or None,
+    it is checked before the message is broadcast since a message of the write behind is saved later
+    """
+    try:
+        Message._meta.get_field("content").clean(content, None)
+    except ValidationError as error:
+        return " ".join(error.messages)
+    return None
+
+
+def encode_message_cursor(message):
+    return base64.urlsafe_b64encode(f"{message.timestamp.isoformat()}|{message.id}".encode()).decode()
+
+
+def decode_message_cursor(cursor):
+    """returns the (timestamp, id) of the cursor or raises a ValueError, a naive timestamp is invalid like it is in REST"""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        timestamp, message_id = datetime.fromisoformat(timestamp), UUID(message_id)
+    except (AttributeError, TypeError, binascii.Error) as exception:
+        raise ValueError("Invalid cursor") from exception
+    if timezone.is_naive(timestamp):
+        raise ValueError("Invalid cursor")
+    return timestamp, message_id
+
+
+def get_message_history(conversation, cursor=None):
+    """
+    This returns the newest messages of the conversation sent before the cursor with the cursor of the next page.
+    the messages are filtered on (timestamp, id) with the (conversation, timestamp, id) index,
+    so every page costs the same and one more message is fetched instead of counting the messages
+    """
+    messages = conversation.messages.select_related("conversation", "from_user", "to_user").order_by(
+        "-timestamp", "-id")
+    if cursor is not None:
+        timestamp, message_id = decode_message_cursor(cursor)
+        messages = messages.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+    messages = list(messages[:MESSAGE_HISTORY_SIZE + 1])
+    has_more = len(messages) > MESSAGE_HISTORY_SIZE
+    messages = messages[:MESSAGE_HISTORY_SIZE]
+    return {
+        "messages": MessageSerializer(messages, many=True).data,
+        "has_more": has_more,
+        "cursor": encode_message_cursor(messages[-1]) if has_more else None,
+    }
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
     """
     This consumer is used to show user's online status,
     and send notifications.
+    the database work of every event is done in one database_sync_to_async call, so the event loop of the worker
+    is not blocked and the connections are not capped by the threads of the worker
     """
 
     def __init__(self, *args, **kwargs):
-        super().__init__(args, kwargs)
+        super().__init__(*args, **kwargs)
         self.user = None
         self.conversation_name = None
         self.conversation = None
-
-    def connect(self):
+        self.receiver = None
+        #  the sender and receiver serialized once per connection for the messages sent
+        self.user_snippets = None
+        self.heartbeat = None
+        #  the tasks waiting for the messages of the write behind to be saved
+        self.confirmations = set()
+        self.typing_throttle = TypingThrottle(self.send_typing)
+
+    async def connect(self):
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
+            #  the handshake is rejected instead of left waiting
+            await self.close()
             return
 
-        self.accept()
+        await self.accept()
         self.conversation_name = (
             f"{self.scope['url_route']['kwargs']['conversation_name']}"
         )
-        # validate the conversation name
-        user_ids = self.conversation_name.split("__")
-        #  in here I split the conversation name which is user1_id__user2__id
-        # then I check if the ids exists
-        for user_id in user_ids:
-            user = User.objects.filter(id=user_id)
-            if not user.exists():
-                self.disconnect(code=1014)
-
-        # the get the conversation with the user id passed in the url which is user_id__other_user_id
-        self.conversation = get_or_create_conversation(self.user, str(self.conversation_name))
+        history = await self.join_conversation()
+        if history is None:
+            #  one of the users of the conversation name doesn't exist
+            await self.close(code=1014)
+            return
         # update the conversation name if the user_id is user2__id__user1__id
         self.conversation_name = str(self.conversation.name)
+        presence = get_chat_presence()
+        online_user_ids = await presence.get_online_users(self.conversation.id)
+        # add the current user online users
+        await presence.join(self.conversation.id, self.user.id, self.channel_name)
+        self.heartbeat = asyncio.ensure_future(self.keep_online())
 
         # set the channel name
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             str(self.conversation_name),
             self.channel_name,
         )
         # show list of online users
-        self.send_json(
+        await self.send_json(
             {
                 "type": "online_user_list",
-                "users": [str(user.id) for user in self.conversation.online.all()],
+                "users": online_user_ids,
             }
         )
 
         # send and event to every one on this conversation that this logged-in user just join
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             str(self.conversation_name),
             {
                 "type": "user_join",
@@ -109,182 +167,291 @@ class ChatConsumer(JsonWebsocketConsumer):
             },
         )
 
-        # add the current user online users
-        self.conversation.online.add(self.user)
-
-        #  this shows the last ten message on the conversation
-        messages = self.conversation.messages.all().order_by("-timestamp")[0:10]
-        message_count = self.conversation.messages.all().count()
-        self.send_json(
+        #  this shows the last ten message on the conversation, the older ones are loaded with load_before
+        await self.send_json(
             {
                 "type": "last_50_messages",
-                "messages": MessageSerializer(messages, many=True).data,
-                "has_more": message_count > 5,
+                **history,
             }
         )
 
-    def disconnect(self, code):
+    @database_sync_to_async
+    def join_conversation(self):
+        """
+        This gets or creates the conversation and returns its last messages,
+        or None if one of the users of the conversation name doesn't exist
+        """
+        # validate the conversation name
+        #  in here I split the conversation name which is user1_id__user2__id
+        # then I check if the ids exists
+        user_ids = set(self.conversation_name.split("__"))
+        try:
+            users = {str(user.id): user for user in User.objects.filter(id__in=user_ids)}
+        except ValidationError:
+            return None
+        if len(users) != len(user_ids):
+            return None
+
+        # the get the conversation with the user id passed in the url which is user_id__other_user_id
+        self.conversation = get_or_create_conversation(str(self.conversation_name))
+        #  the receiver of the messages sent by the user is loaded once
+        self.receiver = self.get_receiver(users)
+        self.user_snippets = (UserSerializer(self.user).data, UserSerializer(self.receiver).data)
+        return get_message_history(self.conversation)
+
+    async def keep_online(self):
+        """this refreshes the presence of the connection before it expires until the user disconnects"""
+        presence = get_chat_presence()
+        while True:
+            await asyncio.sleep(settings.CHAT_PRESENCE_TTL / 3)
+            await presence.join(self.conversation.id, self.user.id, self.channel_name)
+
+    async def disconnect(self, code):
         # Check if the users is authenticated and if he is  then I remove the user
         # from online users in the Conversation
-        if self.user.is_authenticated:
+        if self.user.is_authenticated and self.conversation is not None:
+            await self.channel_layer.group_discard(str(self.conversation_name), self.channel_name)
+            if self.heartbeat:
+                self.heartbeat.cancel()
+            self.typing_throttle.cancel()
+            if self.confirmations:
+                #  the messages of the connection waiting for their batch are saved before it closes
+                await get_message_write_behind().drain()
             # send the leave event to the room
-            self.conversation.online.remove(self.user)
-            async_to_sync(self.channel_layer.group_send)(
+            await get_chat_presence().leave(self.conversation.id, self.user.id, self.channel_name)
+            await self.channel_layer.group_send(
                 str(self.conversation_name),
                 {
                     "type": "user_leave",
                     "user_id": str(self.user.id),
                 },
             )
-        return super().disconnect(code)
+        return await super().disconnect(code)
 
-    def get_receiver(self):
+    def get_receiver(self, users):
         #  it uses the id's in the conversation_name to get the receiver id
-        user_ids = self.conversation_name.split("__")
+        user_ids = str(self.conversation.name).split("__")
         for user_id in user_ids:
             if user_id != str(self.user.id):
                 # This is the receiver
-                return User.objects.get(id=user_id)
+                return users.get(user_id) or User.objects.get(id=user_id)
 
-    def receive_json(self, content, **kwargs):
+    async def receive_json(self, content, **kwargs):
         #  this receives json is used to receive any echo from the front end
         message_type = content["type"]
 
         if message_type == "read_messages":
             # the is used to read all messages by the receiver
-            messages_to_me = self.conversation.messages.filter(to_user=self.user)
-            messages_to_me.update(read=True)
-
-            # Update the unread message count
-            unread_count = Message.objects.filter(to_user=self.user, read=False).count()
-            async_to_sync(self.channel_layer.group_send)(
-                str(self.user.id) + "__notifications",
-                {
-                    "type": "unread_count",
-                    "unread_count": unread_count,
-                },
-            )
+            unread_count = await database_sync_to_async(mark_conversation_read)(self.user.id, self.conversation.id)
+            await unread_count_debouncer.send(
+                self.channel_layer, self.user.id, unread_count, {str(self.conversation.id): 0})
+
+        if message_type == "load_before":
+            #  this loads the messages older than the cursor sent with the previous messages
+            try:
+                history = await database_sync_to_async(get_message_history)(self.conversation, content["cursor"])
+            except (KeyError, ValueError):
+                history = None
+            if history is None:
+                await self.send_json({"type": "error", "message": "Invalid cursor"})
+            else:
+                await self.send_json({"type": "load_before", **history})
 
         if message_type == "typing":
-            #  this is to let the other user knows you are typing
-            async_to_sync(self.channel_layer.group_send)(
+            #  this is to let the other user knows you are typing, only the changes are sent
+            await self.typing_throttle.update(content["typing"])
+
+        if message_type == "chat_message":
+            #  this is used to create message
+            error = get_message_content_error(content["message"])
+            if error:
+                await self.send_json({"type": "error", "message": error})
+            elif settings.CHAT_WRITE_BEHIND:
+                #  the message is broadcast right away and the sender is told once its batch is saved
+                message = self.build_message(content["message"])
+                saved = get_message_write_behind().add(message)
+                await self.broadcast_message(get_message_payload(message, *self.user_snippets))
+                confirmation = asyncio.ensure_future(self.confirm_message(str(message.id), saved))
+                self.confirmations.add(confirmation)
+                confirmation.add_done_callback(self.confirmations.discard)
+            else:
+                message, *unread_counts = await self.create_message(content["message"])
+                await self.broadcast_message(message, unread_counts)
+        if message_type == "is_online":
+            # this returns boolean base on the other user online status
+            # this check if the logged-in user count is greater than one the .it shows the other user is not online
+            # because right now if it is only one that means the online user is 1
+            online_user_ids = await get_chat_presence().get_online_users(self.conversation.id)
+            await self.channel_layer.group_send(
                 str(self.conversation_name),
                 {
-                    "type": "typing",
-                    "user_id": str(self.user.id),
-                    "typing": content["typing"],
+                    "type": "is_online",
+                    "is_online": len(online_user_ids) > 1,
                 },
             )
 
-        if message_type == "chat_message":
-            #  this is used to create message
-            message = Message.objects.create(
-                from_user=self.user,
-                to_user=self.get_receiver(),
-                content=content["message"],
-                conversation=self.conversation,
-            )
+        return await super().receive_json(content, **kwargs)
+
+    @database_sync_to_async
+    def create_message(self, content):
+        """
+        This saves the message with a single INSERT and returns its payload built from the cached users
+        with the unread messages of the receiver in total and in the conversation
+        """
+        message = Message.objects.create(
+            id=uuid.uuid4(),
+            from_user=self.user,
+            to_user=self.receiver,
+            content=content,
+            conversation=self.conversation,
+        )
+        return (get_message_payload(message, *self.user_snippets),
+                *increment_unread_count(self.receiver.id, self.conversation.id))
+
+    def build_message(self, content):
+        """this returns the message saved later by the write behind, its id and timestamp are set by the server"""
+        return Message(
+            id=uuid.uuid4(),
+            from_user=self.user,
+            to_user=self.receiver,
+            content=content,
+            conversation=self.conversation,
+        )
 
-            async_to_sync(self.channel_layer.group_send)(
+    async def broadcast_message(self, message, unread_counts=None):
+        """
+        This sends the message to the conversation and to the notifications of the receiver
+        with the unread messages of the receiver if they are known
+        """
+        # This is a path where the logged-in user could see all his or her
+        # notifications from message received
+        notification_group_name = str(self.receiver.id) + "__notifications"
+        events = [
+            self.channel_layer.group_send(
                 str(self.conversation_name),
                 {
                     "type": "chat_message_echo",
                     "user_id": str(self.user.id),
-                    "message": MessageSerializer(message).data,
+                    "message": message,
                 },
-            )
-
-            # This is a path where the logged-in user could see all his or her
-            # notifications from message received
-            notification_group_name = str(self.get_receiver().id) + "__notifications"
-            async_to_sync(self.channel_layer.group_send)(
+            ),
+            self.channel_layer.group_send(
                 notification_group_name,
                 {
                     "type": "new_message_notification",
                     "user_id": str(self.user.id),
-                    "message": MessageSerializer(message).data,
-                },
-            )
-        if message_type == "is_online":
-            # this returns boolean base on the other user online status
-            # this check if the logged-in user count is greater than one the .it shows the other user is not online
-            # because right now if it is only one that means the online user is 1
-            async_to_sync(self.channel_layer.group_send)(
-                str(self.conversation_name),
-                {
-                    "type": "is_online",
-                    "is_online": self.conversation.online.count() > 1,
+                    "message": message,
                 },
-            )
+            ),
+        ]
+        if unread_counts:
+            events.append(self.send_unread_count(*unread_counts))
+        await asyncio.gather(*events)
+
+    async def send_unread_count(self, unread_count, conversation_unread_count):
+        await unread_count_debouncer.send(
+            self.channel_layer, self.receiver.id, unread_count, {str(self.conversation.id): conversation_unread_count})
+
+    async def send_typing(self, typing):
+        await self.channel_layer.group_send(
+            str(self.conversation_name),
+            {
+                "type": "typing",
+                "user_id": str(self.user.id),
+                "typing": typing,
+            },
+        )
+
+    async def confirm_message(self, message_id, saved):
+        """
+        This waits for the batch of the message to be committed, then acks the message to the sender
+        and sends the new unread messages count to the receiver.
+        the ack goes through the channel layer, so it is dropped if the sender disconnected meanwhile
+        """
+        try:
+            unread_counts = await saved
+        except Exception:
+            await self.channel_layer.send(self.channel_name, {"type": "message_error", "id": message_id})
+            return
+        await asyncio.gather(
+            self.channel_layer.send(self.channel_name, {"type": "message_saved", "id": message_id}),
+            self.send_unread_count(*unread_counts),
+        )
+
+    async def chat_message_echo(self, event):
+        await self.send_json(event)
 
-        return super().receive_json(content, **kwargs)
+    async def user_join(self, event):
+        await self.send_json(event)
 
-    def chat_message_echo(self, event):
-        self.send_json(event)
+    async def user_leave(self, event):
+        await self.send_json(event)
 
-    def user_join(self, event):
-        self.send_json(event)
+    async def typing(self, event):
+        await self.send_json(event)
 
-    def user_leave(self, event):
-        self.send_json(event)
+    async def message_saved(self, event):
+        await self.send_json(event)
 
-    def typing(self, event):
-        self.send_json(event)
+    async def message_error(self, event):
+        await self.send_json(event)
 
-    def new_message_notification(self, event):
-        self.send_json(event)
+    async def new_message_notification(self, event):
+        await self.send_json(event)
 
-    def unread_count(self, event):
-        self.send_json(event)
+    async def unread_count(self, event):
+        await self.send_json(event)
 
-    def is_online(self, event):
-        self.send_json(event)
+    async def is_online(self, event):
+        await self.send_json(event)
 
     @classmethod
-    def encode_json(cls, content):
+    async def encode_json(cls, content):
         #  this  class method is created if you want to encode a json
         return json.dumps(content, cls=UUIDEncoder)
 
 
-class NotificationConsumer(JsonWebsocketConsumer):
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
     def __init__(self, *args, **kwargs):
-        super().__init__(args, kwargs)
+        super().__init__(*args, **kwargs)
         self.user = None
         self.notification_group_name = None
 
-    def connect(self):
+    async def connect(self):
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
+            #  the handshake is rejected instead of left waiting
+            await self.close()
             return
 
-        self.accept()
+        await self.accept()
 
         # private notification group
         self.notification_group_name = str(self.user.id) + "__notifications"
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.notification_group_name,
             self.channel_name,
         )
 
-        # Send count of unread messages
-        unread_count = Message.objects.filter(to_user=self.user, read=False).count()
-        self.send_json(
+        # Send count of unread messages in total and in every conversation
+        unread_counts = await database_sync_to_async(get_user_unread_counts)(self.user.id)
+        await self.send_json(
             {
                 "type": "unread_count",
-                "unread_count": unread_count,
+                **unread_counts,
             }
         )
 
-    def disconnect(self, code):
-        print("code ", code)
-        async_to_sync(self.channel_layer.group_discard)(
-            self.notification_group_name,
-            self.channel_name,
-        )
-        return super().disconnect(code)
+    async def disconnect(self, code):
+        if self.notification_group_name:
+            await self.channel_layer.group_discard(
+                self.notification_group_name,
+                self.channel_name,
+            )
+        return await super().disconnect(code)
 
-    def new_message_notification(self, event):
-        self.send_json(event)
+    async def new_message_notification(self, event):
+        await self.send_json(event)
 
-    def unread_count(self, event):
-        self.send_json(event)
+    async def unread_count(self, event):
+        await self.send_json(event)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chats.models import Conversation, ConversationParticipant, Message, get_participant_key
+
+
+class Command(BaseCommand):
+    help = "Set the participant key and the participants of the conversations created before they existed, " \
+           "the conversations of the same two users are merged into the first one backfilled"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backfilled = 0
+        merged = 0
+        while True:
+            #  the backfilled conversations leave the queryset, so every batch starts from the beginning
+            conversations = list(Conversation.objects.filter(participant_key__isnull=True).order_by("id").values_list(
+                "id", "name")[:options["batch_size"]])
+            if not conversations:
+                break
+            for conversation_id, name in conversations:
+                if self.backfill_conversation(conversation_id, name):
+                    backfilled += 1
+                else:
+                    merged += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {backfilled} conversations and merged {merged} duplicated conversations"))
+
+    def backfill_conversation(self, conversation_id, name):
+        """this returns False if the conversation was merged into the existing conversation of its users"""
+        participant_key = get_participant_key(name.split("__"))
+        with transaction.atomic():
+            existing = Conversation.objects.filter(participant_key=participant_key).first()
+            if existing:
+                Message.objects.filter(conversation_id=conversation_id).update(conversation=existing)
+                Conversation.objects.filter(id=conversation_id).delete()
+                return False
+            Conversation.objects.filter(id=conversation_id).update(participant_key=participant_key)
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(conversation_id=conversation_id, user_id=user_id)
+                for user_id in participant_key.split("__")
+            ], ignore_conflicts=True)
+        return True
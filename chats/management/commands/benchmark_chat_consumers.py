@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import Counter
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chats.models import Conversation, Message, get_participant_key
+from chats.routing import websocket_urlpatterns
+from users.models import User
+from users.utils import bulk_create_users
+
+
+class BenchmarkChannelLayer(InMemoryChannelLayer):
+    """
+    The in memory channel layer looks for expired messages in every channel and group on every send,
+    which costs more than the consumers once there are a thousand websockets.
+    nothing expires during the benchmark, so it is skipped to measure the consumers only.
+    it counts the events published by type, a group_send is one publish whatever the size of the group
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.publishes = Counter()
+
+    def _clean_expired(self):
+        pass
+
+    async def send(self, channel, message):
+        self.publishes[message["type"]] += 1
+        await super().send(channel, message)
+
+    async def group_send(self, group, message):
+        self.publishes[message["type"]] += 1
+        for channel in self.groups.get(group, set()):
+            try:
+                await super().send(channel, message)
+            except ChannelFull:
+                pass
+
+
+#  the benchmark measures the consumers of one worker, so the channel layer is kept in the process
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "chats.management.commands.benchmark_chat_consumers.BenchmarkChannelLayer"}}
+#  the seconds a websocket waits for an event before the benchmark fails
+RECEIVE_TIMEOUT = 120
+
+
+class Command(BaseCommand):
+    help = "Benchmark the concurrent websockets and the chat messages per second served by one worker " \
+           "with the chat consumer, the generated users, conversations and messages are deleted once it ends"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=100,
+                            help="The number of conversations, every conversation opens two websockets")
+        parser.add_argument("--messages", type=int, default=20, help="The number of messages sent per conversation")
+
+    def handle(self, *args, **options):
+        users = self.seed_users(options["conversations"] * 2)
+        pairs = [(users[index], users[index + 1]) for index in range(0, len(users), 2)]
+        try:
+            #  every typing event is sent, so the typing phase measures the consumer and not the throttle
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CHAT_TYPING_INTERVAL=0):
+                asyncio.run(self.run_benchmark(pairs, options["messages"]))
+        finally:
+            self.delete_seeded(users, pairs)
+
+    def seed_users(self, count):
+        return bulk_create_users(*["CUSTOMER"] * count, email_prefix="benchmark")
+
+    def delete_seeded(self, users, pairs):
+        """this deletes the users generated with their conversations and messages"""
+        Message.objects.filter(from_user__in=users).delete()
+        Conversation.objects.filter(participant_key__in=[
+            get_participant_key([sender.id, receiver.id]) for sender, receiver in pairs]).delete()
+        #  the users were created without their profiles, so nothing else refers to them
+        users = User.objects.filter(id__in=[user.id for user in users])
+        users._raw_delete(users.db)
+
+    async def run_benchmark(self, pairs, message_count):
+        application = URLRouter(websocket_urlpatterns)
+        start = time.perf_counter()
+        communicators = await asyncio.gather(*[
+            self.connect(application, user, f"{sender.id}__{receiver.id}")
+            for sender, receiver in pairs for user in (sender, receiver)
+        ])
+        connect_seconds = time.perf_counter() - start
+        self.stdout.write(f"Connected {len(communicators)} concurrent websockets in {connect_seconds:.2f}s "
+                          f"({len(communicators) / connect_seconds:.1f} connects/sec)")
+        total = len(pairs) * message_count
+        #  the typing events don't touch the database, so they measure the overhead of the consumer itself
+        for event_type, label in [("typing", "typing events"), ("chat_message", "messages")]:
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                self.exchange(communicators[index], communicators[index + 1], event_type, message_count)
+                for index in range(0, len(communicators), 2)
+            ])
+            seconds = time.perf_counter() - start
+            self.stdout.write(f"Delivered {total} {label} in {seconds:.2f}s ({total / seconds:.1f} {label}/sec)")
+        await asyncio.gather(*[communicator.disconnect(timeout=RECEIVE_TIMEOUT) for communicator in communicators])
+
+    async def connect(self, application, user, conversation_name):
+        communicator = WebsocketCommunicator(application, f"/chats/{conversation_name}/")
+        #  the user is set like the token middleware does
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect(timeout=RECEIVE_TIMEOUT)
+        assert connected, f"{user.id} could not connect"
+        await self.receive_event(communicator, "last_50_messages")
+        return communicator
+
+    async def exchange(self, sender, receiver, event_type, count):
+        """this sends the events of a conversation and waits until the other user received all of them"""
+        for number in range(count):
+            if event_type == "typing":
+                await sender.send_json_to({"type": "typing", "typing": number % 2 == 0})
+            else:
+                await sender.send_json_to({"type": "chat_message", "message": f"Benchmark message {number}"})
+        for _ in range(count):
+            await self.receive_event(receiver, "chat_message_echo" if event_type == "chat_message" else event_type)
+
+    async def receive_event(self, communicator, event_type):
+        #  the events of the other types like the users joining are skipped
+        while True:
+            event = await communicator.receive_json_from(timeout=RECEIVE_TIMEOUT)
+            if event["type"] == event_type:
+                return event
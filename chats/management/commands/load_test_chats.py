@@ -0,0 +1,257 @@
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+
+from chats.management.commands.benchmark_chat_consumers import (
+    Command as BenchmarkCommand, IN_MEMORY_CHANNEL_LAYERS, RECEIVE_TIMEOUT)
+from chats.coalescing import unread_count_debouncer
+from chats.routing import websocket_urlpatterns
+from chats.write_behind import get_message_write_behind
+
+EVENT_TYPES = ("chat_message", "typing", "read_messages")
+#  the share of every event sent by the users, most of a chat is typing and messages
+DEFAULT_MIX = "chat_message:40,typing:50,read_messages:10"
+#  a typing event is a user typing a few letters then stopping, the clients send a typing frame for every key
+TYPING_BURST = 5
+
+
+class QueryCounter:
+    """this counts the queries of the database connection it is added to"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+#  the consumers use the database from a single thread, so the counter is added to the connection of that thread
+@database_sync_to_async
+def start_counting(counter):
+    connection.execute_wrappers.append(counter)
+
+
+@database_sync_to_async
+def stop_counting(counter):
+    connection.execute_wrappers.remove(counter)
+
+
+def get_percentile(values, percent):
+    """returns the nearest rank percentile of the values"""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def get_latency_report(seconds):
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds),
+        "p50_ms": round(get_percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(get_percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+
+def parse_mix(mix):
+    """this returns the event types and their weights of a mix like chat_message:40,typing:50,read_messages:10"""
+    try:
+        weights = {event_type: float(weight) for event_type, weight in (
+            part.split(":") for part in mix.split(","))}
+    except ValueError:
+        raise CommandError(f"Invalid mix {mix}, it must look like {DEFAULT_MIX}")
+    unknown = set(weights) - set(EVENT_TYPES)
+    if unknown:
+        raise CommandError(f"Unknown event types {', '.join(sorted(unknown))}, use {', '.join(EVENT_TYPES)}")
+    if sum(weights.values()) <= 0:
+        raise CommandError("The weights of the mix must not all be 0")
+    return weights
+
+
+class Conversation:
+    """the chat and notification websockets of the two users of a conversation"""
+
+    def __init__(self, users, chats, notifications):
+        self.users = users
+        self.chats = chats
+        self.notifications = notifications
+
+
+class Command(BenchmarkCommand):
+    help = "Load test the chat and notification consumers of one worker with a mix of chat messages, typing " \
+           "and read messages and print the connects/sec, the fan-out latencies, the database queries " \
+           "and the channel layer publishes per event as json, " \
+           "the generated users, conversations and messages are deleted once it ends"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=100,
+                            help="The number of conversations, every conversation opens four websockets")
+        parser.add_argument("--events", type=int, default=50, help="The number of events sent per conversation")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="The weights of the events sent")
+        parser.add_argument("--seed", type=int, default=0, help="The seed of the events sent")
+        parser.add_argument("--output", help="The file the json report is written to instead of the output")
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options["mix"])
+        users = self.seed_users(options["conversations"] * 2)
+        pairs = [(users[index], users[index + 1]) for index in range(0, len(users), 2)]
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+                report = asyncio.run(self.run_load_test(pairs, options["events"], weights, options["seed"]))
+        finally:
+            self.delete_seeded(users, pairs)
+        report["config"] = {
+            "conversations": options["conversations"],
+            "events_per_conversation": options["events"],
+            "mix": weights,
+            "seed": options["seed"],
+            "write_behind": settings.CHAT_WRITE_BEHIND,
+            "typing_interval": settings.CHAT_TYPING_INTERVAL,
+            "unread_count_debounce": settings.CHAT_UNREAD_COUNT_DEBOUNCE,
+            "database": connection.vendor,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    async def run_load_test(self, pairs, event_count, weights, seed):
+        application = URLRouter(websocket_urlpatterns)
+        counter = QueryCounter()
+        await start_counting(counter)
+        start = time.perf_counter()
+        conversations = await asyncio.gather(*[self.open_conversation(application, pair) for pair in pairs])
+        connect_seconds = time.perf_counter() - start
+        connect_queries = counter.count
+        websocket_count = len(conversations) * 4
+
+        channel_layer = get_channel_layer()
+        latencies = defaultdict(list)
+        counter.count = 0
+        channel_layer.publishes.clear()
+        start = time.perf_counter()
+        #  every conversation sends its next event once the last one was delivered
+        await asyncio.gather(*[
+            self.drive(conversation, event_count, weights, random.Random(seed + number), latencies)
+            for number, conversation in enumerate(conversations)
+        ])
+        if settings.CHAT_WRITE_BEHIND:
+            await get_message_write_behind().drain()
+        events_seconds = time.perf_counter() - start
+        #  the typing states and unread counts held back by the coalescing are sent before they are counted
+        await asyncio.sleep(max(settings.CHAT_TYPING_INTERVAL, settings.CHAT_UNREAD_COUNT_DEBOUNCE))
+        await asyncio.gather(*unread_count_debouncer.publishes)
+        event_queries = counter.count
+        publishes = dict(channel_layer.publishes)
+        total = len(conversations) * event_count
+
+        #  the queries of every event type are counted alone once the load is over
+        queries_per_event_type = {}
+        for event_type in EVENT_TYPES:
+            counter.count = 0
+            await self.send_event(conversations[0], event_type, f"probe {event_type}", 0)
+            if settings.CHAT_WRITE_BEHIND:
+                await get_message_write_behind().drain()
+            queries_per_event_type[event_type] = counter.count
+        await stop_counting(counter)
+
+        await asyncio.gather(*[
+            websocket.disconnect(timeout=RECEIVE_TIMEOUT)
+            for conversation in conversations for websocket in conversation.chats + conversation.notifications
+        ])
+        return {
+            "connections": {
+                "websockets": websocket_count,
+                "seconds": round(connect_seconds, 3),
+                "connects_per_sec": round(websocket_count / connect_seconds, 1),
+                "db_queries_per_connect": round(connect_queries / websocket_count, 2),
+            },
+            "events": {
+                "count": total,
+                "seconds": round(events_seconds, 3),
+                "events_per_sec": round(total / events_seconds, 1),
+                "db_queries_per_event": round(event_queries / total, 2) if total else 0,
+                "db_queries_per_event_type": queries_per_event_type,
+            },
+            "channel_layer": {
+                "publishes": sum(publishes.values()),
+                "publishes_per_event": round(sum(publishes.values()) / total, 2) if total else 0,
+                "publishes_by_type": publishes,
+            },
+            "fan_out_latency": {label: get_latency_report(seconds) for label, seconds in latencies.items()},
+        }
+
+    async def open_conversation(self, application, pair):
+        chats, notifications = [], []
+        for user in pair:
+            chat = await self.connect(application, user, f"{pair[0].id}__{pair[1].id}")
+            notification = WebsocketCommunicator(application, "/notifications/")
+            notification.scope["user"] = user
+            connected, _ = await notification.connect(timeout=RECEIVE_TIMEOUT)
+            assert connected, f"{user.id} could not connect to the notifications"
+            await self.receive_event(notification, "unread_count")
+            chats.append(chat)
+            notifications.append(notification)
+        return Conversation(pair, chats, notifications)
+
+    async def drive(self, conversation, event_count, weights, rng, latencies):
+        for number in range(event_count):
+            event_type = rng.choices(list(weights), list(weights.values()))[0]
+            for label, seconds in (await self.send_event(
+                    conversation, event_type, f"Load test message {number}", rng.randrange(2))).items():
+                latencies[label].append(seconds)
+
+    async def send_event(self, conversation, event_type, content, side):
+        """
+        This sends the event from a user of the conversation and returns the seconds it took to reach
+        every websocket it goes to. the typing frames are not waited for since the unchanged ones are not sent
+        """
+        other = 1 - side
+        start = time.perf_counter()
+        if event_type == "chat_message":
+            await conversation.chats[side].send_json_to({"type": "chat_message", "message": content})
+            echo, _ = await asyncio.gather(
+                self.receive_matching(conversation.chats[other], lambda event: (
+                    event["type"] == "chat_message_echo" and event["message"]["content"] == content)),
+                self.receive_matching(conversation.notifications[other], lambda event: (
+                    event["type"] == "new_message_notification" and event["message"]["content"] == content)),
+            )
+            latencies = {"chat_message": time.perf_counter() - start}
+            if settings.CHAT_WRITE_BEHIND:
+                #  the unread counts of the message are sent before its ack
+                message_id = echo["message"]["id"]
+                await self.receive_matching(conversation.chats[side], lambda event: (
+                    event["type"] == "message_saved" and event["id"] == message_id))
+                latencies["message_saved"] = time.perf_counter() - start
+            return latencies
+        if event_type == "typing":
+            for number in range(TYPING_BURST):
+                await conversation.chats[side].send_json_to({"type": "typing", "typing": number < TYPING_BURST - 1})
+            return {}
+        #  the conversation of the user is the only one counted in the unread counts
+        await conversation.chats[side].send_json_to({"type": "read_messages"})
+        await self.receive_matching(conversation.notifications[side], lambda event: (
+            event["type"] == "unread_count" and 0 in event["conversations"].values()))
+        return {"read_messages": time.perf_counter() - start}
+
+    async def receive_matching(self, communicator, match):
+        #  the events sent to the websocket for the other events are skipped
+        while True:
+            event = await communicator.receive_json_from(timeout=RECEIVE_TIMEOUT)
+            if match(event):
+                return event
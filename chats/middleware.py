@@ -1,7 +1,12 @@
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.http import Http404
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import AuthenticationFailed
@@ -10,6 +15,72 @@ from rest_framework_simplejwt.tokens import AccessToken
 User = get_user_model()
 
 
+#  the fields of the user kept in the cache, the consumers only read the id and the names of the user
+USER_SNAPSHOT_FIELDS = ["id", "is_active", "first_name", "last_name"]
+
+
+def get_user_snapshot_key(user_id):
+    return f"chats:auth:user:{user_id}"
+
+
+class TokenUserCache:
+    """
+    This is a least recently used cache of the tokens already verified by the process -> (user id, expiry time),
+    so a token reconnecting isn't decoded and verified again. a token is dropped once it expires
+    and the least recently used tokens are dropped once there are max_size tokens
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.tokens = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.tokens.get(key)
+            if entry is None:
+                return None
+            user_id, expires = entry
+            if expires <= time.time():
+                del self.tokens[key]
+                return None
+            self.tokens.move_to_end(key)
+            return user_id
+
+    def set(self, key, user_id, expires):
+        with self.lock:
+            self.tokens[key] = (user_id, expires)
+            self.tokens.move_to_end(key)
+            while len(self.tokens) > self.max_size:
+                self.tokens.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+
+token_user_cache = TokenUserCache(settings.CHAT_AUTH_TOKEN_CACHE_SIZE)
+
+
+def get_cached_user(user_id):
+    """
+    This returns the user from the cache or the database for CHAT_AUTH_USER_CACHE_TIMEOUT seconds.
+    only a snapshot of USER_SNAPSHOT_FIELDS is cached (not the password hash) and the user is rebuilt from it,
+    so it is only read and never saved. the snapshot is deleted once the user is saved, deleted
+    or updated by a queryset so a deactivated user can't connect
+    """
+    key = get_user_snapshot_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = User.objects.filter(id=user_id).values(*USER_SNAPSHOT_FIELDS).get()
+        cache.set(key, snapshot, timeout=settings.CHAT_AUTH_USER_CACHE_TIMEOUT)
+    return User(**snapshot)
+
+
+def invalidate_cached_users(user_ids):
+    cache.delete_many([get_user_snapshot_key(user_id) for user_id in user_ids])
+
+
 class TokenAuthentication:
     """
     Simple token based authentication.
@@ -41,12 +112,16 @@ class TokenAuthentication:
         :param key:  the token key
         :return:
         """
-        token = AccessToken(token=key)
+        #  a token already verified by the process isn't decoded again until it expires
+        user_id = token_user_cache.get(key)
         try:
-            user_id = token.get("user_id")
-            if not user_id:
-                raise AuthenticationFailed("Invalid token")
-            user = User.objects.get(id=user_id)
+            if user_id is None:
+                token = AccessToken(token=key)
+                user_id = token.get("user_id")
+                if not user_id:
+                    raise AuthenticationFailed("Invalid token")
+                token_user_cache.set(key, user_id, token["exp"])
+            user = get_cached_user(user_id)
         except Exception as a:
             raise AuthenticationFailed(_("Invalid token."))
         if not user.is_active:
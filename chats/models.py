@@ -1,36 +1,80 @@
 import uuid
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from users.models import post_queryset_update
 
 User = get_user_model()
 
 
+def get_participant_key(user_ids):
+    """
+    This returns the key of the conversation between the users which is their sorted ids,
+    so user1_id__user2_id and user2_id__user1_id are the same conversation
+    """
+    return "__".join(sorted({str(user_id) for user_id in user_ids}))
+
+
+class ConversationManager(models.Manager):
+
+    def get_or_create_for_participants(self, user_ids):
+        """
+        This returns the conversation of the users found with the unique participant key
+        or creates it with its participants in one transaction
+        """
+        participant_key = get_participant_key(user_ids)
+        conversation = self.filter(participant_key=participant_key).first()
+        if conversation:
+            return conversation, False
+        try:
+            with transaction.atomic():
+                conversation = self.create(id=uuid.uuid4(), name=participant_key, participant_key=participant_key)
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation=conversation, user_id=user_id)
+                    for user_id in participant_key.split("__")
+                ])
+        except IntegrityError:
+            #  the other user created the conversation at the same time
+            return self.get(participant_key=participant_key), False
+        return conversation, True
+
+
 class Conversation(models.Model):
     """
     this is more of like a room where users contact each other .
     we use the user1_id__user2__id to create the name of the conversation
+    and the participant key which is the sorted ids to find the conversation of two users
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4(), editable=False)
     name = models.CharField(max_length=300)
-    online = models.ManyToManyField(to=User, blank=True)
+    #  null until the conversation is backfilled by the backfill_conversation_participants command
+    participant_key = models.CharField(max_length=300, unique=True, null=True, blank=True)
+
+    objects = ConversationManager()
+
+    def __str__(self):
+        return self.name
 
-    def get_online_count(self):
-        # shows the number of online users in this conversation
-        return self.online.count()
 
-    def join(self, user):
-        # add a user to the online user
-        self.online.add(user)
-        self.save()
+class ConversationParticipant(models.Model):
+    """the users of a conversation, so the conversations of a user are found with an index"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="participants")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversation_participants")
 
-    def leave(self, user):
-        #  remove the user once he is not connected
-        self.online.remove(user)
-        self.save()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["conversation", "user"], name="chats_participant_unique"),
+        ]
+        indexes = [
+            #  used by the conversations of a user
+            models.Index(fields=["user", "conversation"], name="chats_participant_user_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.name} ({self.get_online_count()})"
+        return f"{self.user_id} in {self.conversation_id}"
 
 
 class Message(models.Model):
@@ -48,8 +92,40 @@ class Message(models.Model):
         User, on_delete=models.CASCADE, related_name="messages_to_me"
     )
     content = models.CharField(max_length=512)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    #  the time is set when the message is built, so a message saved later by the write behind keeps it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            #  used by the unread messages count of a user
+            models.Index(fields=["to_user", "read"], name="chats_message_to_user_read_idx"),
+            #  used by the cursor pagination of the messages of a conversation on (timestamp, id)
+            models.Index(fields=["conversation", "-timestamp", "-id"], name="chats_message_conversation_idx"),
+        ]
+
     def __str__(self):
         return f"From {self.from_user.id} to {self.to_user.id}: {self.content} [{self.timestamp}]"
+
+
+def post_save_invalidate_cached_user(sender, instance, *args, **kwargs):
+    """
+    This deletes the user cached by the websocket authentication once the user is saved or deleted,
+    so a deactivated user can't connect with a token which didn't expire
+    """
+    from chats.middleware import invalidate_cached_users
+    invalidate_cached_users([instance.id])
+
+
+def post_update_invalidate_cached_users(sender, user_ids, *args, **kwargs):
+    """
+    This deletes the users cached by the websocket authentication once they are updated by a queryset
+    (e.g. deactivated by an admin action), which doesn't send post_save
+    """
+    from chats.middleware import invalidate_cached_users
+    invalidate_cached_users(user_ids)
+
+
+post_save.connect(post_save_invalidate_cached_user, sender=User)
+post_delete.connect(post_save_invalidate_cached_user, sender=User)
+post_queryset_update.connect(post_update_invalidate_cached_users, sender=User)
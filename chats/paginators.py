@@ -1,7 +1,8 @@
-from rest_framework.pagination import PageNumberPagination
+from instasaw_api.paginators import TimestampCursorPagination
 
 
-class MessagePagination(PageNumberPagination):
+class MessagePagination(TimestampCursorPagination):
+    """the messages of a conversation are paginated from the newest with the (conversation, timestamp, id) index"""
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
@@ -0,0 +1,117 @@
+import time
+
+from django.conf import settings
+
+
+def get_conversation_presence_key(conversation_id):
+    return f"chats:presence:conversation:{conversation_id}"
+
+
+def get_user_presence_key(user_id):
+    return f"chats:presence:user:{user_id}"
+
+
+def get_presence_member(user_id, connection_id):
+    #  a user is online in a conversation as long as one of his connections is
+    return f"{user_id}|{connection_id}"
+
+
+class InMemoryPresenceBackend:
+    """
+    This keeps the online users of the process in dicts of member -> expiry time,
+    it is used by the tests and locally when redis is not set
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.keys = {}
+
+    def get_members(self, key):
+        """returns the members of the key which didn't expire"""
+        now = time.time()
+        members = {member: expires for member, expires in self.keys.get(key, {}).items() if expires > now}
+        if members:
+            self.keys[key] = members
+        else:
+            self.keys.pop(key, None)
+        return members
+
+    async def join(self, conversation_id, user_id, connection_id):
+        expires = time.time() + self.ttl
+        self.keys.setdefault(get_conversation_presence_key(conversation_id), {})[
+            get_presence_member(user_id, connection_id)] = expires
+        self.keys.setdefault(get_user_presence_key(user_id), {})[connection_id] = expires
+
+    async def leave(self, conversation_id, user_id, connection_id):
+        self.keys.get(get_conversation_presence_key(conversation_id), {}).pop(
+            get_presence_member(user_id, connection_id), None)
+        self.keys.get(get_user_presence_key(user_id), {}).pop(connection_id, None)
+
+    async def get_online_users(self, conversation_id):
+        members = self.get_members(get_conversation_presence_key(conversation_id))
+        return sorted({member.split("|")[0] for member in members})
+
+    async def is_user_online(self, user_id):
+        return bool(self.get_members(get_user_presence_key(user_id)))
+
+    def clear(self):
+        self.keys = {}
+
+
+class RedisPresenceBackend:
+    """
+    This keeps the online users of every conversation and the connections of every user in redis sorted sets
+    scored by the time the entry expires. the consumers refresh their entries with a heartbeat,
+    so the entries of a worker which crashed expire by themselves and the keys expire once nobody is online
+    """
+
+    def __init__(self, url, ttl):
+        import redis.asyncio
+
+        self.ttl = ttl
+        self.redis = redis.asyncio.Redis.from_url(url, decode_responses=True)
+
+    async def join(self, conversation_id, user_id, connection_id):
+        expires = time.time() + self.ttl
+        conversation_key = get_conversation_presence_key(conversation_id)
+        user_key = get_user_presence_key(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(conversation_key, {get_presence_member(user_id, connection_id): expires})
+            pipe.expire(conversation_key, self.ttl)
+            pipe.zadd(user_key, {connection_id: expires})
+            pipe.expire(user_key, self.ttl)
+            await pipe.execute()
+
+    async def leave(self, conversation_id, user_id, connection_id):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(get_conversation_presence_key(conversation_id), get_presence_member(user_id, connection_id))
+            pipe.zrem(get_user_presence_key(user_id), connection_id)
+            await pipe.execute()
+
+    async def get_members(self, key):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, "-inf", time.time())
+            pipe.zrange(key, 0, -1)
+            _, members = await pipe.execute()
+        return members
+
+    async def get_online_users(self, conversation_id):
+        members = await self.get_members(get_conversation_presence_key(conversation_id))
+        return sorted({member.split("|")[0] for member in members})
+
+    async def is_user_online(self, user_id):
+        return bool(await self.get_members(get_user_presence_key(user_id)))
+
+
+_chat_presence = None
+
+
+def get_chat_presence():
+    """returns the presence backend of the process, redis if CHAT_PRESENCE_REDIS_URL is set"""
+    global _chat_presence
+    if _chat_presence is None:
+        if settings.CHAT_PRESENCE_REDIS_URL:
+            _chat_presence = RedisPresenceBackend(settings.CHAT_PRESENCE_REDIS_URL, settings.CHAT_PRESENCE_TTL)
+        else:
+            _chat_presence = InMemoryPresenceBackend(settings.CHAT_PRESENCE_TTL)
+    return _chat_presence
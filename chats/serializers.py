@@ -33,6 +33,26 @@ class MessageSerializer(serializers.ModelSerializer):
         return UserSerializer(obj.to_user).data
 
 
+#  the field used to format the timestamp of the messages like the MessageSerializer does
+MESSAGE_TIMESTAMP_FIELD = serializers.DateTimeField()
+
+
+def get_message_payload(message, from_user, to_user):
+    """
+    This returns the message like the MessageSerializer does with its users already serialized by UserSerializer,
+    so the chat consumers build the message once without loading its users and conversation
+    """
+    return {
+        "id": str(message.id),
+        "conversation": str(message.conversation_id),
+        "from_user": from_user,
+        "to_user": to_user,
+        "content": message.content,
+        "timestamp": MESSAGE_TIMESTAMP_FIELD.to_representation(message.timestamp),
+        "read": message.read,
+    }
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     other_user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
@@ -54,15 +74,13 @@ class ConversationSerializer(serializers.ModelSerializer):
 
     def get_other_user(self, obj):
         """
-        this enables getting the other user of a message using the id of the user from the
-        conversation name
+        this enables getting the other user of a message from the participants of the conversation
         :param obj:
         :return:
         """
-        user_ids = obj.name.split("__")
         context = {}
-        for user_id in user_ids:
-            if user_id != self.context["user"].id:
+        #  the participants are prefetched with their profiles by the view
+        for participant in obj.participants.all():
+            if participant.user_id != self.context["user"].id:
                 # This is the other participant
-                other_user = User.objects.get(id=user_id)
-                return UserProfileSerializer(other_user.user_profile, context=context).data
+                return UserProfileSerializer(participant.user.user_profile, context=context).data
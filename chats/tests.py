@@ -1,3 +1,493 @@
-from django.test import TestCase
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta
+from io import StringIO
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chats.coalescing import UnreadCountDebouncer, get_notification_group_name, unread_count_debouncer
+from chats.consumers import MESSAGE_HISTORY_SIZE, get_or_create_conversation
+from chats.middleware import TokenAuthentication, TokenUserCache, get_user_snapshot_key, token_user_cache
+from chats.models import Conversation, ConversationParticipant, Message
+from chats.presence import InMemoryPresenceBackend, get_chat_presence
+from chats.routing import websocket_urlpatterns
+from chats.serializers import MessageSerializer
+from chats.unread import (
+    get_unread_total_key, get_user_unread_counts, increment_unread_count, mark_conversation_read)
+from chats.write_behind import MessageWriteBehind, get_message_write_behind, save_messages
+from users.models import User, UserProfile
+from users.utils import bulk_create_users
+
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatConsumerTestCase(TransactionTestCase):
+    """This tests the message protocol of the chat and notification consumers"""
+
+    def setUp(self):
+        get_chat_presence().clear()
+        unread_count_debouncer.clear()
+        cache.clear()
+        self.application = URLRouter(websocket_urlpatterns)
+        self.sender, self.receiver = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.conversation_name = f"{self.sender.id}__{self.receiver.id}"
+
+    async def connect(self, path, user):
+        communicator = WebsocketCommunicator(self.application, path)
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def receive_events(self, communicator, count):
+        """this returns the next events received by type, the events sent through the groups come in any order"""
+        events = {}
+        for _ in range(count):
+            event = await communicator.receive_json_from()
+            events[event["type"]] = event
+        return events
+
+    async def test_chat_message(self):
+        sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+        self.assertEqual(await self.receive_events(sender, 3), {
+            "online_user_list": {"type": "online_user_list", "users": []},
+            "user_join": {"type": "user_join", "user_id": str(self.sender.id)},
+            "last_50_messages": {"type": "last_50_messages", "messages": [], "has_more": False, "cursor": None},
+        })
+        receiver = await self.connect(f"/chats/{self.conversation_name}/", self.receiver)
+        receiver_events = await self.receive_events(receiver, 3)
+        self.assertEqual(receiver_events["online_user_list"]["users"], [str(self.sender.id)])
+        self.assertEqual(await sender.receive_json_from(), {"type": "user_join", "user_id": str(self.receiver.id)})
+        notifications = await self.connect("/notifications/", self.receiver)
+        unread_count = await notifications.receive_json_from()
+        self.assertEqual(unread_count["unread_count"], 0)
+        conversation_id = list(unread_count["conversations"])[0]
+        self.assertEqual(unread_count["conversations"], {conversation_id: 0})
+
+        #  the message is saved with a single INSERT and its users are not loaded again,
+        #  the queries are captured from the thread the consumers use the database in
+        queries = await database_sync_to_async(lambda: CaptureQueriesContext(connections["default"]))()
+        await database_sync_to_async(queries.__enter__)()
+        await sender.send_json_to({"type": "chat_message", "message": "Hello"})
+        echo = await sender.receive_json_from()
+        await database_sync_to_async(queries.__exit__)(None, None, None)
+        self.assertEqual([query["sql"].split()[0] for query in queries.captured_queries], ["INSERT"])
+        self.assertEqual(echo["type"], "chat_message_echo")
+        self.assertEqual(echo["message"]["content"], "Hello")
+        self.assertEqual(await receiver.receive_json_from(), echo)
+        self.assertEqual(echo["message"]["to_user"]["id"], str(self.receiver.id))
+        notification_events = await self.receive_events(notifications, 2)
+        self.assertEqual(notification_events["new_message_notification"]["message"], echo["message"])
+        self.assertEqual(notification_events["unread_count"], {
+            "type": "unread_count", "unread_count": 1, "conversations": {conversation_id: 1}})
+        message = await database_sync_to_async(
+            Message.objects.select_related("conversation", "from_user", "to_user").get)(to_user=self.receiver)
+        self.assertEqual(echo["message"], MessageSerializer(message).data)
+
+        await sender.send_json_to({"type": "is_online"})
+        self.assertEqual(await sender.receive_json_from(), {"type": "is_online", "is_online": True})
+        self.assertEqual(await receiver.receive_json_from(), {"type": "is_online", "is_online": True})
+
+        #  the receiver reads the message and its notifications get the new unread count
+        await receiver.send_json_to({"type": "read_messages"})
+        self.assertEqual(await notifications.receive_json_from(), {
+            "type": "unread_count", "unread_count": 0, "conversations": {conversation_id: 0}})
+
+        await receiver.disconnect()
+        self.assertEqual(await sender.receive_json_from(), {"type": "user_leave", "user_id": str(self.receiver.id)})
+        await sender.send_json_to({"type": "is_online"})
+        self.assertEqual(await sender.receive_json_from(), {"type": "is_online", "is_online": False})
+        await sender.disconnect()
+        await notifications.disconnect()
+
+    @override_settings(CHAT_WRITE_BEHIND=True)
+    async def test_write_behind(self):
+        sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+        await self.receive_events(sender, 3)
+        notifications = await self.connect("/notifications/", self.receiver)
+        await notifications.receive_json_from()
+        #  the messages are broadcast before they are saved, then saved with one INSERT
+        queries = await database_sync_to_async(lambda: CaptureQueriesContext(connections["default"]))()
+        await database_sync_to_async(queries.__enter__)()
+        for number in range(3):
+            await sender.send_json_to({"type": "chat_message", "message": f"Message {number}"})
+        events = [await sender.receive_json_from() for _ in range(6)]
+        await database_sync_to_async(queries.__exit__)(None, None, None)
+        inserts = [query for query in queries.captured_queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        echoed_ids = [event["message"]["id"] for event in events if event["type"] == "chat_message_echo"]
+        saved_ids = [event["id"] for event in events if event["type"] == "message_saved"]
+        self.assertEqual(len(echoed_ids), 3)
+        self.assertEqual(sorted(saved_ids), sorted(echoed_ids))
+        messages = await database_sync_to_async(
+            lambda: list(Message.objects.select_related("conversation", "from_user", "to_user")))()
+        self.assertEqual(sorted(str(message.id) for message in messages), sorted(echoed_ids))
+        #  the message saved is the message broadcast
+        echo = next(event for event in events if event["type"] == "chat_message_echo")
+        message = next(message for message in messages if str(message.id) == echo["message"]["id"])
+        self.assertEqual(echo["message"], MessageSerializer(message).data)
+        #  the receiver gets the unread counts once the messages are saved, the counts of the batch are coalesced
+        notification_events = [await notifications.receive_json_from() for _ in range(4)]
+        unread_counts = [event["unread_count"] for event in notification_events if event["type"] == "unread_count"]
+        self.assertEqual(unread_counts, [3])
+        self.assertTrue(await notifications.receive_nothing())
+        await sender.disconnect()
+        await notifications.disconnect()
+
+    @override_settings(CHAT_WRITE_BEHIND=True)
+    async def test_write_behind_disconnect(self):
+        write_behind = get_message_write_behind()
+        write_behind.flush_interval = 60
+        try:
+            sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+            await self.receive_events(sender, 3)
+            await sender.send_json_to({"type": "chat_message", "message": "Hello"})
+            self.assertEqual((await sender.receive_json_from())["type"], "chat_message_echo")
+            #  the message waiting for its batch is saved once the connection closes
+            await sender.disconnect()
+            self.assertEqual(await database_sync_to_async(Message.objects.count)(), 1)
+        finally:
+            write_behind.flush_interval = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL
+
+    @override_settings(CHAT_WRITE_BEHIND=True)
+    async def test_write_behind_invalid_messages(self):
+        sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+        await self.receive_events(sender, 3)
+        #  a message which can't be saved is rejected before it is broadcast
+        await sender.send_json_to({"type": "chat_message", "message": "a" * 513})
+        self.assertEqual(await sender.receive_json_from(), {
+            "type": "error", "message": "Ensure this value has at most 512 characters (it has 513)."})
+        self.assertTrue(await sender.receive_nothing())
+        await sender.disconnect()
+        #  the messages of a batch which fails are saved one at a time, so only the message which can't be saved fails
+        conversation = await database_sync_to_async(get_or_create_conversation)(self.conversation_name)
+        write_behind = MessageWriteBehind(batch_size=10, flush_interval=10)
+        saved = [
+            write_behind.add(Message(id=uuid.uuid4(), conversation_id=conversation_id, from_user=self.sender,
+                                     to_user=self.receiver, content="Hello"))
+            for conversation_id in [conversation.id, uuid.uuid4(), conversation.id]
+        ]
+        with self.assertLogs("chats.write_behind", "ERROR") as logs:
+            await write_behind.drain()
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([saved[0].result(), saved[2].result()], [(1, 1), (2, 2)])
+        self.assertIsInstance(saved[1].exception(), IntegrityError)
+        self.assertEqual(await database_sync_to_async(Message.objects.count)(), 2)
+
+    @override_settings(CHAT_TYPING_INTERVAL=0.2)
+    async def test_typing_throttle(self):
+        sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+        await self.receive_events(sender, 3)
+        receiver = await self.connect(f"/chats/{self.conversation_name}/", self.receiver)
+        await self.receive_events(receiver, 3)
+        typing = {"type": "typing", "user_id": str(self.sender.id)}
+        #  the first change is sent right away, the states received in the interval are coalesced
+        for state in [True, True, False, True]:
+            await sender.send_json_to({"type": "typing", "typing": state})
+        self.assertEqual(await receiver.receive_json_from(), {**typing, "typing": True})
+        self.assertTrue(await receiver.receive_nothing(timeout=0.3))
+        await sender.send_json_to({"type": "typing", "typing": True})
+        await sender.send_json_to({"type": "typing", "typing": False})
+        self.assertEqual(await receiver.receive_json_from(), {**typing, "typing": False})
+        self.assertTrue(await receiver.receive_nothing(timeout=0.3))
+        await sender.disconnect()
+        await receiver.disconnect()
+
+    async def test_load_before(self):
+        conversation = await database_sync_to_async(get_or_create_conversation)(self.conversation_name)
+        message_ids = await database_sync_to_async(self.create_messages)(conversation, MESSAGE_HISTORY_SIZE * 2 + 3)
+        sender = await self.connect(f"/chats/{self.conversation_name}/", self.sender)
+        history = (await self.receive_events(sender, 3))["last_50_messages"]
+        loaded_ids = [message["id"] for message in history["messages"]]
+        while history["has_more"]:
+            #  every page is a single query whatever the number of messages before it
+            queries = await database_sync_to_async(lambda: CaptureQueriesContext(connections["default"]))()
+            await database_sync_to_async(queries.__enter__)()
+            await sender.send_json_to({"type": "load_before", "cursor": history["cursor"]})
+            history = await sender.receive_json_from()
+            await database_sync_to_async(queries.__exit__)(None, None, None)
+            self.assertEqual(len(queries.captured_queries), 1)
+            self.assertEqual(history["type"], "load_before")
+            loaded_ids += [message["id"] for message in history["messages"]]
+        self.assertEqual(loaded_ids, message_ids)
+        self.assertIsNone(history["cursor"])
+        await sender.send_json_to({"type": "load_before", "cursor": "invalid"})
+        self.assertEqual(await sender.receive_json_from(), {"type": "error", "message": "Invalid cursor"})
+        #  a naive timestamp is rejected like the cursor of the messages endpoint
+        naive_cursor = base64.urlsafe_b64encode(f"{datetime(2022, 1, 1).isoformat()}|{uuid.uuid4()}".encode()).decode()
+        await sender.send_json_to({"type": "load_before", "cursor": naive_cursor})
+        self.assertEqual(await sender.receive_json_from(), {"type": "error", "message": "Invalid cursor"})
+        await sender.disconnect()
+
+    def create_messages(self, conversation, count):
+        """this returns the ids of the messages from the newest, some of them share a timestamp"""
+        now = timezone.now()
+        messages = Message.objects.bulk_create([
+            Message(id=uuid.uuid4(), conversation=conversation, from_user=self.sender, to_user=self.receiver,
+                    content=f"Message {number}")
+            for number in range(count)
+        ])
+        for number, message in enumerate(messages):
+            Message.objects.filter(id=message.id).update(timestamp=now - timedelta(minutes=number // 2))
+        return [str(message_id) for message_id in Message.objects.order_by("-timestamp", "-id").values_list(
+            "id", flat=True)]
+
+    async def test_rejected_connections(self):
+        communicator = WebsocketCommunicator(self.application, f"/chats/{self.conversation_name}/")
+        communicator.scope["user"] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+        #  one of the users of the conversation doesn't exist
+        communicator = await self.connect(f"/chats/{self.sender.id}__{uuid.uuid4()}/", self.sender)
+        self.assertEqual(await communicator.receive_output(), {"type": "websocket.close", "code": 1014})
+
+
+class PresenceTestCase(TestCase):
+    """This tests the online users kept by the in memory presence backend"""
+
+    async def test_presence(self):
+        presence = InMemoryPresenceBackend(ttl=60)
+        await presence.join("conversation", "user1", "channel1")
+        await presence.join("conversation", "user1", "channel2")
+        await presence.join("conversation", "user2", "channel3")
+        self.assertEqual(await presence.get_online_users("conversation"), ["user1", "user2"])
+        #  the user is still online with his other connection
+        await presence.leave("conversation", "user1", "channel1")
+        self.assertEqual(await presence.get_online_users("conversation"), ["user1", "user2"])
+        await presence.leave("conversation", "user1", "channel2")
+        self.assertEqual(await presence.get_online_users("conversation"), ["user2"])
+        self.assertFalse(await presence.is_user_online("user1"))
+        self.assertTrue(await presence.is_user_online("user2"))
+        #  the connections which stopped their heartbeat expire
+        presence.ttl = -1
+        await presence.join("conversation", "user3", "channel4")
+        self.assertEqual(await presence.get_online_users("conversation"), ["user2"])
+        self.assertFalse(await presence.is_user_online("user3"))
+
+
+class UnreadCountDebouncerTestCase(TestCase):
+    """This tests the unread counts of a user coalesced by the debouncer"""
+
+    @override_settings(CHAT_UNREAD_COUNT_DEBOUNCE=0.1)
+    async def test_burst_is_coalesced(self):
+        debouncer = UnreadCountDebouncer()
+        channel_layer = InMemoryChannelLayer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(get_notification_group_name("user1"), channel)
+        await debouncer.send(channel_layer, "user1", 1, {"conversation1": 1})
+        await debouncer.send(channel_layer, "user1", 2, {"conversation2": 1})
+        await debouncer.send(channel_layer, "user1", 3, {"conversation1": 2})
+        #  the burst is sent once with the last total and the last count of every conversation
+        event = await asyncio.wait_for(channel_layer.receive(channel), timeout=1)
+        self.assertEqual(event, {"type": "unread_count", "unread_count": 3,
+                                 "conversations": {"conversation1": 2, "conversation2": 1}})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(channel_layer.receive(channel), timeout=0.2)
+        #  the next count starts another burst
+        await debouncer.send(channel_layer, "user1", 0, {"conversation1": 0})
+        event = await asyncio.wait_for(channel_layer.receive(channel), timeout=1)
+        self.assertEqual(event["conversations"], {"conversation1": 0})
+        self.assertEqual(debouncer.pending, {})
+
+
+class ConversationParticipantTestCase(TestCase):
+    """This tests the conversations found with the sorted ids of their users"""
+
+    def setUp(self):
+        self.sender, self.receiver, self.other_user = bulk_create_users("CUSTOMER", "FREELANCER", "FREELANCER")
+        UserProfile.objects.bulk_create([UserProfile(user=self.sender), UserProfile(user=self.receiver)])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.sender)
+
+    def test_get_or_create_for_participants(self):
+        conversation, created = Conversation.objects.get_or_create_for_participants([self.sender.id, self.receiver.id])
+        self.assertTrue(created)
+        self.assertEqual(Conversation.objects.get_or_create_for_participants(
+            [str(self.receiver.id), str(self.sender.id)]), (conversation, False))
+        self.assertEqual(set(conversation.participants.values_list("user_id", flat=True)),
+                         {self.sender.id, self.receiver.id})
+
+    def test_conversation_and_message_lookups(self):
+        conversation, _ = Conversation.objects.get_or_create_for_participants([self.sender.id, self.receiver.id])
+        Message.objects.create(id=uuid.uuid4(), conversation=conversation, from_user=self.receiver,
+                               to_user=self.sender, content="Hello")
+        response = self.client.get("/api/v1/chats/conversations/")
+        self.assertEqual(response.status_code, 200)
+        conversations = response.json()["results"]
+        self.assertEqual([item["id"] for item in conversations], [str(conversation.id)])
+        self.assertEqual(conversations[0]["other_user"]["user"]["id"], str(self.receiver.id))
+        #  the ids of the conversation name can be in any order
+        reversed_name = f"{self.receiver.id}__{self.sender.id}"
+        response = self.client.get(f"/api/v1/chats/conversations/{reversed_name}/")
+        self.assertEqual(response.status_code, 200)
+        Message.objects.create(id=uuid.uuid4(), conversation=conversation, from_user=self.sender,
+                               to_user=self.receiver, content="Hi")
+        Message.objects.filter(content="Hello").update(timestamp=timezone.now() - timedelta(minutes=1))
+        response = self.client.get("/api/v1/chats/messages/", {"conversation": reversed_name, "page_size": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message["content"] for message in response.json()["results"]], ["Hi"])
+        #  the older messages are gotten with the cursor of the next page
+        with self.assertNumQueries(1):
+            response = self.client.get(response.json()["next"])
+        self.assertEqual([message["content"] for message in response.json()["results"]], ["Hello"])
+        self.assertIsNone(response.json()["next"])
+        #  a user who is not in the conversation doesn't see it
+        client = APIClient()
+        client.force_authenticate(user=self.other_user)
+        self.assertEqual(client.get("/api/v1/chats/messages/", {"conversation": reversed_name}).status_code, 404)
+        self.assertEqual(client.get(f"/api/v1/chats/conversations/{reversed_name}/").status_code, 404)
+
+    def test_message_access(self):
+        conversation, _ = Conversation.objects.get_or_create_for_participants([self.sender.id, self.receiver.id])
+        Message.objects.create(id=uuid.uuid4(), conversation=conversation, from_user=self.sender,
+                               to_user=self.receiver, content="Hello")
+        client = APIClient()
+
+        def get_messages(user):
+            client.force_authenticate(user=user)
+            return client.get("/api/v1/chats/messages/", {"conversation": conversation.participant_key})
+
+        #  a participant who is not staff sees the messages
+        response = get_messages(self.receiver)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message["content"] for message in response.json()["results"]], ["Hello"])
+        #  a staff member sees the messages of a conversation he is not in, the other users don't
+        self.assertEqual(get_messages(self.other_user).status_code, 404)
+        User.objects.filter(id=self.other_user.id).update(is_staff=True)
+        self.other_user.refresh_from_db()
+        response = get_messages(self.other_user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message["content"] for message in response.json()["results"]], ["Hello"])
+
+    def test_backfill(self):
+        first, second = Conversation.objects.bulk_create([
+            Conversation(id=uuid.uuid4(), name=f"{self.sender.id}__{self.receiver.id}"),
+            Conversation(id=uuid.uuid4(), name=f"{self.receiver.id}__{self.sender.id}"),
+        ])
+        for conversation in [first, second]:
+            Message.objects.create(id=uuid.uuid4(), conversation=conversation, from_user=self.receiver,
+                                   to_user=self.sender, content="Hello")
+        out = StringIO()
+        call_command("backfill_conversation_participants", stdout=out)
+        self.assertIn("Backfilled 1 conversations and merged 1 duplicated conversations", out.getvalue())
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(ConversationParticipant.objects.filter(conversation=conversation).count(), 2)
+        self.assertEqual(Conversation.objects.get_or_create_for_participants([self.sender.id, self.receiver.id]),
+                         (conversation, False))
+
+
+class UnreadCountTestCase(TestCase):
+    """This tests the unread messages counters kept in the cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.sender, self.receiver = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.conversation, _ = Conversation.objects.get_or_create_for_participants(
+            [self.sender.id, self.receiver.id])
+
+    def send_message(self):
+        Message.objects.create(id=uuid.uuid4(), conversation=self.conversation, from_user=self.sender,
+                               to_user=self.receiver, content="Hello")
+        return increment_unread_count(self.receiver.id, self.conversation.id)
+
+    def test_unread_counts(self):
+        conversation_id = str(self.conversation.id)
+        #  the first counters are computed from the database which already has the message
+        self.assertEqual(self.send_message(), (1, 1))
+        self.assertEqual(self.send_message(), (2, 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_unread_counts(self.receiver.id),
+                             {"unread_count": 2, "conversations": {conversation_id: 2}})
+        self.assertEqual(get_user_unread_counts(self.sender.id),
+                         {"unread_count": 0, "conversations": {conversation_id: 0}})
+        self.assertEqual(mark_conversation_read(self.receiver.id, self.conversation.id), 0)
+        self.assertFalse(Message.objects.filter(read=False).exists())
+        #  a counter which drifted is computed again
+        cache.set(get_unread_total_key(self.receiver.id), 0)
+        self.send_message()
+        cache.decr(get_unread_total_key(self.receiver.id), 5)
+        self.assertEqual(mark_conversation_read(self.receiver.id, self.conversation.id), 0)
+
+    def test_save_messages(self):
+        other_user = bulk_create_users("CUSTOMER")[0]
+        other_conversation, _ = Conversation.objects.get_or_create_for_participants(
+            [other_user.id, self.receiver.id])
+
+        def create_messages(conversations):
+            return [Message(id=uuid.uuid4(), conversation=conversation, from_user=self.sender,
+                            to_user=self.receiver, content="Hello") for conversation in conversations]
+
+        #  the counters missing from the cache are computed once with every message of the batch
+        self.assertEqual(save_messages(create_messages(
+            [self.conversation, self.conversation, other_conversation, self.conversation])),
+            [(1, 1), (2, 2), (3, 1), (4, 3)])
+        self.assertEqual(get_user_unread_counts(self.receiver.id), {"unread_count": 4, "conversations": {
+            str(self.conversation.id): 3, str(other_conversation.id): 1}})
+        #  the cached counters are incremented by the messages of the batch
+        self.assertEqual(save_messages(create_messages([self.conversation, self.conversation])), [(5, 4), (6, 5)])
+
+    def test_unread_counts_endpoint(self):
+        self.send_message()
+        client = APIClient()
+        client.force_authenticate(user=self.receiver)
+        response = client.get("/api/v1/chats/unread_counts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"unread_count": 1, "conversations": {str(self.conversation.id): 1}})
+
+
+class TokenAuthenticationTestCase(TestCase):
+    """This tests the tokens and users cached by the websocket authentication"""
+
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        self.user = bulk_create_users("CUSTOMER")[0]
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_cached_authentication(self):
+        authentication = TokenAuthentication()
+        with self.assertNumQueries(1):
+            self.assertEqual(authentication.authenticate_credentials(self.token).id, self.user.id)
+        #  a reconnecting websocket doesn't query the users
+        with self.assertNumQueries(0):
+            self.assertEqual(authentication.authenticate_credentials(self.token).id, self.user.id)
+        #  only the fields read by the consumers are cached, not the password hash
+        self.assertEqual(cache.get(get_user_snapshot_key(self.user.id)),
+                         {"id": self.user.id, "is_active": True, "first_name": "First1", "last_name": "Last1"})
+        #  the snapshot of a user deactivated by a queryset update (e.g. an admin action) is deleted
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(self.token)
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials("invalid")
+
+    def test_token_user_cache(self):
+        tokens = TokenUserCache(max_size=2)
+        expires = timezone.now().timestamp() + 60
+        tokens.set("token1", "user1", expires)
+        tokens.set("token2", "user2", expires)
+        self.assertEqual(tokens.get("token1"), "user1")
+        #  the least recently used token is dropped
+        tokens.set("token3", "user3", expires)
+        self.assertIsNone(tokens.get("token2"))
+        self.assertEqual(tokens.get("token1"), "user1")
+        #  an expired token is dropped
+        tokens.set("token4", "user4", expires - 120)
+        self.assertIsNone(tokens.get("token4"))
@@ -0,0 +1,122 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from chats.models import Message, ConversationParticipant
+
+#  the counters are computed again from the messages once a day, so a counter which drifted is repaired
+UNREAD_COUNT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_unread_total_key(user_id):
+    return f"chats:unread:{user_id}:total"
+
+
+def get_unread_conversation_key(user_id, conversation_id):
+    return f"chats:unread:{user_id}:{conversation_id}"
+
+
+def get_unread_count(user_id):
+    """this returns the number of unread messages of the user from the cache or the database once it expired"""
+    key = get_unread_total_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Message.objects.filter(to_user_id=user_id, read=False).count()
+        cache.set(key, count, timeout=UNREAD_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def get_conversation_unread_counts(user_id, conversation_ids):
+    """
+    This returns the number of unread messages of the user in every conversation,
+    the counters missing from the cache are computed with one query
+    """
+    keys = {get_unread_conversation_key(user_id, conversation_id): str(conversation_id)
+            for conversation_id in conversation_ids}
+    cached = cache.get_many(keys)
+    counts = {keys[key]: count for key, count in cached.items()}
+    missing = [conversation_id for key, conversation_id in keys.items() if key not in cached]
+    if missing:
+        computed = dict.fromkeys(missing, 0)
+        unread_messages = Message.objects.filter(to_user_id=user_id, read=False, conversation_id__in=missing)
+        for conversation_id, count in unread_messages.values("conversation_id").annotate(
+                count=Count("id")).values_list("conversation_id", "count"):
+            computed[str(conversation_id)] = count
+        cache.set_many({get_unread_conversation_key(user_id, conversation_id): count
+                        for conversation_id, count in computed.items()}, timeout=UNREAD_COUNT_CACHE_TIMEOUT)
+        counts.update(computed)
+    return counts
+
+
+def get_user_unread_counts(user_id):
+    """this returns the number of unread messages of the user in total and in every conversation of the user"""
+    conversation_ids = ConversationParticipant.objects.filter(user_id=user_id).values_list(
+        "conversation_id", flat=True)
+    return {
+        "unread_count": get_unread_count(user_id),
+        "conversations": get_conversation_unread_counts(user_id, conversation_ids),
+    }
+
+
+def increment_unread_count(user_id, conversation_id):
+    """
+    This counts a message saved for the user and returns the unread messages of the user in total and in
+    the conversation. a counter missing from the cache is computed from the database which has the message
+    """
+    try:
+        total = cache.incr(get_unread_total_key(user_id))
+    except ValueError:
+        total = get_unread_count(user_id)
+    try:
+        conversation_count = cache.incr(get_unread_conversation_key(user_id, conversation_id))
+    except ValueError:
+        conversation_count = get_conversation_unread_counts(user_id, [conversation_id])[str(conversation_id)]
+    return total, conversation_count
+
+
+def increment_batch_unread_counts(messages):
+    """
+    This counts the messages saved together and returns the unread messages of the receiver of every message
+    in total and in the conversation once it was saved. every counter is incremented once for the batch since a
+    counter missing from the cache is computed from the database which already has every message of the batch
+    """
+    totals = Counter(message.to_user_id for message in messages)
+    conversation_counts = Counter((message.to_user_id, message.conversation_id) for message in messages)
+    for user_id, count in totals.items():
+        try:
+            totals[user_id] = cache.incr(get_unread_total_key(user_id), count)
+        except ValueError:
+            totals[user_id] = get_unread_count(user_id)
+    for (user_id, conversation_id), count in conversation_counts.items():
+        try:
+            conversation_counts[user_id, conversation_id] = cache.incr(
+                get_unread_conversation_key(user_id, conversation_id), count)
+        except ValueError:
+            conversation_counts[user_id, conversation_id] = get_conversation_unread_counts(
+                user_id, [conversation_id])[str(conversation_id)]
+    #  the last message of a receiver gets the counts of the batch, the messages before it one less each
+    unread_counts = []
+    for message in reversed(messages):
+        key = (message.to_user_id, message.conversation_id)
+        unread_counts.append((totals[message.to_user_id], conversation_counts[key]))
+        totals[message.to_user_id] -= 1
+        conversation_counts[key] -= 1
+    return unread_counts[::-1]
+
+
+def mark_conversation_read(user_id, conversation_id):
+    """this marks the messages of the conversation sent to the user as read and returns his unread messages count"""
+    read_count = Message.objects.filter(conversation_id=conversation_id, to_user_id=user_id, read=False).update(
+        read=True)
+    cache.set(get_unread_conversation_key(user_id, conversation_id), 0, timeout=UNREAD_COUNT_CACHE_TIMEOUT)
+    key = get_unread_total_key(user_id)
+    try:
+        count = cache.decr(key, read_count) if read_count else cache.get(key)
+    except ValueError:
+        count = None
+    if count is None or count < 0:
+        #  the counter drifted or expired, it is computed again
+        cache.delete(key)
+        count = get_unread_count(user_id)
+    return count
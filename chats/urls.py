@@ -1,4 +1,6 @@
-from .views import MessageViewSet, ConversationViewSet
+from django.urls import path
+
+from .views import MessageViewSet, ConversationViewSet, UnreadCountAPIView
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -9,3 +11,5 @@ urlpatterns = router.urls
 router.register("messages", MessageViewSet)
 # add the messages users to the urlspatterns
 urlpatterns += router.urls
+#  the unread messages count of the logged-in user
+urlpatterns += [path("unread_counts/", UnreadCountAPIView.as_view(), name="unread_counts")]
@@ -1,11 +1,15 @@
 from django.http import Http404
+from rest_framework.generics import get_object_or_404
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
-from .models import Conversation, Message
+from .models import Conversation, Message, get_participant_key
 from .paginators import MessagePagination
 
 from .serializers import MessageSerializer, ConversationSerializer
+from .unread import get_user_unread_counts
 from users.permissions import LoggedInPermission
 
 
@@ -19,12 +23,19 @@ class ConversationViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     permission_classes = [LoggedInPermission]
 
     def get_queryset(self):
-        #  filter the conversation base on conversation name that contains the user id
+        #  filter the conversation base on the participants which contains the user
         queryset = Conversation.objects.filter(
-            name__contains=self.request.user.id
-        )
+            participants__user=self.request.user
+        ).prefetch_related("participants__user__user_profile")
         return queryset
 
+    def get_object(self):
+        #  the conversation name is looked up with its sorted user ids, so the order of the ids doesn't matter
+        participant_key = get_participant_key(self.kwargs["name"].split("__"))
+        conversation = get_object_or_404(self.get_queryset(), participant_key=participant_key)
+        self.check_object_permissions(self.request, conversation)
+        return conversation
+
     def get_serializer_context(self):
         """this enables adding the context to a serializer"""
         return {"request": self.request, "user": self.request.user}
@@ -32,7 +43,7 @@ class ConversationViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
 
 class MessageViewSet(ListModelMixin, GenericViewSet):
     """"
-    Returns
+    Returns the messages of a conversation from the newest, the older pages are gotten with the next cursor
     """
     serializer_class = MessageSerializer
     queryset = Message.objects.none()
@@ -41,16 +52,29 @@ class MessageViewSet(ListModelMixin, GenericViewSet):
 
     def get_queryset(self):
         conversation_name = self.request.GET.get("conversation")
+        if not conversation_name:
+            raise Http404
         # check if the current user has access but if the user is a staff he has access to viewing the messages
         # notice I had to convert the user id to string that's because the id is currently a uuid
-        if not str(self.request.user.id) in conversation_name.split("__") or self.request.user.is_staff is False:
+        if not str(self.request.user.id) in conversation_name.split("__") and self.request.user.is_staff is False:
             #  it raises an error if the user is not in this conversation
             raise Http404
         queryset = (
             Message.objects.filter(
-                conversation__name__contains=self.request.user.id,
+                conversation__participant_key=get_participant_key(conversation_name.split("__")),
             )
-            .filter(conversation__name=conversation_name)
-            .order_by("-timestamp")
+            .select_related("conversation", "from_user", "to_user")
+            .order_by("-timestamp", "-id")
         )
         return queryset
+
+
+class UnreadCountAPIView(APIView):
+    """
+    This returns the number of unread messages of the logged-in user in total and in every conversation,
+    the counts are kept in the cache so the unread badges don't count the messages
+    """
+    permission_classes = [LoggedInPermission]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_user_unread_counts(request.user.id), status=200)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from chats.models import Message
+from chats.unread import increment_batch_unread_counts
+
+logger = logging.getLogger(__name__)
+
+
+def save_messages(messages):
+    """
+    This saves the messages with one INSERT and returns the unread messages of every receiver
+    in total and in the conversation, the counters are incremented once the messages are committed
+    """
+    #  bulk_create saves the messages in its own transaction
+    Message.objects.bulk_create(messages)
+    return increment_batch_unread_counts(messages)
+
+
+class MessageWriteBehind:
+    """
+    This keeps the chat messages of the process broadcast before they are saved and saves them in batches.
+    a batch is saved once it has batch_size messages or flush_interval seconds after its first message,
+    so a worker which crashes loses at most the messages of the last flush_interval seconds
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        #  the (message, future) waiting to be saved
+        self.pending = []
+        self.timer = None
+        #  the flushes started by the size of a batch or its timer
+        self.flushes = set()
+
+    def add(self, message):
+        """this returns a future of the unread counts of the receiver which is set once the message is committed"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((message, future))
+        if len(self.pending) >= self.batch_size:
+            self.start_flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_interval, self.start_flush)
+        return future
+
+    def start_flush(self):
+        flush = asyncio.ensure_future(self.flush())
+        self.flushes.add(flush)
+        flush.add_done_callback(self.flushes.discard)
+
+    async def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            unread_counts = await database_sync_to_async(save_messages)([message for message, _ in batch])
+        except Exception:
+            #  the batch is saved in one transaction, so a message which can't be saved fails the others too
+            logger.exception("The chat messages of a batch could not be saved, they are saved one at a time")
+            for message, future in batch:
+                try:
+                    unread_count, = await database_sync_to_async(save_messages)([message])
+                except Exception as exception:
+                    logger.exception("The chat message %s could not be saved", message.id)
+                    future.set_exception(exception)
+                else:
+                    future.set_result(unread_count)
+            return
+        for (_, future), unread_count in zip(batch, unread_counts):
+            future.set_result(unread_count)
+
+    async def drain(self):
+        """
+        This saves the pending messages and waits for the batches being saved,
+        the chat consumers drain it once a connection with messages waiting to be saved closes
+        """
+        await self.flush()
+        await asyncio.gather(*self.flushes)
+
+
+_message_write_behind = None
+
+
+def get_message_write_behind():
+    """returns the write behind of the process"""
+    global _message_write_behind
+    if _message_write_behind is None:
+        _message_write_behind = MessageWriteBehind(
+            settings.CHAT_WRITE_BEHIND_BATCH_SIZE, settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL)
+    return _message_write_behind
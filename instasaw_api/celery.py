@@ -21,6 +21,11 @@ app.conf.beat_schedule = {
         "task": 'subscriptions.tasks.cancel_all_user_subscriptions_with_cancel_next',
         "schedule": crontab(hour=23),
     },
+    #  this moves the old completed jobs to the archive tables
+    "archive_completed_jobs": {
+        "task": 'jobs.tasks.archive_completed_jobs_task',
+        "schedule": crontab(hour=2, minute=0),
+    },
 
 }
 
@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+
+#  the request being handled by the thread or the task, the router only uses the replicas during a request
+_routing_state = ContextVar("replica_routing_state", default=None)
+#  the methods which don't write, their reads can be sent to a replica
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def get_sticky_key(user_id):
+    return f"db_router:sticky:{user_id}"
+
+
+def get_replica_lag(alias):
+    """
+    This returns the number of seconds the replica is behind the primary or None if it can't be measured.
+    a postgres replica which replayed everything it received is not behind even if nothing was written for a while
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END")
+        lag = cursor.fetchone()[0]
+    return float(lag) if lag is not None else None
+
+
+class ReplicaLagMonitor:
+    """
+    This keeps the lag of every replica measured at most every REPLICA_LAG_CHECK_INTERVAL seconds by the process,
+    a replica which can't be reached or is behind by more than REPLICA_MAX_LAG_SECONDS is not read from
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #  alias -> (time checked, lag, error)
+        self.checks = {}
+
+    def check(self, alias):
+        try:
+            lag, error = get_replica_lag(alias), None
+        except Exception as exception:
+            lag, error = None, str(exception)
+        with self.lock:
+            self.checks[alias] = (time.monotonic(), lag, error)
+        return lag, error
+
+    def get_status(self, alias):
+        with self.lock:
+            checked = self.checks.get(alias)
+        if checked is None or time.monotonic() - checked[0] > settings.REPLICA_LAG_CHECK_INTERVAL:
+            lag, error = self.check(alias)
+        else:
+            _, lag, error = checked
+        healthy = error is None and (lag is None or lag <= settings.REPLICA_MAX_LAG_SECONDS)
+        return {"lag": lag, "error": error, "healthy": healthy}
+
+    def get_healthy_replicas(self):
+        return [alias for alias in settings.DATABASE_REPLICAS if self.get_status(alias)["healthy"]]
+
+
+replica_lag_monitor = ReplicaLagMonitor()
+
+
+class ReplicaRoutingState:
+    """what the router knows about the request being handled"""
+
+    def __init__(self, request):
+        self.request = request
+        self.writes = request.method not in SAFE_METHODS
+        #  the user wrote in the last REPLICA_STICKY_SECONDS which is None until the user is known
+        self.sticky = None
+        self.replica = None
+
+    def get_user_id(self):
+        """
+        This returns the id of the user of the request once it is known without loading it.
+        the user of the api is set by the rest framework authentication in the view
+        """
+        user = self.request.__dict__.get("user")
+        if isinstance(user, SimpleLazyObject):
+            if user._wrapped is empty:
+                return None
+            user = user._wrapped
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
+
+    def should_use_primary(self):
+        """the reads go to the primary once the request wrote or if the user wrote recently"""
+        if self.writes:
+            return True
+        if self.sticky is None:
+            user_id = self.get_user_id()
+            if user_id is not None:
+                self.sticky = bool(cache.get(get_sticky_key(user_id)))
+        return bool(self.sticky)
+
+
+class ReplicaRouter:
+    """
+    This sends the reads of the GET, HEAD and OPTIONS requests to one of the DATABASE_REPLICAS
+    and everything else to the default database which is the primary.
+    the reads go to the primary:
+    - outside a request like in the celery tasks and the management commands
+    - once the request wrote or opened a transaction
+    - for REPLICA_STICKY_SECONDS after a user wrote, so the user reads his own changes
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not settings.DATABASE_REPLICAS:
+            return None
+        if state.should_use_primary() or connections["default"].in_atomic_block:
+            return "default"
+        if state.replica is None:
+            #  a request reads from a single replica, so it doesn't see two different lags
+            replicas = replica_lag_monitor.get_healthy_replicas()
+            state.replica = random.choice(replicas) if replicas else "default"
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is None:
+            return None
+        #  a row read from the replica is saved to the primary
+        state.writes = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        #  the replicas hold the same rows as the primary
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    This gives the request to the router and makes the user read from the primary
+    for REPLICA_STICKY_SECONDS once the user sent a request which writes
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReplicaRoutingState(request)
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        if state.writes and settings.DATABASE_REPLICAS:
+            #  the user is known once the view authenticated the request
+            user_id = state.get_user_id()
+            if user_id is not None:
+                cache.set(get_sticky_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+        return response
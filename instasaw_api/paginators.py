@@ -0,0 +1,125 @@
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class TimestampCursorPagination(BasePagination):
+    """
+    This is a keyset pagination for lists ordered by the newest timestamp.
+    The cursor holds the (timestamp, id) of the last item of a page and the next page is filtered with
+    timestamp < cursor timestamp or the same timestamp with a smaller id, so it uses the (timestamp, id) index
+    and page N costs the same as page 1. Unlike the LimitOffsetPagination it doesn't count the queryset.
+
+    It is opt-in, so set it as the pagination_class of the view
+    ?cursor= is the cursor gotten from the next or previous links
+    ?page_size= is the number of items of a page
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        # reverse is used to get the previous page, so the items are fetched from the oldest
+        reverse = cursor is not None and cursor[0]
+        if reverse:
+            queryset = queryset.order_by("timestamp", "id")
+        else:
+            queryset = queryset.order_by("-timestamp", "-id")
+        if cursor is not None:
+            reverse, timestamp, pk = cursor
+            if reverse:
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+        # one more item is fetched to know if there is a page after this one
+        results = list(queryset[:page_size + 1])
+        has_following = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = cursor is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request, model):
+        """
+        returns the (reverse, timestamp, id) of the cursor passed or None,
+        the id is converted like the primary key of the model and the timestamp must have its time zone
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, timestamp, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split("|", 2)
+            timestamp = datetime.fromisoformat(timestamp)
+            pk = model._meta.pk.to_python(pk)
+        except (TypeError, ValueError, ValidationError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if timezone.is_naive(timestamp):
+            raise NotFound(self.invalid_cursor_message)
+        return direction == "p", timestamp, pk
+
+    def encode_cursor(self, item, reverse):
+        cursor = f"{'p' if reverse else 'n'}|{item.timestamp.isoformat()}|{item.pk}"
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, base64.urlsafe_b64encode(cursor.encode()).decode())
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -36,6 +36,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "instasaw_api.db_router.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -70,6 +71,16 @@ DATABASES = {
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
+#  the reads of the GET requests are sent to the DATABASE_REPLICAS and everything else to the default database
+DATABASE_ROUTERS = ["instasaw_api.db_router.ReplicaRouter"]
+#  the aliases of the DATABASES which are read replicas of the default database, none by default
+DATABASE_REPLICAS = []
+#  the seconds a user reads from the primary after a request which wrote, so the user reads his own changes
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+#  a replica behind the primary by more seconds than this is not read from
+REPLICA_MAX_LAG_SECONDS = config("REPLICA_MAX_LAG_SECONDS", default=30, cast=int)
+#  the seconds the lag of a replica is kept by a worker before it is measured again
+REPLICA_LAG_CHECK_INTERVAL = config("REPLICA_LAG_CHECK_INTERVAL", default=5, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -226,6 +237,43 @@ CHANNEL_LAYERS = {
         },
     },
 }
+#  the nominatim compatible geocoder used to get the coordinates of a job location
+#  when the customer doesn't pass them, jobs are not geocoded if it is not set
+JOB_GEOCODER_URL = config("JOB_GEOCODER_URL", default="")
+#  the completed jobs older than this number of days are moved to the archive tables by the archive task
+JOB_ARCHIVE_AFTER_DAYS = config("JOB_ARCHIVE_AFTER_DAYS", default=180, cast=int)
+#  the number of jobs moved in one transaction by the archive task
+JOB_ARCHIVE_BATCH_SIZE = config("JOB_ARCHIVE_BATCH_SIZE", default=500, cast=int)
+#  the redis the workers publish the changes of the job autocomplete on,
+#  the changes only update the autocomplete of the process if it is not set
+JOB_AUTOCOMPLETE_REDIS_URL = config("JOB_AUTOCOMPLETE_REDIS_URL", default="")
+#  the job autocomplete of a worker is built in the background once the app is loaded if it is set,
+#  otherwise it is built by the first lookup, so it is only set for the web workers
+JOB_AUTOCOMPLETE_PRELOAD = config("JOB_AUTOCOMPLETE_PRELOAD", default=False, cast=bool)
+#  the maximum number of words kept by the job autocomplete of every worker
+JOB_AUTOCOMPLETE_MAX_TERMS = config("JOB_AUTOCOMPLETE_MAX_TERMS", default=200000, cast=int)
+#  the redis the online users of the chats are kept in, they are only kept by the process if it is not set
+CHAT_PRESENCE_REDIS_URL = config("CHAT_PRESENCE_REDIS_URL", default="")
+#  the seconds a chat connection stays online without a heartbeat, so the users of a crashed worker go offline
+CHAT_PRESENCE_TTL = config("CHAT_PRESENCE_TTL", default=60, cast=int)
+#  the chat messages are broadcast before they are saved and saved in batches with one insert if it is set,
+#  the senders get a message_saved event once their message is committed
+CHAT_WRITE_BEHIND = config("CHAT_WRITE_BEHIND", default=False, cast=bool)
+#  the number of messages which makes a batch saved right away
+CHAT_WRITE_BEHIND_BATCH_SIZE = config("CHAT_WRITE_BEHIND_BATCH_SIZE", default=100, cast=int)
+#  the seconds a message waits for its batch to be saved, which are the messages lost if the worker crashes
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = config("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", default=0.05, cast=float)
+#  the number of tokens every worker keeps verified, so the websockets reconnecting don't decode them again
+CHAT_AUTH_TOKEN_CACHE_SIZE = config("CHAT_AUTH_TOKEN_CACHE_SIZE", default=10000, cast=int)
+#  the seconds the user of a websocket is kept in the cache, the user is deleted from it once saved
+CHAT_AUTH_USER_CACHE_TIMEOUT = config("CHAT_AUTH_USER_CACHE_TIMEOUT", default=60, cast=int)
+#  the seconds between two typing events of a user, the typing state is only sent once it changed.
+#  every typing event is sent if it is 0
+CHAT_TYPING_INTERVAL = config("CHAT_TYPING_INTERVAL", default=0.5, cast=float)
+#  the seconds the unread counts of a user wait for the next ones, so a burst of them is sent once.
+#  they are sent right away if it is 0
+CHAT_UNREAD_COUNT_DEBOUNCE = config("CHAT_UNREAD_COUNT_DEBOUNCE", default=0.25, cast=float)
+
 # PayPal price configuration
 #  get the default payout percent charge fee or set the default to 10
 PAYPAL_PAYOUT_PERCENT_FEE = config("PAYPAL_PAYOUT_PERCENT_FEE", 10)
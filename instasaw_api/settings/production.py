@@ -31,6 +31,22 @@ DATABASES = {
         'PORT': config('POSTGRES_PORT', default=''),
     }
 }
+#  the hosts of the read replicas of the postgres database separated by commas, they use the same credentials
+for number, host in enumerate(filter(None, config('POSTGRES_REPLICA_HOSTS', default='').split(','))):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+#  the cache is shared by the workers, so the cached job details are invalidated for every worker
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{config('REDIS_HOST')}:{config('REDIS_PORT')}/1",
+    }
+}
+#  every worker keeps its own job autocomplete which is updated with the changes published on redis
+JOB_AUTOCOMPLETE_REDIS_URL = f"redis://{config('REDIS_HOST')}:{config('REDIS_PORT')}/1"
+#  the online users of the chats are shared by the workers
+CHAT_PRESENCE_REDIS_URL = f"redis://{config('REDIS_HOST')}:{config('REDIS_PORT')}/1"
 
 PAYPAL_CLIENT_ID = config('PAYPAL_CLIENT_ID')
 PAYPAL_SECRET_KEY = config('PAYPAL_SECRET_KEY')
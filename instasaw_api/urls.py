@@ -3,6 +3,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from instasaw_api.views import ReplicaHealthAPIView
 from users.views import InstasawLoginAPIView, InstasawRegisterAPIView, RequestEmailOTPAPIView, \
     VerifyEmailOTPAPIView
 
@@ -18,7 +19,9 @@ urlpatterns = [
     path('api/v1/webhooks/', include("webhooks.urls")),
     path('api/v1/virtual_wallets/', include("virtual_wallets.urls")),
     path('api/v1/transactions/', include("transactions.urls")),
-    path('api/v1/chats/', include("chats.urls"))
+    path('api/v1/chats/', include("chats.urls")),
+    #  the lag of the read replicas for the monitoring
+    path('api/v1/health/replicas/', ReplicaHealthAPIView.as_view(), name="replica_health"),
 
 ]
 
@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from instasaw_api.db_router import replica_lag_monitor
+from users.permissions import LoggedInStaffPermission
+
+
+class ReplicaHealthAPIView(APIView):
+    """
+    This returns the lag in seconds of every database replica measured now and if the replica is read from.
+    it returns 503 if a replica is not healthy, so it can be used by the monitoring
+    """
+    permission_classes = [LoggedInStaffPermission]
+
+    def get(self, request, *args, **kwargs):
+        replicas = {}
+        for alias in settings.DATABASE_REPLICAS:
+            replica_lag_monitor.check(alias)
+            replicas[alias] = replica_lag_monitor.get_status(alias)
+        healthy = all(replica["healthy"] for replica in replicas.values())
+        return Response({"replicas": replicas, "healthy": healthy}, status=200 if healthy else 503)
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class JobConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "jobs"
+
+    def ready(self):
+        #  the job search index depends on the database used, so it is created after migrating
+        from jobs.search import post_migrate_setup_job_search
+        post_migrate.connect(post_migrate_setup_job_search, sender=self)
+        if settings.JOB_AUTOCOMPLETE_PRELOAD:
+            from jobs.autocomplete import job_autocomplete
+            job_autocomplete.start()
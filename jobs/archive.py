@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from jobs.cache import bump_job_versions, bump_proposal_stats_versions
+from jobs.models import Job, Proposal, JobInvite, ActiveJobCategory, SavedJob, ArchivedJob, ArchivedProposal, \
+    ArchivedJobInvite
+from jobs.search import get_job_search_backend
+
+#  the fields copied from the job, proposal and invite rows to their archive rows
+ARCHIVED_JOB_FIELDS = [
+    "id", "customer_id", "name", "description", "budget", "location", "latitude", "longitude", "project_stage",
+    "duration", "timestamp", "completed_at", "invites_count", "accepted_invites_count", "proposals_count",
+]
+ARCHIVED_PROPOSAL_FIELDS = ["id", "freelancer_id", "job_id", "proposal_stage", "amount", "content", "timestamp"]
+ARCHIVED_JOB_INVITE_FIELDS = ["id", "customer_id", "freelancer_id", "job_id", "accepted", "timestamp"]
+
+
+def get_archivable_jobs(cutoff):
+    """
+    This returns the completed jobs which were completed before the cutoff.
+    the jobs completed before the completed time was saved use their creation time
+    """
+    return Job.objects.filter(project_stage="COMPLETED").filter(
+        Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True, timestamp__lt=cutoff))
+
+
+def archive_jobs_batch(cutoff, batch_size):
+    """
+    This moves a batch of completed jobs with their proposals, invites and categorys to the archive tables
+    in one transaction and returns the number of jobs moved.
+    the moved rows leave the job tables, so the next batch starts where this one ended and
+    a task stopped between two batches is resumed by running it again
+    """
+    with transaction.atomic():
+        #  the locked jobs are skipped on postgres, so two tasks running at the same time don't move the same jobs
+        job_ids = list(get_archivable_jobs(cutoff).select_for_update(skip_locked=True).order_by("id").values_list(
+            "id", flat=True)[:batch_size])
+        if not job_ids:
+            return 0
+        ArchivedJob.objects.bulk_create([
+            ArchivedJob(**job) for job in Job.objects.filter(id__in=job_ids).values(*ARCHIVED_JOB_FIELDS)
+        ])
+        ArchivedJob.categorys.through.objects.bulk_create([
+            ArchivedJob.categorys.through(archivedjob_id=job_id, category_id=category_id)
+            for job_id, category_id in Job.categorys.through.objects.filter(job_id__in=job_ids).values_list(
+                "job_id", "category_id")
+        ])
+        ArchivedProposal.objects.bulk_create([
+            ArchivedProposal(**proposal)
+            for proposal in Proposal.objects.filter(job_id__in=job_ids).values(*ARCHIVED_PROPOSAL_FIELDS)
+        ])
+        ArchivedJobInvite.objects.bulk_create([
+            ArchivedJobInvite(**job_invite)
+            for job_invite in JobInvite.objects.filter(job_id__in=job_ids).values(*ARCHIVED_JOB_INVITE_FIELDS)
+        ])
+        search_backend = get_job_search_backend()
+        for job_id in job_ids:
+            search_backend.remove_job(job_id)
+        #  the rows are deleted without the delete signals, the counters of the jobs being moved don't need
+        #  to be updated and the contracts and reviews of the jobs are kept
+        for queryset in [
+            Proposal.objects.filter(job_id__in=job_ids),
+            JobInvite.objects.filter(job_id__in=job_ids),
+            ActiveJobCategory.objects.filter(job_id__in=job_ids),
+            Job.categorys.through.objects.filter(job_id__in=job_ids),
+            SavedJob.saved_jobs.through.objects.filter(job_id__in=job_ids),
+            Job.objects.filter(id__in=job_ids),
+        ]:
+            queryset._raw_delete(queryset.db)
+        bump_job_versions(job_ids)
+        bump_proposal_stats_versions(job_ids)
+    return len(job_ids)
+
+
+def archive_completed_jobs(days=None, batch_size=None, max_batches=None):
+    """
+    This moves the jobs completed more than days ago to the archive in batches and returns the number of jobs moved
+    """
+    days = settings.JOB_ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.JOB_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_jobs_batch(cutoff, batch_size)
+        archived += count
+        batches += 1
+        if count < batch_size:
+            break
+    return archived
@@ -0,0 +1,311 @@
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import sys
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from jobs.search import get_search_tokens
+
+logger = logging.getLogger(__name__)
+
+#  the redis channel the workers are told about the jobs and categorys changes on
+AUTOCOMPLETE_CHANNEL = "jobs:autocomplete"
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+#  the ranked terms of a prefix starting more terms than this are kept until one of its terms changes,
+#  so the short prefixes don't rank thousands of terms on every lookup
+AUTOCOMPLETE_CACHED_MATCHES = 1000
+#  the seconds waited before subscribing again once the redis connection is lost
+AUTOCOMPLETE_RECONNECT_DELAY = 5
+
+
+def get_autocomplete_terms(text):
+    """this returns the lower case words of the text which are completed"""
+    return {token.lower() for token in get_search_tokens(text or "")}
+
+
+class PrefixIndex:
+    """
+    This is a sorted array of terms searched with bisect, the terms starting with a prefix are next to each other.
+    every term keeps the keys it comes from (the ids of the jobs or categorys), so a key is replaced
+    or removed without rebuilding the index. the number of terms is capped by max_terms
+    """
+
+    def __init__(self, max_terms):
+        self.max_terms = max_terms
+        self.terms = []
+        self.term_keys = {}
+        self.key_terms = {}
+        #  the number of terms which were not added since the index was full
+        self.dropped_terms = 0
+        #  prefix -> the MAX_AUTOCOMPLETE_LIMIT best terms of the prefixes which start many terms
+        self.ranked_prefixes = {}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def build(self, items):
+        """this fills the index with the (key, terms) passed, the terms of the most keys are kept if it is full"""
+        for key, terms in items:
+            if terms:
+                self.key_terms[key] = tuple(terms)
+                for term in terms:
+                    self.term_keys.setdefault(term, set()).add(key)
+        if len(self.term_keys) > self.max_terms:
+            kept = set(heapq.nlargest(self.max_terms, self.term_keys, key=lambda term: len(self.term_keys[term])))
+            self.dropped_terms = len(self.term_keys) - len(kept)
+            self.term_keys = {term: keys for term, keys in self.term_keys.items() if term in kept}
+            self.key_terms = {
+                key: tuple(term for term in terms if term in kept) for key, terms in self.key_terms.items()}
+        self.terms = sorted(self.term_keys)
+        self.ranked_prefixes = {}
+
+    def forget_ranking(self, term):
+        """this removes the ranked terms of the prefixes of a term whose keys changed"""
+        for length in range(1, len(term) + 1):
+            self.ranked_prefixes.pop(term[:length], None)
+
+    def add(self, key, terms):
+        self.remove(key)
+        added = []
+        for term in terms:
+            if term not in self.term_keys:
+                if len(self.terms) >= self.max_terms:
+                    self.dropped_terms += 1
+                    continue
+                bisect.insort(self.terms, term)
+                self.term_keys[term] = set()
+            self.term_keys[term].add(key)
+            self.forget_ranking(term)
+            added.append(term)
+        if added:
+            #  the terms of a key are a tuple which is smaller than a set
+            self.key_terms[key] = tuple(added)
+
+    def remove(self, key):
+        for term in self.key_terms.pop(key, ()):
+            keys = self.term_keys[term]
+            keys.discard(key)
+            self.forget_ranking(term)
+            if not keys:
+                del self.term_keys[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def search(self, prefix, limit):
+        """returns the limit terms starting with the prefix which have the most keys"""
+        #  every term starting with the prefix sorts between the prefix and the prefix followed by the last character
+        if prefix in self.ranked_prefixes:
+            return self.ranked_prefixes[prefix][:limit]
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + chr(sys.maxunicode), start)
+        cached = end - start > AUTOCOMPLETE_CACHED_MATCHES
+        #  the terms of the most keys come first then the shortest
+        terms = heapq.nsmallest(max(limit, MAX_AUTOCOMPLETE_LIMIT) if cached else limit,
+                                itertools.islice(self.terms, start, end),
+                                key=lambda term: (-len(self.term_keys[term]), len(term), term))
+        if cached:
+            self.ranked_prefixes[prefix] = terms
+        return terms[:limit]
+
+
+class JobAutocomplete:
+    """
+    This completes the last word typed in the job search box with the words of the active job names
+    and the categorys whose name has a word starting with it.
+    the index is built by the first lookup of a worker, or once the app is loaded if JOB_AUTOCOMPLETE_PRELOAD is set,
+    and kept up to date with the changes published on redis
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.job_index = PrefixIndex(settings.JOB_AUTOCOMPLETE_MAX_TERMS)
+        self.category_index = PrefixIndex(settings.JOB_AUTOCOMPLETE_MAX_TERMS)
+        self.category_names = {}
+        self.built = False
+        #  the index was built once the listener was subscribed, so it has every change of the other workers
+        self.built_subscribed = False
+        #  the changes received while the index is being built which are applied again to the new index
+        self.pending_changes = None
+        self.listener = None
+        self.pubsub = None
+        self.stopping = threading.Event()
+        #  set once the listener is subscribed to the changes of the other workers
+        self.subscribed = threading.Event()
+
+    def build(self):
+        """this builds new indexes from the database and replaces the current ones"""
+        from categorys.models import Category
+        from jobs.models import Job
+
+        subscribed = self.subscribed.is_set()
+        with self.lock:
+            self.pending_changes = []
+        job_index = PrefixIndex(settings.JOB_AUTOCOMPLETE_MAX_TERMS)
+        job_index.build(
+            (str(job_id), get_autocomplete_terms(name))
+            for job_id, name in Job.objects.filter(project_stage="ACTIVE").values_list("id", "name").iterator())
+        category_names = {str(category_id): name for category_id, name in Category.objects.values_list("id", "name")}
+        category_index = PrefixIndex(settings.JOB_AUTOCOMPLETE_MAX_TERMS)
+        category_index.build(
+            (category_id, get_autocomplete_terms(name)) for category_id, name in category_names.items())
+        with self.lock:
+            self.job_index = job_index
+            self.category_index = category_index
+            self.category_names = category_names
+            for change in self.pending_changes:
+                self.apply_change(change)
+            self.pending_changes = None
+            self.built = True
+            self.built_subscribed = subscribed
+
+    def ensure_built(self):
+        if self.built:
+            return
+        with self.build_lock:
+            if not self.built:
+                self.build()
+
+    def apply(self, change):
+        """this updates the index with a change published by update_job_autocomplete"""
+        with self.lock:
+            if self.pending_changes is not None:
+                self.pending_changes.append(change)
+            if self.built:
+                self.apply_change(change)
+
+    def apply_change(self, change):
+        if change["kind"] == "job":
+            if change["active"]:
+                self.job_index.add(change["id"], get_autocomplete_terms(change["name"]))
+            else:
+                self.job_index.remove(change["id"])
+        elif change["kind"] == "category":
+            if change["name"] is None:
+                self.category_index.remove(change["id"])
+                self.category_names.pop(change["id"], None)
+            else:
+                self.category_index.add(change["id"], get_autocomplete_terms(change["name"]))
+                self.category_names[change["id"]] = change["name"]
+
+    def lookup(self, text, limit=DEFAULT_AUTOCOMPLETE_LIMIT):
+        """
+        This returns the suggestions of the text typed which are the text with its last word completed
+        and the categorys with a word starting with the last word
+        """
+        if settings.JOB_AUTOCOMPLETE_REDIS_URL and not self.built:
+            #  the worker subscribes to the changes of the other workers once it serves its first lookup
+            #  and the index is built after the subscription started, so no change is missed
+            self.start()
+            self.subscribed.wait(AUTOCOMPLETE_RECONNECT_DELAY)
+        self.ensure_built()
+        words = [word.lower() for word in get_search_tokens(text or "")]
+        if not words:
+            return {"suggestions": [], "categorys": []}
+        prefix = words[-1]
+        head = " ".join(words[:-1])
+        with self.lock:
+            terms = self.job_index.search(prefix, limit)
+            categorys = []
+            for term in self.category_index.search(prefix, limit):
+                for category_id in self.category_index.term_keys[term]:
+                    category = {"id": category_id, "name": self.category_names[category_id]}
+                    if category not in categorys:
+                        categorys.append(category)
+        return {
+            "suggestions": [f"{head} {term}" if head else term for term in terms],
+            "categorys": categorys[:limit],
+        }
+
+    def listen(self):
+        """
+        This subscribes to the changes published by the other workers and builds the index unless a lookup
+        built it once the subscription started. it is built again after the connection is lost
+        since the changes published meanwhile are missed
+        """
+        import redis
+
+        reconnected = False
+        while not self.stopping.is_set():
+            try:
+                self.pubsub = redis.Redis.from_url(settings.JOB_AUTOCOMPLETE_REDIS_URL).pubsub(
+                    ignore_subscribe_messages=True)
+                self.pubsub.subscribe(AUTOCOMPLETE_CHANNEL)
+                self.subscribed.set()
+                with self.build_lock:
+                    if reconnected or not self.built_subscribed:
+                        self.build()
+                reconnected = True
+                for message in self.pubsub.listen():
+                    self.apply(json.loads(message["data"]))
+            except Exception:
+                if self.stopping.is_set():
+                    return
+                logger.exception("The job autocomplete lost its redis subscription")
+                self.stopping.wait(AUTOCOMPLETE_RECONNECT_DELAY)
+
+    def start(self):
+        """
+        This builds the index in the background and subscribes to the changes of the other workers if redis is set
+        """
+        if self.listener:
+            return
+        with self.lock:
+            if self.listener:
+                return
+            self.stopping.clear()
+            target = self.listen if settings.JOB_AUTOCOMPLETE_REDIS_URL else self.ensure_built
+            self.listener = threading.Thread(target=target, name="job-autocomplete", daemon=True)
+            self.listener.start()
+
+    def stop(self, timeout=AUTOCOMPLETE_RECONNECT_DELAY):
+        """this unsubscribes from the changes and waits for the background thread to end"""
+        listener = self.listener
+        if listener is None:
+            return
+        self.stopping.set()
+        if self.pubsub is not None:
+            #  closing the connection ends the pubsub.listen of the thread
+            self.pubsub.close()
+        listener.join(timeout)
+        self.listener = None
+        self.pubsub = None
+        self.subscribed.clear()
+
+
+job_autocomplete = JobAutocomplete()
+_redis_client = None
+
+
+def publish_autocomplete_change(change):
+    """this tells every worker about the change or updates the index of this process if redis is not set"""
+    global _redis_client
+    if not settings.JOB_AUTOCOMPLETE_REDIS_URL:
+        job_autocomplete.apply(change)
+        return
+    import redis
+
+    try:
+        if _redis_client is None:
+            _redis_client = redis.Redis.from_url(settings.JOB_AUTOCOMPLETE_REDIS_URL)
+        _redis_client.publish(AUTOCOMPLETE_CHANNEL, json.dumps(change))
+    except redis.RedisError:
+        logger.exception("The job autocomplete change could not be published")
+
+
+def update_job_autocomplete(job, deleted=False):
+    """this publishes the name of the job once the transaction is committed, an inactive job is removed"""
+    change = {"kind": "job", "id": str(job.id), "name": job.name,
+              "active": not deleted and job.project_stage == "ACTIVE"}
+    transaction.on_commit(lambda: publish_autocomplete_change(change))
+
+
+def update_category_autocomplete(category, deleted=False):
+    """this publishes the name of the category once the transaction is committed"""
+    change = {"kind": "category", "id": str(category.id), "name": None if deleted else category.name}
+    transaction.on_commit(lambda: publish_autocomplete_change(change))
@@ -0,0 +1,161 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+#  the cached job detail payloads expire after a day even if they are not invalidated
+JOB_DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+#  the hits and misses are counted in the process and added to the cache every 100 reads,
+#  so a read doesn't write to the cache
+JOB_DETAIL_CACHE_STATS_FLUSH_EVERY = 100
+#  the bid stats of the proposals of a job are only versioned by the proposals of the job
+PROPOSAL_STATS_CACHE_TIMEOUT = 60 * 60 * 24
+JOB_DETAIL_CACHE_HITS_KEY = "job_detail:hits"
+JOB_DETAIL_CACHE_MISSES_KEY = "job_detail:misses"
+
+
+def get_job_version_key(job_id):
+    return f"job_detail:version:{job_id}"
+
+
+def get_job_payload_key(job_id):
+    return f"job_detail:payload:{job_id}"
+
+
+def get_proposal_stats_version_key(job_id):
+    return f"proposal_stats:version:{job_id}"
+
+
+def get_proposal_stats_key(job_id):
+    return f"proposal_stats:payload:{job_id}"
+
+
+def new_version():
+    """
+    The version is the time in nanoseconds instead of a counter, so if the version key is evicted
+    the next version can't be the version of an old payload which is still cached
+    """
+    return time.time_ns()
+
+
+def bump_versions(version_keys):
+    """
+    This changes the versions passed, so the payloads cached with them are not used anymore.
+    it runs once the transaction is committed, so a request can't cache the old data with the new version
+    """
+    if not version_keys:
+        return
+    transaction.on_commit(lambda: cache.set_many(
+        {version_key: new_version() for version_key in version_keys}, timeout=None))
+
+
+def get_versioned(payload_key, version_key):
+    """this returns the payload cached with the current version with one cache GET or None if it is missing or stale"""
+    cached = cache.get_many([payload_key, version_key])
+    payload = cached.get(payload_key)
+    version = cached.get(version_key)
+    if payload is not None and version is not None and payload["version"] == version:
+        return payload["data"]
+    return None
+
+
+def cache_versioned(payload_key, version_key, get_data, timeout):
+    """
+    This caches the data returned by get_data with the current version.
+    the version is read before the data, so if the data is updated while it is being computed
+    the payload is cached with the old version and is never used
+    """
+    version = cache.get(version_key)
+    if version is None:
+        version = new_version()
+        if not cache.add(version_key, version, timeout=None):
+            version = cache.get(version_key)
+    data = get_data()
+    cache.set(payload_key, {"version": version, "data": data}, timeout=timeout)
+    return data
+
+
+def bump_job_versions(job_ids):
+    """This changes the version of the jobs passed, so their cached job details are not used anymore"""
+    bump_versions([get_job_version_key(job_id) for job_id in job_ids])
+
+
+def get_cached_job_detail(job_id):
+    """this returns the cached payload of the job detail or None if it is missing or stale"""
+    data = get_versioned(get_job_payload_key(job_id), get_job_version_key(job_id))
+    job_detail_cache_stats.record(hit=data is not None)
+    return data
+
+
+def cache_job_detail(job_id, get_data):
+    """This caches the job detail returned by get_data with the current version of the job"""
+    return cache_versioned(get_job_payload_key(job_id), get_job_version_key(job_id), get_data,
+                           JOB_DETAIL_CACHE_TIMEOUT)
+
+
+def bump_proposal_stats_versions(job_ids):
+    """This changes the proposal version of the jobs passed, so their cached bid stats are not used anymore"""
+    bump_versions([get_proposal_stats_version_key(job_id) for job_id in job_ids])
+
+
+def get_cached_proposal_stats(job_id):
+    return get_versioned(get_proposal_stats_key(job_id), get_proposal_stats_version_key(job_id))
+
+
+def cache_proposal_stats(job_id, get_data):
+    return cache_versioned(get_proposal_stats_key(job_id), get_proposal_stats_version_key(job_id), get_data,
+                           PROPOSAL_STATS_CACHE_TIMEOUT)
+
+
+class JobDetailCacheStats:
+    """This counts the hits and misses of the job detail cache for every process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            should_flush = self.hits + self.misses >= JOB_DETAIL_CACHE_STATS_FLUSH_EVERY
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """this adds the counts of the process to the counts of every process which are saved in the cache"""
+        with self.lock:
+            counts = {JOB_DETAIL_CACHE_HITS_KEY: self.hits, JOB_DETAIL_CACHE_MISSES_KEY: self.misses}
+            self.hits = 0
+            self.misses = 0
+        for key, count in counts.items():
+            if count and not cache.add(key, count, timeout=None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    #  the key expired after add failed
+                    cache.set(key, count, timeout=None)
+
+    def get_stats(self):
+        self.flush()
+        counts = cache.get_many([JOB_DETAIL_CACHE_HITS_KEY, JOB_DETAIL_CACHE_MISSES_KEY])
+        hits = counts.get(JOB_DETAIL_CACHE_HITS_KEY, 0)
+        misses = counts.get(JOB_DETAIL_CACHE_MISSES_KEY, 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+        cache.delete_many([JOB_DETAIL_CACHE_HITS_KEY, JOB_DETAIL_CACHE_MISSES_KEY])
+
+
+job_detail_cache_stats = JobDetailCacheStats()
@@ -0,0 +1,195 @@
+import math
+
+import requests
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, F, FloatField, ExpressionWrapper
+from django.db.models.functions import Radians, Sin, Cos, ASin, Sqrt, Power, Least
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+#  the precision of the geohash saved on the job which is about 5 metres
+GEOHASH_PRECISION = 9
+#  the character after the last character of the alphabet, a geohash starting with a prefix is >= prefix and < prefix{
+GEOHASH_PREFIX_END = "{"
+#  the maximum number of geohash cells a radius is covered with, the precision is reduced until the cells fit
+MAX_GEOHASH_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+#  the radius used when only the latitude and longitude are passed and the largest radius allowed
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 500
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """this returns the geohash of the coordinates, jobs close to each other share a longer prefix"""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        #  the bits alternate between the longitude and the latitude starting with the longitude
+        value_range, value = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def get_geohash_cell_size(precision):
+    """returns the (latitude, longitude) size in degrees of a geohash cell of the precision"""
+    longitude_bits = math.ceil(precision * 5 / 2)
+    latitude_bits = precision * 5 // 2
+    return 180 / 2 ** latitude_bits, 360 / 2 ** longitude_bits
+
+
+def get_bounding_box(latitude, longitude, radius_km):
+    """returns the (min latitude, max latitude, min longitude, max longitude) around the coordinates"""
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    latitude_delta = math.degrees(angular_radius)
+    min_latitude = max(latitude - latitude_delta, -90.0)
+    max_latitude = min(latitude + latitude_delta, 90.0)
+    #  a degree of longitude gets shorter away from the equator
+    longitude_sin = math.sin(angular_radius) / max(math.cos(math.radians(latitude)), 1e-12)
+    if longitude_sin >= 1 or min_latitude == -90.0 or max_latitude == 90.0:
+        #  the circle contains a pole, so every longitude is used
+        return min_latitude, max_latitude, -180.0, 180.0
+    longitude_delta = math.degrees(math.asin(longitude_sin))
+    if longitude - longitude_delta < -180 or longitude + longitude_delta > 180:
+        #  the box crosses the antimeridian, so every longitude is used instead of splitting the box in two
+        return min_latitude, max_latitude, -180.0, 180.0
+    return min_latitude, max_latitude, longitude - longitude_delta, longitude + longitude_delta
+
+
+def get_geohash_cells(bounding_box):
+    """
+    This returns the geohash prefixes covering the bounding box using the longest precision
+    which needs at most MAX_GEOHASH_CELLS cells, every cell is a range on the geohash index
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        latitude_size, longitude_size = get_geohash_cell_size(precision)
+        rows = math.floor(max_latitude / latitude_size) - math.floor(min_latitude / latitude_size) + 1
+        columns = math.floor(max_longitude / longitude_size) - math.floor(min_longitude / longitude_size) + 1
+        if rows * columns <= MAX_GEOHASH_CELLS or precision == 1:
+            break
+    cells = set()
+    for row in range(rows):
+        latitude = min(min_latitude + row * latitude_size, max_latitude)
+        for column in range(columns):
+            longitude = min(min_longitude + column * longitude_size, max_longitude)
+            cells.add(encode_geohash(latitude, longitude, precision))
+    return sorted(cells)
+
+
+def get_distance_expression(latitude, longitude):
+    """this returns the haversine distance in km between the job coordinates and the coordinates passed"""
+    latitude_delta = Radians(F("latitude") - latitude) / 2
+    longitude_delta = Radians(F("longitude") - longitude) / 2
+    haversine = (
+            Power(Sin(latitude_delta), 2) +
+            math.cos(math.radians(latitude)) * Cos(Radians(F("latitude"))) * Power(Sin(longitude_delta), 2)
+    )
+    #  least prevents a rounding error from going above 1 which asin doesn't accept
+    return ExpressionWrapper(
+        2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(haversine), 1.0)), output_field=FloatField())
+
+
+def filter_within_radius(queryset, latitude, longitude, radius_km):
+    """
+    This returns the jobs within the radius of the coordinates annotated with their distance in km.
+    the geohash cells use the geohash index and the bounding box and the exact distance
+    remove the jobs of the cells which are outside the radius
+    """
+    bounding_box = get_bounding_box(latitude, longitude, radius_km)
+    cells = Q()
+    for cell in get_geohash_cells(bounding_box):
+        if connection.vendor == "postgresql":
+            #  the order of the characters depends on the collation on postgres,
+            #  so the prefix is matched with LIKE which uses the varchar_pattern_ops index of the geohash
+            cells |= Q(geohash__startswith=cell)
+        else:
+            cells |= Q(geohash__gte=cell, geohash__lt=cell + GEOHASH_PREFIX_END)
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box
+    return queryset.filter(
+        cells,
+        latitude__range=(min_latitude, max_latitude),
+        longitude__range=(min_longitude, max_longitude),
+    ).annotate(distance=get_distance_expression(latitude, longitude)).filter(distance__lte=radius_km)
+
+
+def geocode_location(location):
+    """
+    This returns the (latitude, longitude) of the location text using the geocoder of JOB_GEOCODER_URL
+    which must accept the nominatim search parameters, it returns None if the location is not found
+    """
+    if not settings.JOB_GEOCODER_URL or not location:
+        return None
+    try:
+        response = requests.get(settings.JOB_GEOCODER_URL, params={"q": location, "format": "json", "limit": 1},
+                                headers={"User-Agent": "instasaw-api"}, timeout=10)
+        response.raise_for_status()
+        results = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    if not results:
+        return None
+    return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+class JobLocationFilter(BaseFilterBackend):
+    """
+    This filters the jobs around a point.
+    ?latitude= and ?longitude= are the coordinates of the point
+    ?radius= is the radius in km which is 50 by default
+    ?nearest=true orders the jobs from the nearest
+    """
+    latitude_param = "latitude"
+    longitude_param = "longitude"
+    radius_param = "radius"
+    nearest_param = "nearest"
+
+    def get_float_param(self, request, param, min_value, max_value, default=None):
+        value = request.query_params.get(param)
+        if value in [None, ""]:
+            if default is None:
+                raise ValidationError({param: "This field is required."})
+            return default
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValidationError({param: "A valid number is required."})
+        if not min_value <= value <= max_value:
+            raise ValidationError({param: f"Ensure this value is between {min_value} and {max_value}."})
+        return value
+
+    def is_nearest(self, request):
+        return request.query_params.get(self.nearest_param, "").lower() in ["true", "1"]
+
+    def is_location_filtered(self, request):
+        return bool(request.query_params.get(self.latitude_param) or request.query_params.get(self.longitude_param))
+
+    def filter_queryset(self, request, queryset, view):
+        if not self.is_location_filtered(request):
+            if self.is_nearest(request):
+                raise ValidationError({self.nearest_param: "The latitude and longitude are required."})
+            return queryset
+        latitude = self.get_float_param(request, self.latitude_param, -90, 90)
+        longitude = self.get_float_param(request, self.longitude_param, -180, 180)
+        radius = self.get_float_param(request, self.radius_param, 0, MAX_RADIUS_KM, default=DEFAULT_RADIUS_KM)
+        queryset = filter_within_radius(queryset, latitude, longitude, radius)
+        if self.is_nearest(request):
+            return queryset.order_by("distance", "id")
+        return queryset
@@ -0,0 +1,78 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from chats.models import Message, Conversation
+from jobs.models import Job, JobInvite, Proposal, Contract
+from transactions.models import Transaction
+
+#  the ids passed to the querysets, the plan doesn't depend on the rows existing
+SAMPLE_ID = uuid.uuid4()
+OTHER_SAMPLE_ID = uuid.uuid4()
+
+#  the hot querysets of the project which must be served by an index
+HOT_QUERIES = {
+    "job feed": lambda: Job.objects.order_by("-timestamp", "-id")[:50],
+    "customer jobs by stage": lambda: Job.objects.filter(customer_id=SAMPLE_ID, project_stage="ACTIVE"),
+    "job proposals": lambda: Proposal.objects.filter(job_id=SAMPLE_ID).order_by("-timestamp", "-id")[:50],
+    "freelancer proposal on a job": lambda: Proposal.objects.filter(job_id=SAMPLE_ID, freelancer_id=OTHER_SAMPLE_ID),
+    "freelancer invite on a job": lambda: JobInvite.objects.filter(job_id=SAMPLE_ID, freelancer_id=OTHER_SAMPLE_ID),
+    "freelancer active contracts": lambda: Contract.objects.filter(freelancer_id=SAMPLE_ID, completed=False),
+    "customer active contracts": lambda: Contract.objects.filter(customer_id=SAMPLE_ID, completed=False),
+    "unread messages": lambda: Message.objects.filter(to_user_id=SAMPLE_ID, read=False),
+    "conversation messages": lambda: Message.objects.filter(conversation_id=SAMPLE_ID).order_by(
+        "-timestamp", "-id")[:10],
+    "conversation of two users": lambda: Conversation.objects.filter(participant_key=f"{SAMPLE_ID}__{OTHER_SAMPLE_ID}"),
+    "user conversations": lambda: Conversation.objects.filter(participants__user_id=SAMPLE_ID),
+    "provider transaction": lambda: Transaction.objects.filter(transaction_id="PAYID", transaction_stage="PROCESSING"),
+    "user transactions": lambda: Transaction.objects.filter(user_id=SAMPLE_ID).order_by("-timestamp", "-id")[:50],
+}
+
+#  the lines of a plan reading a whole table, an sqlite SCAN using an index walks the index in order
+SEQUENTIAL_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)"),
+}
+
+
+def get_sequential_scans(plan, vendor):
+    """returns the tables read with a sequential scan in the plan"""
+    pattern = SEQUENTIAL_SCAN_PATTERNS.get(vendor)
+    if not pattern:
+        return []
+    return pattern.findall(plan)
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the hot querysets of the project and fail if one of them scans a whole table, " \
+           "so a missing index is caught before a deploy"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the plan of every queryset")
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SEQUENTIAL_SCAN_PATTERNS:
+            raise CommandError(f"The plans of {vendor} are not supported")
+        flagged = {}
+        with transaction.atomic():
+            if vendor == "postgresql":
+                #  the planner prefers a sequential scan on small tables,
+                #  so it is disabled to check an index can serve the query at all
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, get_queryset in HOT_QUERIES.items():
+                plan = get_queryset().explain()
+                scans = get_sequential_scans(plan, vendor)
+                if scans:
+                    flagged[name] = scans
+                    self.stdout.write(self.style.ERROR(f"{name}: sequential scan on {', '.join(scans)}"))
+                else:
+                    self.stdout.write(f"{name}: ok")
+                if options["verbose_plans"]:
+                    self.stdout.write(plan)
+        if flagged:
+            raise CommandError(f"{len(flagged)} of {len(HOT_QUERIES)} hot querysets scan a whole table")
+        self.stdout.write(self.style.SUCCESS(f"All {len(HOT_QUERIES)} hot querysets use an index"))
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from jobs.models import Job, Proposal, Contract
+from jobs.views import CreateContractAPIView
+from transactions.models import Transaction
+from users.models import User
+from users.utils import bulk_create_users
+from virtual_wallets.models import Wallet
+
+
+#  the number of times a request failing on a database lock is sent
+MAX_ATTEMPTS = 50
+
+
+class BenchmarkCreateContractAPIView(CreateContractAPIView):
+    """the benchmark sends more requests than the user throttle allows"""
+    throttle_classes = []
+
+
+class Command(BaseCommand):
+    help = "Create contracts from many threads at once and check the customer wallet for double spends. " \
+           "the generated users, jobs and contracts are deleted at the end"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=8)
+        #  every job is requested by this number of threads at the same time like a double click
+        parser.add_argument("--clicks", type=int, default=3)
+        parser.add_argument("--amount", type=Decimal, default=Decimal("10.00"))
+        #  the wallet only has enough for this fraction of the jobs, so some requests must be refused
+        parser.add_argument("--funded-fraction", type=float, default=0.75)
+
+    def handle(self, *args, **options):
+        customer, jobs = self.seed(options)
+        try:
+            self.run(customer, jobs, options)
+        finally:
+            self.clean_up()
+
+    def clean_up(self):
+        users = User.objects.filter(email__startswith="benchmark-contract-")
+        #  the proposals and contracts are deleted with the jobs
+        Job.objects.filter(customer__in=users).delete()
+        Transaction.objects.filter(user__in=users).delete()
+        Wallet.objects.filter(user__in=users).delete()
+        #  the users are deleted without collecting their relations since the benchmark only created the above
+        users._raw_delete(users.db)
+
+    def seed(self, options):
+        self.stdout.write(f"Generating {options['jobs']} jobs with a proposal each")
+        customer, freelancer = bulk_create_users("CUSTOMER", "FREELANCER", email_prefix="benchmark-contract")
+        #  the balance must be greater than the amount to withdraw it
+        balance = options["amount"] * int(options["jobs"] * options["funded_fraction"]) + Decimal("0.01")
+        Wallet.objects.bulk_create([Wallet(id=uuid.uuid4(), user=customer, balance=balance)])
+        jobs = Job.objects.bulk_create([
+            Job(id=uuid.uuid4(), customer=customer, name="Benchmark job", description="", budget=100, location="",
+                duration=10)
+            for _ in range(options["jobs"])
+        ])
+        Proposal.objects.bulk_create([
+            Proposal(id=uuid.uuid4(), freelancer=freelancer, job=job, amount=options["amount"], content="Benchmark")
+            for job in jobs
+        ])
+        proposals = dict(Proposal.objects.filter(job__in=jobs).values_list("job_id", "id"))
+        return customer, [(job.id, proposals[job.id]) for job in jobs]
+
+    def run(self, customer, jobs, options):
+        requests = [job for job in jobs for _ in range(options["clicks"])]
+        random.shuffle(requests)
+        lock = threading.Lock()
+        results = {}
+        view = BenchmarkCreateContractAPIView.as_view()
+        factory = APIRequestFactory()
+        initial_balance = Wallet.objects.get(user=customer).balance
+        start_date = str(timezone.now().date())
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not requests:
+                            return
+                        job_id, proposal_id = requests.pop()
+                    for attempt in range(MAX_ATTEMPTS):
+                        request = factory.post(f"/api/v1/jobs/contracts/job/{job_id}/", {
+                            "proposal_id": str(proposal_id), "amount": str(options["amount"]),
+                            "start_date": start_date, "end_date": start_date,
+                        }, format="json")
+                        force_authenticate(request, user=customer)
+                        try:
+                            response = view(request, job_id=str(job_id))
+                            status = response.status_code
+                            if status == 400:
+                                status = f"400 {response.data['error']}"
+                            break
+                        except OperationalError as error:
+                            #  sqlite locks the whole database instead of rows, so a transaction which reads
+                            #  then writes fails if another one is writing and the client retries it
+                            status = f"error {error}"
+                            with lock:
+                                results["retries"] = results.get("retries", 0) + 1
+                            time.sleep(random.uniform(0, 0.01 * (attempt + 1)))
+                    with lock:
+                        results[status] = results.get(status, 0) + 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        contracts = Contract.objects.filter(customer=customer)
+        contract_count = contracts.count()
+        retries = results.pop("retries", 0)
+        self.stdout.write(f"{sum(results.values())} requests from {options['threads']} threads in {elapsed:.2f}s "
+                          f"with {retries} retries")
+        for status, count in sorted(results.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f"  {status}: {count}")
+        self.stdout.write(f"{contract_count} contracts created, {contract_count / elapsed:.1f} contracts/sec")
+        self.check_anomalies(customer, initial_balance, contracts, contract_count, len(jobs))
+
+    def check_anomalies(self, customer, initial_balance, contracts, contract_count, job_count):
+        """the wallet must be debited once for every contract and a job can't have two contracts"""
+        balance = Wallet.objects.get(user=customer).balance
+        contracted = contracts.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+        withdrawals = Transaction.objects.filter(user=customer, transaction_category="WITHDRAWAL")
+        anomalies = []
+        if balance != initial_balance - contracted:
+            anomalies.append(f"the balance {balance} is not {initial_balance} - {contracted}")
+        if balance < 0:
+            anomalies.append(f"the balance {balance} is negative")
+        if withdrawals.count() != contract_count:
+            anomalies.append(f"{withdrawals.count()} withdrawals for {contract_count} contracts")
+        if contracts.values("job_id").distinct().count() != contract_count or contract_count > job_count:
+            anomalies.append("a job has more than one contract")
+        if Job.objects.filter(customer=customer, project_stage="PROCESSING").count() != contract_count:
+            anomalies.append("the jobs in processing don't match the contracts")
+        if anomalies:
+            for anomaly in anomalies:
+                self.stderr.write(f"Anomaly: {anomaly}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"No balance anomalies, the balance is {balance}"))
@@ -0,0 +1,63 @@
+import random
+import string
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs.autocomplete import JobAutocomplete
+from jobs.models import Job
+from users.utils import bulk_create_users
+
+#  the words the generated job names are made of with random words added to grow the number of terms
+WORDS = ["wedding", "gown", "dress", "suit", "tailor", "shirt", "native", "agbada", "kaftan", "skirt", "blouse",
+         "trouser", "jacket", "bridal", "lace", "ankara", "adire", "embroidery", "alteration", "repair"]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the lookups of the job autocomplete on generated jobs which are rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=100000)
+        parser.add_argument("--lookups", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed_jobs(options["jobs"])
+            autocomplete = JobAutocomplete()
+            tracemalloc.start()
+            start = time.perf_counter()
+            autocomplete.build()
+            build_seconds = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.stdout.write(f"Built {len(autocomplete.job_index)} terms in {build_seconds:.2f}s "
+                              f"using {memory / 1024 / 1024:.1f} MB")
+            timings = []
+            for _ in range(options["lookups"]):
+                word = random.choice(WORDS + [self.random_word()])
+                text = random.choice(["", "wedding "]) + word[:random.randint(1, 4)]
+                start = time.perf_counter()
+                autocomplete.lookup(text)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(f"{len(timings)} lookups p50 {timings[len(timings) // 2]:.3f} ms "
+                              f"p99 {timings[int(len(timings) * 0.99)]:.3f} ms max {timings[-1]:.3f} ms")
+            #  nothing generated by the benchmark is saved
+            transaction.set_rollback(True)
+
+    def random_word(self):
+        return "".join(random.choices(string.ascii_lowercase, k=random.randint(4, 9)))
+
+    def seed_jobs(self, count):
+        self.stdout.write(f"Generating {count} jobs")
+        customer = bulk_create_users("CUSTOMER", email_prefix="benchmark")[0]
+        batch_size = 10000
+        for offset in range(0, count, batch_size):
+            Job.objects.bulk_create([
+                Job(id=uuid.uuid4(), customer=customer, description="", budget=100, location="", duration=10,
+                    name=" ".join(random.sample(WORDS, 3) + [self.random_word()]))
+                for _ in range(min(batch_size, count - offset))
+            ], batch_size=1000)
@@ -0,0 +1,72 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs.geo import encode_geohash, filter_within_radius, get_distance_expression
+from jobs.models import Job
+from users.utils import bulk_create_users
+
+#  the points searched around and the box the jobs are generated in which is about Nigeria
+POINTS = [("Lagos", 6.5244, 3.3792), ("Abuja", 9.0765, 7.3986), ("Kano", 12.0022, 8.5920)]
+LATITUDE_RANGE = (4.0, 14.0)
+LONGITUDE_RANGE = (2.5, 14.5)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the geohash radius filter against a distance scan on generated jobs which are rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=1000000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--radius", type=float, nargs="+", default=[5, 25, 100])
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed_jobs(options["jobs"])
+            self.stdout.write(f"{'point':<10}{'radius km':>10}{'scan ms':>12}{'geohash ms':>14}{'matches':>10}")
+            for name, latitude, longitude in POINTS:
+                for radius in options["radius"]:
+                    scan_ms, scan_matches = self.time_query(lambda: self.scan(latitude, longitude, radius), options)
+                    geohash_ms, matches = self.time_query(
+                        lambda: filter_within_radius(Job.objects.all(), latitude, longitude, radius), options)
+                    if scan_matches != matches:
+                        self.stderr.write(f"The matches differ {scan_matches} != {matches}")
+                    self.stdout.write(f"{name:<10}{radius:>10.0f}{scan_ms:>12.2f}{geohash_ms:>14.2f}{matches:>10}")
+            #  nothing generated by the benchmark is saved
+            transaction.set_rollback(True)
+
+    def scan(self, latitude, longitude, radius):
+        """the radius filter without the index which computes the distance of every job"""
+        return Job.objects.annotate(
+            distance=get_distance_expression(latitude, longitude)).filter(distance__lte=radius)
+
+    def time_query(self, get_queryset, options):
+        """returns the average time in ms of counting the matches and loading the nearest page"""
+        timings = []
+        matches = 0
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            queryset = get_queryset()
+            matches = queryset.count()
+            list(queryset.order_by("distance", "id").values_list("id", flat=True)[:options["page_size"]])
+            timings.append((time.perf_counter() - start) * 1000)
+        return sum(timings) / len(timings), matches
+
+    def seed_jobs(self, count):
+        self.stdout.write(f"Generating {count} jobs")
+        customer = bulk_create_users("CUSTOMER", email_prefix="benchmark")[0]
+        batch_size = 10000
+        for offset in range(0, count, batch_size):
+            jobs = []
+            for _ in range(min(batch_size, count - offset)):
+                latitude = random.uniform(*LATITUDE_RANGE)
+                longitude = random.uniform(*LONGITUDE_RANGE)
+                #  bulk_create doesn't call save, so the geohash is set here
+                jobs.append(Job(id=uuid.uuid4(), customer=customer, name="Benchmark job", description="",
+                                budget=100, location="", duration=10, latitude=latitude, longitude=longitude,
+                                geohash=encode_geohash(latitude, longitude)))
+            Job.objects.bulk_create(jobs, batch_size=1000)
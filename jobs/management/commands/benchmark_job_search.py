@@ -0,0 +1,85 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from categorys.models import Category
+from jobs.models import Job
+from jobs.search import JobSearchFilter, get_job_search_backend
+from users.utils import bulk_create_users
+
+WORDS = [
+    "wedding", "dress", "suit", "tailor", "agbada", "kaftan", "lace", "ankara", "gown", "shirt", "trouser",
+    "embroidery", "alteration", "bridal", "uniform", "school", "office", "party", "native", "senator", "skirt",
+    "blouse", "jacket", "hem", "zip", "button", "measurement", "fitting", "design", "pattern", "fabric",
+]
+LOCATIONS = ["Lagos", "Abuja", "Ibadan", "Kano", "Enugu", "Port Harcourt", "Benin", "Jos"]
+CATEGORYS = ["Sewing", "Design", "Alteration", "Embroidery", "Bridal", "Uniforms"]
+#  the search fields used by the SearchFilter before the JobSearchFilter.
+#  categorys is searched by name since the SearchFilter can't use icontains on the relation itself
+SEARCH_FILTER_FIELDS = ["name", "description", "budget", "categorys__name", "location", "project_stage", "duration"]
+
+
+class SearchFilterView:
+    """the view attributes the SearchFilter reads"""
+    search_fields = SEARCH_FILTER_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Benchmark the job search filter against the SearchFilter on generated jobs which are rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--page-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed_jobs(options["jobs"])
+            terms = ["wedding", "bridal lace gown", "lagos", "embroidery agbada", "sewing"]
+            self.stdout.write(f"{'search':<22}{'SearchFilter ms':>18}{'JobSearchFilter ms':>22}{'matches':>10}")
+            for term in terms:
+                request = Request(APIRequestFactory().get("/api/v1/jobs/", {"search": term}))
+                search_filter_ms, _ = self.time_filter(SearchFilter(), request, options)
+                job_search_filter_ms, matches = self.time_filter(JobSearchFilter(), request, options)
+                self.stdout.write(f"{term:<22}{search_filter_ms:>18.2f}{job_search_filter_ms:>22.2f}{matches:>10}")
+            #  nothing generated by the benchmark is saved
+            transaction.set_rollback(True)
+
+    def time_filter(self, filter_backend, request, options):
+        """returns the average time in ms of counting the matches and loading the first page"""
+        timings = []
+        matches = 0
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            queryset = filter_backend.filter_queryset(request, Job.objects.job_feed(), SearchFilterView())
+            matches = queryset.count()
+            list(queryset[:options["page_size"]])
+            timings.append((time.perf_counter() - start) * 1000)
+        return sum(timings) / len(timings), matches
+
+    def seed_jobs(self, count):
+        self.stdout.write(f"Generating {count} jobs")
+        customer = bulk_create_users("CUSTOMER", email_prefix="benchmark")[0]
+        categorys = Category.objects.bulk_create([Category(id=uuid.uuid4(), name=name) for name in CATEGORYS])
+        jobs = Job.objects.bulk_create([
+            Job(
+                id=uuid.uuid4(),
+                customer=customer,
+                name=" ".join(random.sample(WORDS, 3)),
+                description=" ".join(random.choices(WORDS, k=40)),
+                budget=random.randint(10, 1000),
+                location=random.choice(LOCATIONS),
+                duration=random.randint(1, 60),
+            ) for _ in range(count)
+        ], batch_size=1000)
+        Job.categorys.through.objects.bulk_create([
+            Job.categorys.through(job_id=job.id, category_id=category.id)
+            for job in jobs for category in random.sample(categorys, 2)
+        ], batch_size=1000)
+        get_job_search_backend().index_jobs(Job.objects.filter(customer=customer).prefetch_related("categorys"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from jobs.models import Job
+from jobs.recommendations import index_active_jobs
+
+
+class Command(BaseCommand):
+    help = "Rebuild the recommendation index of every job. it is used after enabling the recommendations on existing jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        indexed = 0
+        last_id = None
+        while True:
+            #  the jobs are walked by id, so every batch costs the same
+            jobs = Job.objects.order_by("id").only("id", "project_stage", "timestamp")
+            if last_id:
+                jobs = jobs.filter(id__gt=last_id)
+            jobs = list(jobs[:batch_size])
+            if not jobs:
+                break
+            index_active_jobs(jobs)
+            indexed += len(jobs)
+            last_id = jobs[-1].id
+            self.stdout.write(f"Indexed {indexed} jobs")
+        self.stdout.write(self.style.SUCCESS(f"Successfully rebuilt the recommendation index of {indexed} jobs"))
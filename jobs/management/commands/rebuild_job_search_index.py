@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from jobs.models import Job
+from jobs.search import get_job_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search document of every job. it is used after enabling the job search on existing jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_job_search_backend()
+        backend.setup()
+        batch_size = options["batch_size"]
+        indexed = 0
+        last_id = None
+        while True:
+            #  the jobs are walked by id, so every batch costs the same
+            jobs = Job.objects.order_by("id").prefetch_related("categorys")
+            if last_id:
+                jobs = jobs.filter(id__gt=last_id)
+            jobs = list(jobs[:batch_size])
+            if not jobs:
+                break
+            backend.index_jobs(jobs)
+            indexed += len(jobs)
+            last_id = jobs[-1].id
+            self.stdout.write(f"Indexed {indexed} jobs")
+        self.stdout.write(self.style.SUCCESS(f"Successfully rebuilt the search index of {indexed} jobs"))
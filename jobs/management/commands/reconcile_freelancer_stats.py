@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from jobs.models import Review, Contract
+from users.models import User, FreelancerStats, STAR_COUNT_FIELDS
+
+COUNTER_FIELDS = ["stars_count", "stars_sum", *STAR_COUNT_FIELDS.values(), "completed_contracts_count"]
+
+
+class Command(BaseCommand):
+    help = "Re-derive the freelancer stats from the reviews and the completed contracts to backfill or repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Only report the freelancers with drifted stats")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = 0
+        repaired = 0
+        last_id = None
+        while True:
+            #  the freelancers are walked by id, so every batch costs the same
+            user_ids = User.objects.filter(user_type="FREELANCER").order_by("id")
+            if last_id:
+                user_ids = user_ids.filter(id__gt=last_id)
+            user_ids = list(user_ids.values_list("id", flat=True)[:batch_size])
+            if not user_ids:
+                break
+            repaired += self.reconcile_batch(user_ids, options["dry_run"])
+            checked += len(user_ids)
+            last_id = user_ids[-1]
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{action} {repaired} drifted freelancers out of {checked} freelancers"))
+
+    def reconcile_batch(self, user_ids, dry_run):
+        """returns the number of freelancers in the batch which had drifted stats"""
+        with transaction.atomic():
+            if not dry_run:
+                #  the missing rows are created first, so they are locked with the others
+                existing = set(FreelancerStats.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+                FreelancerStats.objects.bulk_create(
+                    [FreelancerStats(user_id=user_id) for user_id in user_ids if user_id not in existing],
+                    ignore_conflicts=True)
+            #  the stats rows are locked, so the F() updates of new reviews and contracts wait for the batch
+            stats = {item.user_id: item for item in FreelancerStats.objects.select_for_update().filter(
+                user_id__in=user_ids)}
+            review_aggregates = {"stars_count": Count("id"), "stars_sum": Sum("stars")}
+            for stars, field in STAR_COUNT_FIELDS.items():
+                review_aggregates[field] = Count("id", filter=Q(stars=stars))
+            review_counts = {
+                item["freelancer_id"]: item for item in Review.objects.filter(
+                    freelancer_id__in=user_ids).values("freelancer_id").annotate(**review_aggregates).order_by()
+            }
+            contract_counts = dict(
+                Contract.objects.filter(freelancer_id__in=user_ids, completed=True).values("freelancer_id").annotate(
+                    completed_contracts_count=Count("id")
+                ).order_by().values_list("freelancer_id", "completed_contracts_count")
+            )
+            drifted_stats = []
+            for user_id in user_ids:
+                counts = {field: review_counts.get(user_id, {}).get(field) or 0 for field in COUNTER_FIELDS}
+                counts["completed_contracts_count"] = contract_counts.get(user_id, 0)
+                item = stats.get(user_id, FreelancerStats(user_id=user_id))
+                current_counts = {field: getattr(item, field) for field in COUNTER_FIELDS}
+                if user_id in stats and current_counts == counts:
+                    continue
+                self.stdout.write(f"Freelancer {user_id} stats drifted: {current_counts} -> {counts}")
+                for field, value in counts.items():
+                    setattr(item, field, value)
+                item.average_stars = item.stars_sum / item.stars_count if item.stars_count else 0
+                drifted_stats.append(item)
+            if drifted_stats and not dry_run:
+                FreelancerStats.objects.bulk_update(drifted_stats, COUNTER_FIELDS + ["average_stars"])
+        return len(drifted_stats)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from jobs.models import Job, JobInvite, Proposal
+
+COUNTER_FIELDS = ["invites_count", "accepted_invites_count", "proposals_count"]
+
+
+class Command(BaseCommand):
+    help = "Re-derive the job invite and proposal counters from the invites and proposals to repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Only report the jobs with drifted counters")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = 0
+        repaired = 0
+        last_id = None
+        while True:
+            #  the jobs are walked by id, so every batch costs the same
+            job_ids = Job.objects.order_by("id")
+            if last_id:
+                job_ids = job_ids.filter(id__gt=last_id)
+            job_ids = list(job_ids.values_list("id", flat=True)[:batch_size])
+            if not job_ids:
+                break
+            repaired += self.reconcile_batch(job_ids, options["dry_run"])
+            checked += len(job_ids)
+            last_id = job_ids[-1]
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{action} {repaired} drifted jobs out of {checked} jobs"))
+
+    def reconcile_batch(self, job_ids, dry_run):
+        """returns the number of jobs in the batch which had drifted counters"""
+        #  the job rows are locked, so the F() updates of new invites and proposals wait for the batch
+        with transaction.atomic():
+            jobs = list(Job.objects.select_for_update().filter(id__in=job_ids).only("id", *COUNTER_FIELDS))
+            invite_counts = {
+                item["job_id"]: item for item in JobInvite.objects.filter(job_id__in=job_ids).values("job_id").annotate(
+                    invites_count=Count("id"),
+                    accepted_invites_count=Count("id", filter=Q(accepted=True))
+                ).order_by()
+            }
+            proposal_counts = dict(
+                Proposal.objects.filter(job_id__in=job_ids).values("job_id").annotate(
+                    proposals_count=Count("id")
+                ).order_by().values_list("job_id", "proposals_count")
+            )
+            drifted_jobs = []
+            for job in jobs:
+                counts = {
+                    "invites_count": invite_counts.get(job.id, {}).get("invites_count", 0),
+                    "accepted_invites_count": invite_counts.get(job.id, {}).get("accepted_invites_count", 0),
+                    "proposals_count": proposal_counts.get(job.id, 0),
+                }
+                current_counts = {field: getattr(job, field) for field in COUNTER_FIELDS}
+                if current_counts != counts:
+                    self.stdout.write(f"Job {job.id} counters drifted: {current_counts} -> {counts}")
+                    for field, value in counts.items():
+                        setattr(job, field, value)
+                    drifted_jobs.append(job)
+            if drifted_jobs and not dry_run:
+                Job.objects.bulk_update(drifted_jobs, COUNTER_FIELDS)
+        return len(drifted_jobs)
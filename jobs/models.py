@@ -1,6 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models import Q, F
+from django.db.models.fields.related_descriptors import ForwardOneToOneDescriptor
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.utils import timezone
 import uuid
 
 from categorys.models import Category
@@ -20,6 +23,19 @@ class JobManager(models.Manager):
             Q(project_stage="ACTIVE") |
             Q(project_stage="PROCESSING"))
 
+    def job_feed(self):
+        """
+        This returns the jobs with everything the job serializers need, so listing a page of jobs
+        costs the same number of queries whatever the page size.
+        the customer is joined and the categorys are prefetched. the invite and proposal counts are
+        counter columns on the job, so they don't touch the invites and proposals tables
+        """
+        return self.select_related("customer").prefetch_related("categorys")
+
+
+#  the counters of a job which are only written with F() (see the invites and proposals signals)
+JOB_COUNTER_FIELDS = {"invites_count", "accepted_invites_count", "proposals_count"}
+
 
 #  the project stage choice is used to check the status of the job
 PROJECT_STAGE_CHOICES = (
@@ -45,32 +61,221 @@ class Job(models.Model):
     budget = models.FloatField()
     categorys = models.ManyToManyField(Category)
     location = models.CharField(max_length=250)
+    #  the coordinates of the location are passed by the customer or geocoded from the location and the geohash
+    #  of the coordinates is indexed to filter the jobs around a point (see jobs/geo.py)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    geohash = models.CharField(max_length=12, blank=True, null=True, editable=False, db_index=True)
     project_stage = models.CharField(max_length=250, default="ACTIVE", choices=PROJECT_STAGE_CHOICES)
     # duration is measured  in days
     duration = models.IntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    #  the time the job was completed which is used to move old completed jobs to the archive
+    completed_at = models.DateTimeField(blank=True, null=True, editable=False)
+    #  the counters are updated with F() once an invite or proposal is created, accepted or deleted
+    #  and the reconcile_job_counters command repairs them if they drift
+    invites_count = models.IntegerField(default=0, editable=False)
+    accepted_invites_count = models.IntegerField(default=0, editable=False)
+    proposals_count = models.IntegerField(default=0, editable=False)
+    #  the weighted search document used by postgres full text search (see jobs/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
     objects = JobManager()
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            #  used by the cursor pagination of the job feed
+            models.Index(fields=["-timestamp", "-id"], name="jobs_job_ts_id_idx"),
+            #  used by the jobs of a customer filtered by their stage
+            models.Index(fields=["customer", "project_stage", "-timestamp"], name="jobs_job_customer_stage_idx"),
+            #  used by the archive task to find the old completed jobs
+            models.Index(fields=["project_stage", "completed_at"], name="jobs_job_stage_completed_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        #  a full save of a job loaded before an invite or proposal was counted doesn't write the old counters
+        #  over the new ones, only the signals and the reconcile_job_counters command change them
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in JOB_COUNTER_FIELDS]
+        #  the geohash always follows the coordinates
+        from jobs.geo import encode_geohash
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        if kwargs.get("update_fields") and {"latitude", "longitude"} & set(kwargs["update_fields"]):
+            kwargs["update_fields"] = {"geohash", *kwargs["update_fields"]}
+        #  the completed time is set once the job is completed
+        if self.project_stage == "COMPLETED" and not self.completed_at:
+            self.completed_at = timezone.now()
+            if kwargs.get("update_fields") and "project_stage" in kwargs["update_fields"]:
+                kwargs["update_fields"] = {"completed_at", *kwargs["update_fields"]}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #  the project stage loaded from the database is kept to know when the job changes stage
+        instance._loaded_project_stage = instance.__dict__.get("project_stage")
+        return instance
 
     def job_invites_count(self):
         #  this returns the total number of invite sent
-        return self.jobinvite_set.count()
+        return self.invites_count
 
     def accepted_job_invites_count(self):
         #  this returns the total number of accepted invites
-        return self.jobinvite_set.filter(accepted=True).count()
+        return self.accepted_invites_count
 
     def job_invites(self):
         # this returns all the job invites of this job
         return self.jobinvite_set.all()
 
 
+def post_save_index_job(sender, instance, update_fields=None, *args, **kwargs):
+    """
+    This updates the job search document once a job is being created or updated
+    :param instance:  the job created or updated
+    :param update_fields:  if only fields which are not searched are saved the document is not updated
+    """
+    # importing locally since the search module uses the job model
+    from jobs.search import get_job_search_backend
+    if update_fields and not {"name", "description", "location"} & set(update_fields):
+        return
+    if instance:
+        get_job_search_backend().index_jobs([instance])
+
+
+def pre_delete_remove_job_index(sender, instance, *args, **kwargs):
+    """
+    This removes the job from the search document before the job is deleted
+    """
+    from jobs.search import get_job_search_backend
+    get_job_search_backend().remove_job(instance.id)
+
+
+def m2m_changed_index_job(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    The job categorys are part of the search document, so it is updated once a category is added or removed
+    :param reverse: if true the categorys were modified from the category side and the pk_set are job ids
+    """
+    from jobs.search import get_job_search_backend
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if not reverse:
+        get_job_search_backend().index_jobs([instance])
+    elif pk_set:
+        get_job_search_backend().index_jobs(Job.objects.filter(id__in=pk_set).prefetch_related("categorys"))
+
+
+def post_save_index_category_jobs(sender, instance, created, *args, **kwargs):
+    """
+    This updates the search document of the jobs in a category once the category name is updated
+    """
+    from jobs.search import get_job_search_backend
+    if not created:
+        get_job_search_backend().index_jobs(instance.job_set.prefetch_related("categorys"))
+
+
+post_save.connect(post_save_index_job, sender=Job)
+pre_delete.connect(pre_delete_remove_job_index, sender=Job)
+m2m_changed.connect(m2m_changed_index_job, sender=Job.categorys.through)
+post_save.connect(post_save_index_category_jobs, sender=Category)
+
+
+class ActiveJobCategory(models.Model):
+    """
+    This is the inverted index of the job recommendations which maps a category to its active jobs.
+    a row exists for every category of an ACTIVE job, so the recommendations don't scan the job table.
+    the timestamp is copied from the job to get the newest jobs of a category from the index
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "job"], name="jobs_active_job_category_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["category", "-timestamp"], name="jobs_active_job_category_idx"),
+        ]
+
+
+def post_save_index_active_job(sender, instance, created, *args, **kwargs):
+    """
+    This updates the recommendation index once the project stage of a job changes, the job categorys
+    are added after the job is created, so a new job is indexed by m2m_changed_index_active_job
+    """
+    from jobs.recommendations import index_active_jobs
+    if not created and getattr(instance, "_loaded_project_stage", None) != instance.project_stage:
+        index_active_jobs([instance])
+    instance._loaded_project_stage = instance.project_stage
+
+
+def m2m_changed_index_active_job(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    This updates the recommendation index once a category is added to or removed from a job
+    :param reverse: if true the categorys were modified from the category side and the pk_set are job ids
+    """
+    from jobs.recommendations import index_active_jobs
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if not reverse:
+        index_active_jobs([instance])
+    elif pk_set:
+        index_active_jobs(Job.objects.filter(id__in=pk_set))
+    elif action == "post_clear":
+        #  the jobs of a cleared category are not passed
+        ActiveJobCategory.objects.filter(category=instance).delete()
+
+
+post_save.connect(post_save_index_active_job, sender=Job)
+m2m_changed.connect(m2m_changed_index_active_job, sender=Job.categorys.through)
+
+
+def post_save_update_job_autocomplete(sender, instance, created, update_fields=None, *args, **kwargs):
+    """
+    This adds the words of an active job name to the autocomplete of every worker or removes the job
+    once it is not active anymore, the saves which don't change the name or the stage are skipped
+    """
+    from jobs.autocomplete import update_job_autocomplete
+    if update_fields and not {"name", "project_stage"} & set(update_fields):
+        return
+    update_job_autocomplete(instance)
+
+
+def post_delete_update_job_autocomplete(sender, instance, *args, **kwargs):
+    from jobs.autocomplete import update_job_autocomplete
+    update_job_autocomplete(instance, deleted=True)
+
+
+def post_save_update_category_autocomplete(sender, instance, *args, **kwargs):
+    from jobs.autocomplete import update_category_autocomplete
+    update_category_autocomplete(instance)
+
+
+def post_delete_update_category_autocomplete(sender, instance, *args, **kwargs):
+    from jobs.autocomplete import update_category_autocomplete
+    update_category_autocomplete(instance, deleted=True)
+
+
+post_save.connect(post_save_update_job_autocomplete, sender=Job)
+post_delete.connect(post_delete_update_job_autocomplete, sender=Job)
+post_save.connect(post_save_update_category_autocomplete, sender=Category)
+post_delete.connect(post_delete_update_category_autocomplete, sender=Category)
+
+
+#  the number of freelancers a customer can invite to a job
+MAX_JOB_INVITES = 20
+
+
 class JobInvite(models.Model):
     """
     The job invite enables the customer to send an invitation to  freelancers
     but i made sure if a job is deleted then the invite get deleted
+    a freelancer can only be invited once to a job
     """
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4(), editable=False, unique=True)
@@ -82,6 +287,44 @@ class JobInvite(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=["job", "freelancer"], name="jobs_jobinvite_job_freelancer_unique"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #  the accepted value loaded from the database is kept to know when the invite is being accepted
+        instance._loaded_accepted = instance.__dict__.get("accepted")
+        return instance
+
+
+def post_save_count_job_invite(sender, instance, created, *args, **kwargs):
+    """
+    This updates the job invite counters once an invite is created or accepted
+    :param instance:  the job invite created or updated
+    """
+    if created:
+        Job.objects.filter(id=instance.job_id).update(
+            invites_count=F("invites_count") + 1,
+            accepted_invites_count=F("accepted_invites_count") + int(instance.accepted))
+    elif getattr(instance, "_loaded_accepted", None) is not None and instance._loaded_accepted != instance.accepted:
+        Job.objects.filter(id=instance.job_id).update(
+            accepted_invites_count=F("accepted_invites_count") + (1 if instance.accepted else -1))
+    instance._loaded_accepted = instance.accepted
+
+
+def post_delete_count_job_invite(sender, instance, *args, **kwargs):
+    """
+    This updates the job invite counters once an invite is deleted
+    """
+    Job.objects.filter(id=instance.job_id).update(
+        invites_count=F("invites_count") - 1,
+        accepted_invites_count=F("accepted_invites_count") - int(instance.accepted))
+
+
+post_save.connect(post_save_count_job_invite, sender=JobInvite)
+post_delete.connect(post_delete_count_job_invite, sender=JobInvite)
 
 
 PROPOSAL_STAGE_CHOICES = (
@@ -115,6 +358,124 @@ class Proposal(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            #  a freelancer can only make one proposal on a job
+            models.UniqueConstraint(fields=["job", "freelancer"], name="jobs_proposal_job_freelancer_unique"),
+        ]
+        indexes = [
+            #  used by the cursor pagination of the proposals of a job
+            models.Index(fields=["job", "-timestamp", "-id"], name="jobs_proposal_job_ts_id_idx"),
+            #  used by the bid stats of the proposals of a job
+            models.Index(fields=["job", "amount"], name="jobs_proposal_job_amount_idx"),
+        ]
+
+
+def post_save_count_proposal(sender, instance, created, *args, **kwargs):
+    """
+    This updates the job proposals counter once a proposal is created
+    """
+    if created:
+        Job.objects.filter(id=instance.job_id).update(proposals_count=F("proposals_count") + 1)
+
+
+def post_delete_count_proposal(sender, instance, *args, **kwargs):
+    """
+    This updates the job proposals counter once a proposal is deleted
+    """
+    Job.objects.filter(id=instance.job_id).update(proposals_count=F("proposals_count") - 1)
+
+
+def bump_proposal_stats_version(sender, instance, *args, **kwargs):
+    """
+    This invalidates the cached bid stats of the job once one of its proposals is saved or deleted
+    """
+    from jobs.cache import bump_proposal_stats_versions
+    bump_proposal_stats_versions([instance.job_id])
+
+
+post_save.connect(post_save_count_proposal, sender=Proposal)
+post_delete.connect(post_delete_count_proposal, sender=Proposal)
+post_save.connect(bump_proposal_stats_version, sender=Proposal)
+post_delete.connect(bump_proposal_stats_version, sender=Proposal)
+
+
+def bump_job_detail_version(sender, instance, *args, **kwargs):
+    """
+    This invalidates the cached detail of the job once the job, one of its invites or proposals is
+    saved or deleted, the invites and proposals are counted on the job detail
+    """
+    from jobs.cache import bump_job_versions
+    bump_job_versions([instance.id if isinstance(instance, Job) else instance.job_id])
+
+
+def m2m_changed_bump_job_detail_version(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    This invalidates the cached detail of the jobs once their categorys are modified
+    :param reverse: if true the categorys were modified from the category side and the pk_set are job ids
+    """
+    from jobs.cache import bump_job_versions
+    if not reverse:
+        if action in ["post_add", "post_remove", "post_clear"]:
+            bump_job_versions([instance.id])
+    elif action in ["post_add", "post_remove"]:
+        bump_job_versions(pk_set)
+    elif action == "pre_clear":
+        #  the jobs of a cleared category are not passed, so they are gotten before the clear
+        bump_job_versions(instance.job_set.values_list("id", flat=True))
+
+
+def post_save_bump_category_job_detail_version(sender, instance, created, *args, **kwargs):
+    """This invalidates the cached detail of the jobs of a category once the category is updated"""
+    from jobs.cache import bump_job_versions
+    if not created:
+        bump_job_versions(instance.job_set.values_list("id", flat=True))
+
+
+def post_save_bump_customer_job_detail_version(sender, instance, created, update_fields=None, *args, **kwargs):
+    """
+    This invalidates the cached detail of the jobs of a customer once his profile is updated,
+    the last login is saved every time the user logs in and is not on the job detail
+    """
+    from jobs.cache import bump_job_versions
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    bump_job_versions(instance.job_customers.values_list("id", flat=True))
+
+
+post_save.connect(bump_job_detail_version, sender=Job)
+post_delete.connect(bump_job_detail_version, sender=Job)
+post_save.connect(bump_job_detail_version, sender=JobInvite)
+post_delete.connect(bump_job_detail_version, sender=JobInvite)
+post_save.connect(bump_job_detail_version, sender=Proposal)
+post_delete.connect(bump_job_detail_version, sender=Proposal)
+m2m_changed.connect(m2m_changed_bump_job_detail_version, sender=Job.categorys.through)
+post_save.connect(post_save_bump_category_job_detail_version, sender=Category)
+post_save.connect(post_save_bump_customer_job_detail_version, sender=User)
+
+
+class ArchivableJobDescriptor(ForwardOneToOneDescriptor):
+    """this returns the archived job with the same id once the job was moved to the archive"""
+
+    def get_object(self, instance):
+        try:
+            return super().get_object(instance)
+        except self.field.related_model.DoesNotExist:
+            archived_job = ArchivedJob.objects.filter(id=getattr(instance, self.field.attname)).first()
+            if archived_job is None:
+                raise
+            return archived_job
+
+
+class ArchivableJobField(models.OneToOneField):
+    """
+    The job of a contract or a review which can be moved to the archive with the same id (see jobs/archive.py),
+    so the database doesn't check the job exists and the archived job is returned once it was moved
+    """
+    forward_related_accessor_class = ArchivableJobDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs["db_constraint"] = False
+        super().__init__(*args, **kwargs)
 
 
 class Review(models.Model):
@@ -125,7 +486,8 @@ class Review(models.Model):
     """
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4(), editable=False, unique=True)
-    job = models.OneToOneField(Job, on_delete=models.CASCADE)
+    #  the job can be moved to the archive like the job of a contract
+    job = ArchivableJobField(Job, on_delete=models.CASCADE)
     freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="review_freelancers")
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="review_customers")
     # the max number would be 5 and min number is 0
@@ -136,6 +498,50 @@ class Review(models.Model):
     class Meta:
         ordering = ['-timestamp']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #  the stars loaded from the database are kept to update the freelancer stats when they change
+        instance._loaded_stars = instance.__dict__.get("stars")
+        return instance
+
+
+def get_review_stats_deltas(stars, sign):
+    """returns the freelancer stats deltas of adding (sign=1) or removing (sign=-1) a review with the stars"""
+    from users.models import STAR_COUNT_FIELDS
+    deltas = {"stars_count": sign, "stars_sum": sign * stars}
+    if stars in STAR_COUNT_FIELDS:
+        deltas[STAR_COUNT_FIELDS[stars]] = sign
+    return deltas
+
+
+def post_save_update_review_freelancer_stats(sender, instance, created, *args, **kwargs):
+    """
+    This adds the review to the stats of the freelancer once it is created or its stars are changed
+    """
+    from users.models import FreelancerStats
+    loaded_stars = getattr(instance, "_loaded_stars", None)
+    if created:
+        FreelancerStats.objects.increment(instance.freelancer_id, **get_review_stats_deltas(instance.stars, 1))
+    elif loaded_stars is not None and loaded_stars != instance.stars:
+        deltas = get_review_stats_deltas(loaded_stars, -1)
+        for field, delta in get_review_stats_deltas(instance.stars, 1).items():
+            deltas[field] = deltas.get(field, 0) + delta
+        FreelancerStats.objects.increment(instance.freelancer_id, **deltas)
+    instance._loaded_stars = instance.stars
+
+
+def post_delete_update_review_freelancer_stats(sender, instance, *args, **kwargs):
+    """
+    This removes the review from the stats of the freelancer once it is deleted
+    """
+    from users.models import FreelancerStats
+    FreelancerStats.objects.increment(instance.freelancer_id, **get_review_stats_deltas(instance.stars, -1))
+
+
+post_save.connect(post_save_update_review_freelancer_stats, sender=Review)
+post_delete.connect(post_delete_update_review_freelancer_stats, sender=Review)
+
 
 class SavedJob(models.Model):
     """
@@ -170,8 +576,9 @@ class Contract(models.Model):
     # todo: add this to the schema this is new
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="contract_customers")
     freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="contract_freelancers")
-    #  a job can have only one contract
-    job = models.OneToOneField(Job, on_delete=models.CASCADE)
+    #  a job can have only one contract.
+    #  the job of a completed contract can be moved to the archive with the same id
+    job = ArchivableJobField(Job, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=1000, decimal_places=2)
     completed = models.BooleanField(default=False)
     start_date = models.DateField()
@@ -180,3 +587,95 @@ class Contract(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            #  used by the active contracts of a freelancer and of a customer
+            models.Index(fields=["freelancer", "completed"], name="jobs_contract_freelancer_idx"),
+            models.Index(fields=["customer", "completed"], name="jobs_contract_customer_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #  the completed value loaded from the database is kept to know when the contract is being completed
+        instance._loaded_completed = instance.__dict__.get("completed")
+        return instance
+
+
+def post_save_update_contract_freelancer_stats(sender, instance, created, *args, **kwargs):
+    """
+    This counts the contract in the stats of the freelancer once it is completed
+    """
+    from users.models import FreelancerStats
+    loaded_completed = False if created else getattr(instance, "_loaded_completed", None)
+    if loaded_completed is not None and loaded_completed != instance.completed:
+        FreelancerStats.objects.increment(
+            instance.freelancer_id, completed_contracts_count=1 if instance.completed else -1)
+    instance._loaded_completed = instance.completed
+
+
+def post_delete_update_contract_freelancer_stats(sender, instance, *args, **kwargs):
+    """
+    This removes a completed contract from the stats of the freelancer once it is deleted
+    """
+    from users.models import FreelancerStats
+    if instance.completed:
+        FreelancerStats.objects.increment(instance.freelancer_id, completed_contracts_count=-1)
+
+
+post_save.connect(post_save_update_contract_freelancer_stats, sender=Contract)
+post_delete.connect(post_delete_update_contract_freelancer_stats, sender=Contract)
+
+
+class ArchivedJob(models.Model):
+    """
+    A completed job moved out of the job table by the archive task with the same id (see jobs/archive.py),
+    so the job table and its indexes only hold the jobs which are still used.
+    the archived jobs are only read by the detail endpoints
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_job_customers")
+    name = models.CharField(max_length=250)
+    description = models.TextField()
+    budget = models.FloatField()
+    categorys = models.ManyToManyField(Category, blank=True, related_name="archived_jobs")
+    location = models.CharField(max_length=250)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    project_stage = models.CharField(max_length=250, choices=PROJECT_STAGE_CHOICES)
+    duration = models.IntegerField()
+    timestamp = models.DateTimeField()
+    completed_at = models.DateTimeField(blank=True, null=True)
+    invites_count = models.IntegerField(default=0)
+    accepted_invites_count = models.IntegerField(default=0)
+    proposals_count = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+
+
+class ArchivedProposal(models.Model):
+    """A proposal of an archived job"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_proposal_freelancers")
+    job = models.ForeignKey(ArchivedJob, on_delete=models.CASCADE, related_name="proposals")
+    proposal_stage = models.CharField(max_length=50, choices=PROPOSAL_STAGE_CHOICES)
+    amount = models.FloatField()
+    content = models.TextField()
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-timestamp']
+
+
+class ArchivedJobInvite(models.Model):
+    """An invite of an archived job"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_job_invite_customers")
+    freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_job_invite_freelancers")
+    job = models.ForeignKey(ArchivedJob, on_delete=models.CASCADE, related_name="invites")
+    accepted = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-timestamp']
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+#  only the categorys of the freelancer with the highest weights are read from the index
+MAX_RECOMMENDATION_CATEGORYS = 10
+#  the newest active jobs read from the index for every category, so a request costs the same
+#  whatever the number of jobs
+RECOMMENDATION_CANDIDATES_PER_CATEGORY = 200
+#  the number of recommended jobs which can be paginated
+MAX_RECOMMENDATIONS = 100
+
+
+def index_active_jobs(jobs):
+    """this replaces the recommendation index rows of the jobs passed, only the categorys of ACTIVE jobs are indexed"""
+    from jobs.models import ActiveJobCategory, Job
+
+    jobs = list(jobs)
+    ActiveJobCategory.objects.filter(job__in=jobs).delete()
+    active_jobs = {job.id: job for job in jobs if job.project_stage == "ACTIVE"}
+    if not active_jobs:
+        return
+    job_categorys = Job.categorys.through.objects.filter(job_id__in=active_jobs).values_list("job_id", "category_id")
+    ActiveJobCategory.objects.bulk_create([
+        ActiveJobCategory(category_id=category_id, job_id=job_id, timestamp=active_jobs[job_id].timestamp)
+        for job_id, category_id in job_categorys
+    ])
+
+
+def get_freelancer_category_weights(freelancer):
+    """
+    This returns the weight of every category of the freelancer and the ids of the jobs he has made a proposal on.
+    every catalogue counts once for its category and every past proposal counts once for each category of its job
+    """
+    from catalogues.models import Catalogue
+    from jobs.models import Proposal
+
+    weights = defaultdict(int)
+    for category_id in Catalogue.objects.filter(
+            freelancer=freelancer, category__isnull=False).values_list("category_id", flat=True):
+        weights[category_id] += 1
+    proposed_job_ids = set()
+    for job_id, category_id in Proposal.objects.filter(freelancer=freelancer).values_list("job_id", "job__categorys"):
+        proposed_job_ids.add(job_id)
+        if category_id:
+            weights[category_id] += 1
+    return weights, proposed_job_ids
+
+
+def recommend_job_ids(freelancer):
+    """
+    This returns the ids of the active jobs recommended to the freelancer from the best match.
+    a job scores the sum of the weights of its categorys the freelancer has and the newest job wins a tie.
+    the jobs the freelancer has already made a proposal on or has created are not recommended
+    """
+    from jobs.models import ActiveJobCategory, Job
+
+    weights, proposed_job_ids = get_freelancer_category_weights(freelancer)
+    categorys = sorted(weights, key=weights.get, reverse=True)[:MAX_RECOMMENDATION_CATEGORYS]
+    scores = defaultdict(int)
+    timestamps = {}
+    for category_id in categorys:
+        #  this uses the (category, timestamp) index, so only the candidates are read
+        candidates = ActiveJobCategory.objects.filter(category_id=category_id).order_by(
+            "-timestamp").values_list("job_id", "timestamp")[:RECOMMENDATION_CANDIDATES_PER_CATEGORY]
+        for job_id, timestamp in candidates:
+            if job_id in proposed_job_ids:
+                continue
+            scores[job_id] += weights[category_id]
+            timestamps[job_id] = timestamp
+    if not scores:
+        return []
+    #  the jobs which stopped being active without updating the index and the jobs of the freelancer are removed
+    #  before the recommendations are paginated, so the pages are full and the count is right
+    job_ids = Job.objects.filter(id__in=scores, project_stage="ACTIVE").exclude(customer=freelancer).values_list(
+        "id", flat=True)
+    return sorted(job_ids, key=lambda job_id: (scores[job_id], timestamps[job_id]), reverse=True)[:MAX_RECOMMENDATIONS]
@@ -0,0 +1,176 @@
+import re
+import uuid
+
+from django.db import connection
+from django.db.models import Q, Value, F, Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+#  the text search configuration used by postgres to stem the words
+POSTGRES_SEARCH_CONFIG = "english"
+#  the sqlite full text search table which is only used for local development
+SQLITE_SEARCH_TABLE = "jobs_job_fts"
+
+
+def get_job_categorys_text(job):
+    """this returns the names of the job categorys as a single text which is added to the search document"""
+    return " ".join(category.name for category in job.categorys.all())
+
+
+def get_search_tokens(terms):
+    """this splits the search terms into words and removes characters used by the search syntax"""
+    return re.findall(r"\w+", terms)
+
+
+class JobSearchBackend:
+    """
+    The default search backend used when the database has no full text search support.
+    it matches the name, description and location with icontains and does not rank the jobs
+    """
+
+    def setup(self):
+        """create the structures the backend needs, it is called once the migrations are done"""
+        pass
+
+    def index_jobs(self, jobs):
+        """update the search document of the jobs passed"""
+        pass
+
+    def remove_job(self, job_id):
+        """remove a deleted job from the search document"""
+        pass
+
+    def search(self, queryset, terms):
+        """returns the jobs matching the search terms ordered by relevance"""
+        for token in get_search_tokens(terms):
+            queryset = queryset.filter(
+                Q(name__icontains=token) |
+                Q(description__icontains=token) |
+                Q(location__icontains=token))
+        return queryset
+
+
+class PostgresJobSearchBackend(JobSearchBackend):
+    """
+    This keeps a weighted tsvector on Job.search_vector which is indexed with a GIN index.
+    the name weighs more than the categorys and location which weigh more than the description
+    """
+
+    def setup(self):
+        #  the GIN index is created here because sqlite is used locally and can't create it from the model
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_job_search_vector_gin ON jobs_job USING GIN (search_vector)")
+
+    def index_jobs(self, jobs):
+        from jobs.models import Job
+        from django.contrib.postgres.search import SearchVector
+
+        for job in jobs:
+            Job.objects.filter(id=job.id).update(search_vector=(
+                    SearchVector(Value(job.name), weight="A", config=POSTGRES_SEARCH_CONFIG) +
+                    SearchVector(Value(get_job_categorys_text(job)), weight="B", config=POSTGRES_SEARCH_CONFIG) +
+                    SearchVector(Value(job.location), weight="B", config=POSTGRES_SEARCH_CONFIG) +
+                    SearchVector(Value(job.description), weight="C", config=POSTGRES_SEARCH_CONFIG)
+            ))
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(terms, search_type="websearch", config=POSTGRES_SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        ).order_by("-search_rank", "-timestamp")
+
+
+class SQLiteJobSearchBackend(JobSearchBackend):
+    """
+    This keeps an FTS5 table for local development. The fts rows use the rowid of the job row,
+    so a job document is replaced without scanning the table.
+    The matches are ranked with bm25 using the same weights as the postgres backend
+    """
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE} USING fts5("
+                f"job_id UNINDEXED, name, categorys, location, description, tokenize='porter unicode61')")
+
+    def index_jobs(self, jobs):
+        with connection.cursor() as cursor:
+            for job in jobs:
+                #  the uuid is saved as hex by django on sqlite
+                self.remove_job(job.id)
+                cursor.execute(
+                    f"INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, job_id, name, categorys, location, description) "
+                    f"SELECT rowid, id, %s, %s, %s, %s FROM jobs_job WHERE id = %s",
+                    [job.name, get_job_categorys_text(job), job.location, job.description, job.id.hex])
+
+    def remove_job(self, job_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = (SELECT rowid FROM jobs_job WHERE id = %s)",
+                [uuid.UUID(str(job_id)).hex])
+
+    def search(self, queryset, terms):
+        tokens = get_search_tokens(terms)
+        if not tokens:
+            return queryset
+        #  every word is quoted, so it is matched as a word and not as the fts5 query syntax
+        match = " ".join(f'"{token}"' for token in tokens)
+        #  the fts table is joined on the rowid it shares with the job row, so the ranks are computed in one pass
+        #  over the matches. bm25 is lower for better matches, so it is negated to order the same way as postgres
+        return queryset.extra(
+            tables=[SQLITE_SEARCH_TABLE],
+            where=[f"{SQLITE_SEARCH_TABLE} MATCH %s", f'{SQLITE_SEARCH_TABLE}.rowid = "jobs_job".rowid'],
+            params=[match],
+            select={"search_rank": f"-bm25({SQLITE_SEARCH_TABLE}, 0, 10.0, 4.0, 4.0, 1.0)"},
+        ).order_by("-search_rank", "-timestamp")
+
+
+def get_job_search_backend():
+    """returns the search backend of the database currently used"""
+    if connection.vendor == "postgresql":
+        return PostgresJobSearchBackend()
+    if connection.vendor == "sqlite":
+        return SQLiteJobSearchBackend()
+    return JobSearchBackend()
+
+
+def post_migrate_setup_job_search(sender, **kwargs):
+    """this creates the search index once the migrations are done"""
+    get_job_search_backend().setup()
+
+
+class JobSearchFilter(BaseFilterBackend):
+    """
+    This is a drop-in replacement of the SearchFilter for jobs.
+    ?search= is matched against the job search document and ranked by relevance
+    ?categorys= is a comma separated list of category ids the job must have one of
+    """
+    search_param = api_settings.SEARCH_PARAM
+    category_param = "categorys"
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def get_category_ids(self, request):
+        category_ids = request.query_params.get(self.category_param, "")
+        try:
+            return [uuid.UUID(category_id) for category_id in category_ids.split(",") if category_id.strip()]
+        except ValueError:
+            raise ValidationError({self.category_param: "Please pass in valid category ids"})
+
+    def filter_queryset(self, request, queryset, view):
+        from jobs.models import Job
+
+        category_ids = self.get_category_ids(request)
+        if category_ids:
+            #  using exists instead of joining the categorys to prevent a job from being returned twice
+            queryset = queryset.filter(Exists(Job.categorys.through.objects.filter(
+                job_id=OuterRef("pk"), category_id__in=category_ids)))
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_job_search_backend().search(queryset, terms)
@@ -1,10 +1,13 @@
 from datetime import timedelta
+from decimal import Decimal
 
 from django.utils import timezone
 from rest_framework import serializers
 
 from categorys.serializers import CategorySerializer
-from jobs.models import Job, JobInvite, Proposal, Contract, PROPOSAL_STAGE_CHOICES, Review
+from jobs.models import Job, JobInvite, Proposal, Contract, PROPOSAL_STAGE_CHOICES, Review, MAX_JOB_INVITES, \
+    ArchivedJob, ArchivedProposal, ArchivedJobInvite
+from jobs.tasks import geocode_job_location
 from users.serializers import UserDetailSerializer, UserSerializer
 
 
@@ -14,8 +17,11 @@ class ListJobSerializers(serializers.ModelSerializer):
     """
     categorys = CategorySerializer(many=True, read_only=True)
     customer = UserDetailSerializer(read_only=True)
-    job_invites_count = serializers.SerializerMethodField(read_only=True)
-    accepted_job_invites_count = serializers.SerializerMethodField(read_only=True)
+    #  the invite counts are counter columns on the job to prevent two count queries per job
+    job_invites_count = serializers.IntegerField(source="invites_count", read_only=True)
+    accepted_job_invites_count = serializers.IntegerField(source="accepted_invites_count", read_only=True)
+    #  the distance in km is only returned when the jobs are filtered around a point
+    distance = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Job
@@ -25,23 +31,19 @@ class ListJobSerializers(serializers.ModelSerializer):
             "description",
             "budget",
             "location",
+            "latitude",
+            "longitude",
+            "distance",
             "duration",
             "timestamp",
             "job_invites_count",
             "accepted_job_invites_count",
+            "proposals_count",
             "categorys",
             "customer",
         ]
         read_only_fields = ["id", "timestamp"]
 
-    def get_job_invites_count(self, obj):
-        #  this returns the job invites count
-        return obj.job_invites_count()
-
-    def get_accepted_job_invites_count(self, obj):
-        #  this returns the job invites count
-        return obj.accepted_job_invites_count()
-
 
 class CreateUpdateJobSerializers(serializers.ModelSerializer):
     """
@@ -57,9 +59,21 @@ class CreateUpdateJobSerializers(serializers.ModelSerializer):
             "budget",
             "categorys",
             "location",
+            "latitude",
+            "longitude",
             "duration",
         ]
         read_only_fields = ["id"]
+        extra_kwargs = {
+            "latitude": {"min_value": -90, "max_value": 90},
+            "longitude": {"min_value": -180, "max_value": 180},
+        }
+
+    def validate(self, attrs):
+        #  the coordinates are passed together or not at all
+        if ("latitude" in attrs) != ("longitude" in attrs):
+            raise serializers.ValidationError("Please pass in both the latitude and longitude")
+        return attrs
 
     def create(self, validated_data):
         # the categorys is in this form categorys=[<category instance>, ...] which are the instances of a category
@@ -70,6 +84,17 @@ class CreateUpdateJobSerializers(serializers.ModelSerializer):
                 instance.categorys.add(item)
             except Exception as a:
                 print(a)
+        geocode_job_location(instance)
+        return instance
+
+    def update(self, instance, validated_data):
+        #  the coordinates of the old location are removed if the location changes without new coordinates
+        if "location" in validated_data and validated_data["location"] != instance.location \
+                and "latitude" not in validated_data:
+            validated_data["latitude"] = None
+            validated_data["longitude"] = None
+        instance = super().update(instance, validated_data)
+        geocode_job_location(instance)
         return instance
 
 
@@ -79,8 +104,9 @@ class RetrieveJobSerializer(serializers.ModelSerializer):
     """
     customer = UserDetailSerializer(read_only=True)
     categorys = CategorySerializer(many=True)
-    job_invites_count = serializers.SerializerMethodField(read_only=True)
-    accepted_job_invites_count = serializers.SerializerMethodField(read_only=True)
+    #  the invite counts are counter columns on the job to prevent two count queries per job
+    job_invites_count = serializers.IntegerField(source="invites_count", read_only=True)
+    accepted_job_invites_count = serializers.IntegerField(source="accepted_invites_count", read_only=True)
 
     class Meta:
         model = Job
@@ -91,21 +117,24 @@ class RetrieveJobSerializer(serializers.ModelSerializer):
             "description",
             "budget",
             "location",
+            "latitude",
+            "longitude",
             "project_stage",
             "duration",
             "job_invites_count",
             "accepted_job_invites_count",
+            "proposals_count",
             "timestamp",
             "categorys",
         ]
 
-    def get_job_invites_count(self, obj):
-        #  this returns the job invites count
-        return obj.job_invites_count()
 
-    def get_accepted_job_invites_count(self, obj):
-        #  this returns the job invites count
-        return obj.accepted_job_invites_count()
+class RetrieveArchivedJobSerializer(RetrieveJobSerializer):
+    """The detail of an archived job which is the same as the detail of a job with the time it was archived"""
+
+    class Meta(RetrieveJobSerializer.Meta):
+        model = ArchivedJob
+        fields = RetrieveJobSerializer.Meta.fields + ["completed_at", "archived_at"]
 
 
 CATEGORY_ACTION_CHOICES = (
@@ -125,6 +154,12 @@ class CreateJobInviteSerializer(serializers.Serializer):
     freelancer_id = serializers.CharField()
 
 
+class BulkCreateJobInviteSerializer(serializers.Serializer):
+    """this is meant for inviting many freelancers to a job at once"""
+    freelancer_ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=MAX_JOB_INVITES)
+
+
 class RetrieveJobInviteSerializer(serializers.ModelSerializer):
     """ this is meant to get all detail of the job invites and it used on the job invite retrieve api """
     customer = UserDetailSerializer(read_only=True)
@@ -141,6 +176,13 @@ class RetrieveJobInviteSerializer(serializers.ModelSerializer):
         ]
 
 
+class RetrieveArchivedJobInviteSerializer(RetrieveJobInviteSerializer):
+    """The detail of an invite of an archived job"""
+
+    class Meta(RetrieveJobInviteSerializer.Meta):
+        model = ArchivedJobInvite
+
+
 class RetrieveUpdateProposalSerializer(serializers.ModelSerializer):
     """This url is meant to list all proposals and also retrieve them"""
     freelancer = UserDetailSerializer(read_only=True)
@@ -159,6 +201,13 @@ class RetrieveUpdateProposalSerializer(serializers.ModelSerializer):
         read_only_fields = ["job_id", "id", "freelancer"]
 
 
+class RetrieveArchivedProposalSerializer(RetrieveUpdateProposalSerializer):
+    """The detail of a proposal of an archived job"""
+
+    class Meta(RetrieveUpdateProposalSerializer.Meta):
+        model = ArchivedProposal
+
+
 class CreateProposalSerializer(serializers.ModelSerializer):
     """this is meant for creating a job proposal """
 
@@ -184,7 +233,7 @@ class CreateContractSerializer(serializers.Serializer):
     this serializer is used to creating contract on a job post
     """
     proposal_id = serializers.CharField(max_length=250)
-    amount = serializers.DecimalField(max_digits=1000, decimal_places=2)
+    amount = serializers.DecimalField(max_digits=1000, decimal_places=2, min_value=Decimal("0.01"))
     start_date = serializers.DateField()
     end_date = serializers.DateField()
 
@@ -0,0 +1,51 @@
+from django.db import connection
+from django.db.models import Aggregate, FloatField, Min, Max, Count, Q
+
+from jobs.models import Proposal, PROPOSAL_STAGE_CHOICES
+
+
+class Median(Aggregate):
+    """the continuous median of postgres which interpolates between the two middle values"""
+    function = "PERCENTILE_CONT"
+    name = "median"
+    template = "%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+
+def get_fallback_median(queryset, count):
+    """
+    This returns the median amount on databases without a percentile aggregate.
+    only the one or two middle amounts are loaded from the amounts ordered on the database
+    """
+    if not count:
+        return None
+    middle = list(queryset.order_by("amount").values_list("amount", flat=True)[(count - 1) // 2:count // 2 + 1])
+    return sum(middle) / len(middle)
+
+
+def get_proposal_bid_stats(job_id):
+    """
+    This returns the min, median and max amount of the proposals of the job and the count of every stage.
+    everything is computed by one aggregate query on postgres, other databases use a second query for the median
+    """
+    queryset = Proposal.objects.filter(job_id=job_id)
+    aggregates = {
+        "count": Count("id"),
+        "min_amount": Min("amount"),
+        "max_amount": Max("amount"),
+    }
+    for stage, _ in PROPOSAL_STAGE_CHOICES:
+        aggregates[stage] = Count("id", filter=Q(proposal_stage=stage))
+    is_postgres = connection.vendor == "postgresql"
+    if is_postgres:
+        aggregates["median_amount"] = Median("amount")
+    stats = queryset.aggregate(**aggregates)
+    if not is_postgres:
+        stats["median_amount"] = get_fallback_median(queryset, stats["count"])
+    return {
+        "count": stats["count"],
+        "min_amount": stats["min_amount"],
+        "median_amount": stats["median_amount"],
+        "max_amount": stats["max_amount"],
+        "stage_counts": {stage: stats[stage] for stage, _ in PROPOSAL_STAGE_CHOICES},
+    }
@@ -0,0 +1,33 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+
+
+@shared_task
+def geocode_job_task(job_id):
+    """this saves the coordinates of the job location once they are found by the geocoder"""
+    from jobs.geo import geocode_location
+    from jobs.models import Job
+
+    job = Job.objects.filter(id=job_id).first()
+    if not job or job.latitude is not None:
+        return False
+    coordinates = geocode_location(job.location)
+    if not coordinates:
+        return False
+    job.latitude, job.longitude = coordinates
+    job.save(update_fields=["latitude", "longitude"])
+    return True
+
+
+def geocode_job_location(job):
+    """this geocodes the location of a job without coordinates once the job is saved if a geocoder is set"""
+    if job.latitude is None and settings.JOB_GEOCODER_URL:
+        transaction.on_commit(lambda: geocode_job_task.delay(str(job.id)))
+
+
+@shared_task
+def archive_completed_jobs_task(days=None, batch_size=None, max_batches=None):
+    """this moves the old completed jobs to the archive tables, the days and batch size default to the settings"""
+    from jobs.archive import archive_completed_jobs
+    return archive_completed_jobs(days=days, batch_size=batch_size, max_batches=max_batches)
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import base64
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from catalogues.models import Catalogue
+from instasaw_api.db_router import ReplicaRouter, ReplicaRoutingState, _routing_state, replica_lag_monitor
+from categorys.models import Category
+from jobs.archive import archive_completed_jobs
+from jobs.autocomplete import job_autocomplete, PrefixIndex
+from jobs.cache import job_detail_cache_stats, get_job_version_key
+from jobs.geo import encode_geohash
+from jobs.management.commands.audit_query_plans import get_sequential_scans
+from jobs.models import Job, JobInvite, Proposal, Contract, Review, ArchivedJob
+from jobs.search import get_job_search_backend
+from subscriptions.models import UserSubscription
+from transactions.models import Transaction
+from users.models import User, FreelancerStats, UserProfile
+from users.utils import bulk_create_users
+from virtual_wallets.models import Wallet
+
+
+class JobFeedQueryTestCase(TestCase):
+    """This pins the job list endpoints to a constant number of queries whatever the page size"""
+
+    def setUp(self):
+        self.customer, self.freelancer, self.other_freelancer = bulk_create_users("CUSTOMER", "FREELANCER", "FREELANCER")
+        self.categorys = Category.objects.bulk_create([
+            Category(id=uuid.uuid4(), name="Sewing"),
+            Category(id=uuid.uuid4(), name="Design"),
+        ])
+        for count in range(10):
+            self.create_job(f"Job {count}")
+
+    def create_job(self, name):
+        """Create a job with two categories, an invite and an accepted invite"""
+        job = Job.objects.create(
+            id=uuid.uuid4(),
+            customer=self.customer,
+            name=name,
+            description="Job description",
+            budget=100,
+            location="Lagos",
+            duration=10,
+        )
+        job.categorys.add(*self.categorys)
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer, job=job)
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.other_freelancer, job=job,
+                                 accepted=True)
+        return job
+
+    def get_api_client(self):
+        """Returns APIClient instance which is authenticated"""
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        return client
+
+    def test_job_list_query_count(self):
+        client = self.get_api_client()
+        for page_size in [1, 5, 10]:
+            #  the jobs with the customer and invite counts, and the categorys
+            with self.assertNumQueries(2):
+                response = client.get("/api/v1/jobs/", {"page_size": page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["results"]), page_size)
+        job = response.json()["results"][0]
+        self.assertEqual(job["job_invites_count"], 2)
+        self.assertEqual(job["accepted_job_invites_count"], 1)
+        self.assertEqual(len(job["categorys"]), 2)
+
+    def test_customer_job_list_query_count(self):
+        client = self.get_api_client()
+        for limit in [1, 5, 10]:
+            #  the customer lookup, the count, the jobs and the categorys
+            with self.assertNumQueries(4):
+                response = client.get(f"/api/v1/jobs/customer_jobs/{self.customer.id}/",
+                                      {"limit": limit, "project_stage": "active"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["results"]), limit)
+
+    def test_job_detail_query_count(self):
+        client = self.get_api_client()
+        job = Job.objects.first()
+        with self.assertNumQueries(2):
+            response = client.get(f"/api/v1/jobs/{job.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job_invites_count"], 2)
+        self.assertEqual(response.json()["accepted_job_invites_count"], 1)
+
+
+class JobSearchTestCase(TestCase):
+    """This tests the ranked job search and the category filtering of the job list"""
+
+    def setUp(self):
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        self.sewing, self.design = Category.objects.bulk_create([
+            Category(id=uuid.uuid4(), name="Sewing"),
+            Category(id=uuid.uuid4(), name="Design"),
+        ])
+        self.title_job = self.create_job("Wedding gown", "A long dress", self.sewing)
+        self.description_job = self.create_job("Native attire", "Needed for a wedding", self.design)
+        self.other_job = self.create_job("School uniform", "Twenty shirts", self.sewing)
+
+    def create_job(self, name, description, category):
+        job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name=name, description=description,
+                                 budget=100, location="Lagos", duration=10)
+        job.categorys.add(category)
+        return job
+
+    def search(self, params):
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        response = client.get("/api/v1/jobs/", params)
+        self.assertEqual(response.status_code, 200)
+        return [job["id"] for job in response.json()["results"]]
+
+    def test_search_is_ranked(self):
+        #  the name weighs more than the description
+        self.assertEqual(self.search({"search": "weddings"}), [str(self.title_job.id), str(self.description_job.id)])
+
+    def test_search_category_names(self):
+        self.assertEqual(self.search({"search": "design"}), [str(self.description_job.id)])
+
+    def test_filter_categorys(self):
+        job_ids = self.search({"categorys": f"{self.sewing.id}"})
+        self.assertCountEqual(job_ids, [str(self.title_job.id), str(self.other_job.id)])
+        job_ids = self.search({"categorys": f"{self.sewing.id},{self.design.id}", "search": "wedding"})
+        self.assertEqual(job_ids, [str(self.title_job.id), str(self.description_job.id)])
+
+    def test_searches_are_independent(self):
+        #  a search evaluated after another search keeps its own matches and ranks
+        weddings = get_job_search_backend().search(Job.objects.all(), "wedding")
+        uniforms = get_job_search_backend().search(Job.objects.all(), "uniform")
+        self.assertEqual(list(uniforms), [self.other_job])
+        self.assertEqual(list(weddings), [self.title_job, self.description_job])
+        self.assertEqual(weddings.count(), 2)
+
+    def test_updated_and_deleted_jobs(self):
+        self.other_job.name = "Wedding shirts"
+        self.other_job.save()
+        self.assertIn(str(self.other_job.id), self.search({"search": "wedding"}))
+        self.title_job.delete()
+        self.assertNotIn(str(self.title_job.id), self.search({"search": "wedding"}))
+
+
+class JobCursorPaginationTestCase(TestCase):
+    """This tests the cursor pagination of the job feed on (timestamp, id)"""
+
+    def setUp(self):
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        now = timezone.now()
+        jobs = Job.objects.bulk_create([
+            Job(id=uuid.uuid4(), customer=self.customer, name=f"Job {count}", description="Job description",
+                budget=100, location="Lagos", duration=10)
+            for count in range(7)
+        ])
+        #  some jobs share the same timestamp to make sure the id breaks the tie
+        for count, job in enumerate(jobs):
+            Job.objects.filter(id=job.id).update(timestamp=now - timedelta(minutes=count // 2))
+        job_ids = Job.objects.order_by("-timestamp", "-id").values_list("id", flat=True)
+        self.job_ids = [str(job_id) for job_id in job_ids]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def test_paginate_forward_and_backward(self):
+        job_ids = []
+        pages = []
+        url = "/api/v1/jobs/?page_size=3"
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            pages.append(response.json())
+            job_ids += [job["id"] for job in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(job_ids, self.job_ids)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]["previous"])
+        #  going back from the last page returns the middle page
+        response = self.client.get(pages[-1]["previous"])
+        self.assertEqual([job["id"] for job in response.json()["results"]], self.job_ids[3:6])
+        self.assertIsNotNone(response.json()["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1/jobs/", {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+        #  the id must be a uuid and the timestamp must have its time zone
+        for cursor in [f"n|{timezone.now().isoformat()}|notauuid", f"n|2024-01-01T00:00:00|{self.job_ids[0]}"]:
+            response = self.client.get("/api/v1/jobs/", {"cursor": base64.urlsafe_b64encode(cursor.encode()).decode()})
+            self.assertEqual(response.status_code, 404)
+
+
+class JobCountersTestCase(TestCase):
+    """This tests the invite and proposal counters of a job and the command which repairs them"""
+
+    def setUp(self):
+        self.customer, self.freelancer, self.other_freelancer = bulk_create_users("CUSTOMER", "FREELANCER", "FREELANCER")
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+
+    def assertCounters(self, invites_count, accepted_invites_count, proposals_count):
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.invites_count, invites_count)
+        self.assertEqual(self.job.accepted_invites_count, accepted_invites_count)
+        self.assertEqual(self.job.proposals_count, proposals_count)
+
+    def test_counters(self):
+        job_invite = JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer,
+                                              job=self.job)
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.other_freelancer,
+                                 job=self.job, accepted=True)
+        proposal = Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=self.job, amount=50,
+                                           content="I can do it")
+        self.assertCounters(2, 1, 1)
+        #  accepting an invite loaded from the database
+        job_invite = JobInvite.objects.get(id=job_invite.id)
+        job_invite.accepted = True
+        job_invite.save()
+        job_invite.save()
+        self.assertCounters(2, 2, 1)
+        job_invite.delete()
+        proposal.delete()
+        self.assertCounters(1, 1, 0)
+
+    def test_full_save_keeps_the_counters(self):
+        job = Job.objects.get(id=self.job.id)
+        #  an invite and a proposal are counted while the job is being updated
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer, job=self.job,
+                                 accepted=True)
+        Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=self.job, amount=50,
+                                content="I can do it")
+        job.name = "Bridal gown"
+        job.project_stage = "COMPLETED"
+        job.save()
+        self.assertCounters(1, 1, 1)
+        self.assertEqual((self.job.name, self.job.project_stage), ("Bridal gown", "COMPLETED"))
+        self.assertIsNotNone(self.job.completed_at)
+
+    def test_reconcile_job_counters(self):
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer, job=self.job,
+                                 accepted=True)
+        Job.objects.filter(id=self.job.id).update(invites_count=5, accepted_invites_count=0, proposals_count=3)
+        call_command("reconcile_job_counters", stdout=StringIO())
+        self.assertCounters(1, 1, 0)
+
+
+class JobRecommendationTestCase(TestCase):
+    """This tests the active jobs recommended to a freelancer from the recommendation index"""
+
+    def setUp(self):
+        self.customer, self.freelancer = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.sewing, self.design, self.bridal = Category.objects.bulk_create([
+            Category(id=uuid.uuid4(), name="Sewing"),
+            Category(id=uuid.uuid4(), name="Design"),
+            Category(id=uuid.uuid4(), name="Bridal"),
+        ])
+        #  sewing weighs 2 from the catalogues and design weighs 1 from the past proposal
+        for count in range(2):
+            Catalogue.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, name=f"Catalogue {count}",
+                                     description="Catalogue description", category=self.sewing)
+        proposed_job = self.create_job("Proposed job", self.design)
+        Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=proposed_job, amount=50,
+                                content="I can do it")
+        self.both_job = self.create_job("Both job", self.sewing, self.design)
+        self.sewing_job = self.create_job("Sewing job", self.sewing)
+        self.design_job = self.create_job("Design job", self.design)
+        self.bridal_job = self.create_job("Bridal job", self.bridal)
+        self.completed_job = self.create_job("Completed job", self.sewing)
+        self.completed_job.project_stage = "COMPLETED"
+        self.completed_job.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.freelancer)
+
+    def create_job(self, name, *categorys):
+        job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name=name, description="Job description",
+                                 budget=100, location="Lagos", duration=10)
+        job.categorys.add(*categorys)
+        return job
+
+    def get_recommended_job_ids(self):
+        response = self.client.get("/api/v1/jobs/recommendations/")
+        self.assertEqual(response.status_code, 200)
+        return [job["id"] for job in response.json()["results"]]
+
+    def test_recommendations_are_ranked(self):
+        self.assertEqual(self.get_recommended_job_ids(),
+                         [str(self.both_job.id), str(self.sewing_job.id), str(self.design_job.id)])
+
+    def test_index_follows_the_jobs(self):
+        self.completed_job.project_stage = "ACTIVE"
+        self.completed_job.save()
+        self.sewing_job.project_stage = "PROCESSING"
+        self.sewing_job.save()
+        self.both_job.categorys.remove(self.sewing)
+        self.bridal_job.categorys.add(self.sewing)
+        #  the newest job wins a tie
+        self.assertEqual(self.get_recommended_job_ids(), [
+            str(self.completed_job.id), str(self.bridal_job.id), str(self.design_job.id), str(self.both_job.id)])
+
+    def test_pages_skip_the_jobs_not_recommended(self):
+        #  a job of the freelancer and a job which stopped being active without updating the index
+        own_job = Job.objects.create(id=uuid.uuid4(), customer=self.freelancer, name="Own job",
+                                     description="Job description", budget=100, location="Lagos", duration=10)
+        own_job.categorys.add(self.sewing)
+        Job.objects.filter(id=self.both_job.id).update(project_stage="PROCESSING")
+        response = self.client.get("/api/v1/jobs/recommendations/", {"limit": 1})
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual([job["id"] for job in response.json()["results"]], [str(self.sewing_job.id)])
+        response = self.client.get("/api/v1/jobs/recommendations/", {"limit": 1, "offset": 1})
+        self.assertEqual([job["id"] for job in response.json()["results"]], [str(self.design_job.id)])
+
+    def test_customers_are_not_allowed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        self.assertEqual(client.get("/api/v1/jobs/recommendations/").status_code, 403)
+
+
+class JobInviteBulkCreateTestCase(TestCase):
+    """This tests inviting many freelancers to a job at once"""
+
+    def setUp(self):
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        self.freelancers = bulk_create_users(*["FREELANCER"] * 22)
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def invite(self, freelancers):
+        return self.client.post(f"/api/v1/jobs/job_invites/{self.job.id}/bulk/", {
+            "freelancer_ids": [str(freelancer.id) for freelancer in freelancers]}, format="json")
+
+    def test_bulk_invite(self):
+        JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancers[0], job=self.job)
+        #  the job lock, the freelancers, the existing invites, the insert and the counter inside a savepoint
+        with self.assertNumQueries(7):
+            response = self.invite(self.freelancers[:10])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["invited"]), 9)
+        self.assertEqual(response.json()["already_invited"], [str(self.freelancers[0].id)])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.invites_count, 10)
+        self.assertEqual(self.job.jobinvite_set.count(), 10)
+
+    def test_job_detail_is_invalidated(self):
+        cache.clear()
+        self.assertEqual(self.client.get(f"/api/v1/jobs/{self.job.id}/").json()["job_invites_count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.invite(self.freelancers[:3]).status_code, 201)
+        response = self.client.get(f"/api/v1/jobs/{self.job.id}/")
+        self.assertEqual((response["X-Cache"], response.json()["job_invites_count"]), ("MISS", 3))
+
+    def test_invite_limit(self):
+        self.assertEqual(self.invite(self.freelancers[:15]).status_code, 201)
+        response = self.invite(self.freelancers[10:])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.job.jobinvite_set.count(), 15)
+        self.assertEqual(self.invite(self.freelancers[10:20]).status_code, 201)
+        self.assertEqual(self.job.jobinvite_set.count(), 20)
+
+    def test_invalid_freelancers(self):
+        missing_freelancer = User(id=uuid.uuid4())
+        response = self.invite([self.freelancers[0], missing_freelancer])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["freelancer_ids"], [str(missing_freelancer.id)])
+        self.assertEqual(self.invite([self.freelancers[0], self.customer]).status_code, 400)
+        self.assertFalse(self.job.jobinvite_set.exists())
+
+
+class JobLocationFilterTestCase(TestCase):
+    """This tests the radius and nearest filtering of the job list on the geohash of the job coordinates"""
+
+    def setUp(self):
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        self.lagos_job = self.create_job("Lagos", 6.5244, 3.3792)
+        self.ikeja_job = self.create_job("Ikeja", 6.6018, 3.3515)
+        self.ibadan_job = self.create_job("Ibadan", 7.3775, 3.9470)
+        self.abuja_job = self.create_job("Abuja", 9.0765, 7.3986)
+        self.create_job("Somewhere", None, None)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def create_job(self, location, latitude, longitude):
+        return Job.objects.create(id=uuid.uuid4(), customer=self.customer, name=f"{location} job",
+                                  description="Job description", budget=100, location=location, duration=10,
+                                  latitude=latitude, longitude=longitude)
+
+    def get_jobs(self, params):
+        response = self.client.get("/api/v1/jobs/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_encode_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(self.lagos_job.geohash, encode_geohash(6.5244, 3.3792))
+
+    def test_radius(self):
+        jobs = self.get_jobs({"latitude": 6.5244, "longitude": 3.3792, "radius": 20})
+        self.assertCountEqual([job["id"] for job in jobs], [str(self.lagos_job.id), str(self.ikeja_job.id)])
+        self.assertTrue(all(job["distance"] <= 20 for job in jobs))
+
+    def test_nearest(self):
+        jobs = self.get_jobs({"latitude": 6.62, "longitude": 3.35, "radius": 150, "nearest": "true"})
+        self.assertEqual([job["id"] for job in jobs],
+                         [str(self.ikeja_job.id), str(self.lagos_job.id), str(self.ibadan_job.id)])
+        self.assertAlmostEqual(jobs[2]["distance"], 105, delta=5)
+
+    def test_coordinates_update_the_geohash(self):
+        self.abuja_job.latitude, self.abuja_job.longitude = 6.5245, 3.3793
+        self.abuja_job.save(update_fields=["latitude", "longitude"])
+        jobs = self.get_jobs({"latitude": 6.5244, "longitude": 3.3792, "radius": 1})
+        self.assertCountEqual([job["id"] for job in jobs], [str(self.lagos_job.id), str(self.abuja_job.id)])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get("/api/v1/jobs/", {"latitude": 100, "longitude": 3}).status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/jobs/", {"latitude": 6.5}).status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/jobs/", {"nearest": "true"}).status_code, 400)
+
+
+class JobDetailCacheTestCase(TestCase):
+    """This tests the versioned cache of the job detail and its invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        job_detail_cache_stats.reset()
+        self.customer, self.freelancer = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.staff = bulk_create_users("CUSTOMER", is_staff=True)[0]
+        self.category = Category.objects.create(id=uuid.uuid4(), name="Sewing")
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def get_job(self, cache_status):
+        response = self.client.get(f"/api/v1/jobs/{self.job.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], cache_status)
+        return response.json()
+
+    def test_hot_job_is_cached(self):
+        self.get_job("MISS")
+        with self.assertNumQueries(0):
+            self.get_job("HIT")
+
+    def test_invalidation(self):
+        self.get_job("MISS")
+        with self.captureOnCommitCallbacks(execute=True):
+            JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer,
+                                     job=self.job)
+        self.assertEqual(self.get_job("MISS")["job_invites_count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.categorys.add(self.category)
+        self.assertEqual(len(self.get_job("MISS")["categorys"]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Tailoring"
+            self.category.save()
+        self.assertEqual(self.get_job("MISS")["categorys"][0]["name"], "Tailoring")
+        #  the subscription is created to skip the post_save signal which contacts PayPal
+        UserSubscription.objects.bulk_create([UserSubscription(id=uuid.uuid4(), user=self.customer)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.first_name = "Updated"
+            self.customer.save()
+        self.assertEqual(self.get_job("MISS")["customer"]["first_name"], "Updated")
+        with self.captureOnCommitCallbacks(execute=True):
+            Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=self.job, amount=50,
+                                    content="I can do it")
+        self.assertEqual(self.get_job("MISS")["proposals_count"], 1)
+        self.get_job("HIT")
+
+    def test_non_canonical_id(self):
+        self.get_job("MISS")
+        #  the id in upper case is the same cache key as the id bumped by the signals
+        url = f"/api/v1/jobs/{str(self.job.id).upper()}/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.name = "Bridal gown"
+            self.job.save()
+        response = self.client.get(url)
+        self.assertEqual((response["X-Cache"], response.json()["name"]), ("MISS", "Bridal gown"))
+        self.assertEqual(self.client.get("/api/v1/jobs/not-a-uuid/").status_code, 404)
+        self.assertIsNone(cache.get(get_job_version_key("not-a-uuid")))
+
+    def test_cache_stats(self):
+        self.get_job("MISS")
+        self.get_job("HIT")
+        self.get_job("HIT")
+        client = APIClient()
+        client.force_authenticate(user=self.staff)
+        response = client.get("/api/v1/jobs/cache_stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"hits": 2, "misses": 1, "hit_ratio": 2 / 3})
+        self.assertEqual(self.client.get("/api/v1/jobs/cache_stats/").status_code, 403)
+
+
+class CreateContractTestCase(TestCase):
+    """This tests creating a contract which debits the customer wallet once"""
+
+    def setUp(self):
+        self.customer, self.freelancer = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.wallet = Wallet.objects.bulk_create([Wallet(id=uuid.uuid4(), user=self.customer, balance=100)])[0]
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+        self.proposal = Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=self.job,
+                                                amount=50, content="I can do it")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def create_contract(self, amount):
+        today = str(timezone.now().date())
+        return self.client.post(f"/api/v1/jobs/contracts/job/{self.job.id}/", {
+            "proposal_id": str(self.proposal.id), "amount": amount, "start_date": today, "end_date": today})
+
+    def test_create_contract(self):
+        response = self.create_contract("60.00")
+        self.assertEqual(response.status_code, 201)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("40.00"))
+        transaction = Transaction.objects.get(user=self.customer)
+        self.assertEqual((transaction.previous_balance, transaction.current_balance),
+                         (Decimal("100.00"), Decimal("40.00")))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.project_stage, "PROCESSING")
+        self.proposal.refresh_from_db()
+        self.assertEqual(self.proposal.proposal_stage, "ACCEPTED")
+        #  a second click doesn't pay twice
+        response = self.create_contract("30.00")
+        self.assertEqual(response.json()["error"], "This job already have a contract")
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("40.00"))
+
+    def test_not_enough_balance(self):
+        response = self.create_contract("100.00")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Contract.objects.exists())
+        self.assertEqual(self.create_contract("-10.00").status_code, 400)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal("100.00"))
+
+
+class ProposalBidStatsTestCase(TestCase):
+    """This tests the bid stats added to the proposal list of a job and their invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer, *self.freelancers = bulk_create_users("CUSTOMER", *["FREELANCER"] * 5)
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+        Proposal.objects.bulk_create([
+            Proposal(id=uuid.uuid4(), freelancer=freelancer, job=self.job, amount=amount, content="I can do it",
+                     proposal_stage=stage)
+            for freelancer, amount, stage in zip(self.freelancers, [40, 10, 30, 20],
+                                                 ["PROCESSING", "PROCESSING", "INTERVIEWING", "ACCEPTED"])
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def get_bid_stats(self):
+        response = self.client.get(f"/api/v1/jobs/proposals/{self.job.id}/?page_size=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1)
+        return response.json()["bid_stats"]
+
+    def test_bid_stats(self):
+        self.assertEqual(self.get_bid_stats(), {
+            "count": 4, "min_amount": 10, "median_amount": 25, "max_amount": 40,
+            "stage_counts": {"PROCESSING": 2, "INTERVIEWING": 1, "ACCEPTED": 1},
+        })
+        #  the cached stats only need the job and the page
+        with self.assertNumQueries(2):
+            self.get_bid_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancers[4], job=self.job, amount=100,
+                                    content="I can do it")
+        bid_stats = self.get_bid_stats()
+        self.assertEqual((bid_stats["count"], bid_stats["median_amount"], bid_stats["max_amount"]), (5, 30, 100))
+        self.assertEqual(bid_stats["stage_counts"]["PROCESSING"], 3)
+
+    def test_non_canonical_id(self):
+        #  the id in upper case is the same cache key as the id bumped by the signals
+        url = f"/api/v1/jobs/proposals/{str(self.job.id).upper()}/"
+        self.assertEqual(self.client.get(url).json()["bid_stats"]["count"], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancers[4], job=self.job, amount=100,
+                                    content="I can do it")
+        self.assertEqual(self.client.get(url).json()["bid_stats"]["count"], 5)
+        self.assertEqual(self.client.get("/api/v1/jobs/proposals/not-a-uuid/").status_code, 404)
+
+    def test_no_proposal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Proposal.objects.all().delete()
+        response = self.client.get(f"/api/v1/jobs/proposals/{self.job.id}/")
+        self.assertEqual(response.json()["bid_stats"], {
+            "count": 0, "min_amount": None, "median_amount": None, "max_amount": None,
+            "stage_counts": {"PROCESSING": 0, "INTERVIEWING": 0, "ACCEPTED": 0},
+        })
+
+
+class FreelancerStatsTestCase(TestCase):
+    """This tests the freelancer stats updated by the reviews and the contracts and the freelancer directory"""
+
+    def setUp(self):
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        self.freelancer, self.other_freelancer = bulk_create_users("FREELANCER", "FREELANCER", verified=True)
+        self.profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=self.freelancer), UserProfile(user=self.other_freelancer)])
+        self.jobs = Job.objects.bulk_create([
+            Job(id=uuid.uuid4(), customer=self.customer, name=f"Job {count}", description="Job description",
+                budget=100, location="Lagos", duration=10)
+            for count in range(3)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def create_review(self, job, freelancer, stars):
+        return Review.objects.create(id=uuid.uuid4(), job=job, freelancer=freelancer, customer=self.customer,
+                                     stars=stars, description="Good job")
+
+    def get_stats(self, freelancer):
+        return FreelancerStats.objects.get(user=freelancer)
+
+    def test_reviews_update_stats(self):
+        self.create_review(self.jobs[0], self.freelancer, 5)
+        review = self.create_review(self.jobs[1], self.freelancer, 2)
+        stats = self.get_stats(self.freelancer)
+        self.assertEqual((stats.stars_count, stats.stars_sum, stats.average_stars), (2, 7, 3.5))
+        self.assertEqual((stats.two_stars_count, stats.five_stars_count), (1, 1))
+        review = Review.objects.get(id=review.id)
+        review.stars = 4
+        review.save()
+        stats = self.get_stats(self.freelancer)
+        self.assertEqual((stats.stars_count, stats.stars_sum, stats.average_stars), (2, 9, 4.5))
+        self.assertEqual((stats.two_stars_count, stats.four_stars_count), (0, 1))
+        review.delete()
+        stats = self.get_stats(self.freelancer)
+        self.assertEqual((stats.stars_count, stats.stars_sum, stats.average_stars), (1, 5, 5.0))
+
+    def test_completed_contracts_update_stats(self):
+        today = timezone.now().date()
+        contract = Contract.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer,
+                                           job=self.jobs[0], amount=10, start_date=today, end_date=today)
+        self.assertFalse(FreelancerStats.objects.filter(user=self.freelancer).exists())
+        contract = Contract.objects.get(id=contract.id)
+        contract.completed = True
+        contract.save()
+        #  saving it again doesn't count it twice
+        contract.save()
+        self.assertEqual(self.get_stats(self.freelancer).completed_contracts_count, 1)
+
+    def test_freelancer_directory_ordered_by_stats(self):
+        self.create_review(self.jobs[0], self.other_freelancer, 5)
+        self.create_review(self.jobs[1], self.freelancer, 3)
+        self.create_review(self.jobs[2], self.freelancer, 4)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/v1/users/freelancers/", {"ordering": "-average_stars"})
+        freelancers = response.json()["results"]
+        self.assertEqual([freelancer["user"]["id"] for freelancer in freelancers],
+                         [str(self.other_freelancer.id), str(self.freelancer.id)])
+        self.assertEqual(freelancers[1]["stats"]["average_stars"], 3.5)
+        response = self.client.get("/api/v1/users/freelancers/", {"ordering": "-stars_count"})
+        self.assertEqual(response.json()["results"][0]["user"]["id"], str(self.freelancer.id))
+        response = self.client.get(f"/api/v1/users/freelancers/{self.profiles[0].id}/")
+        self.assertEqual(response.json()["stats"]["stars_histogram"], {"1": 0, "2": 0, "3": 1, "4": 1, "5": 0})
+
+    def test_new_freelancers_get_stats(self):
+        #  the subscription is created to skip the post_save signal which contacts PayPal
+        UserSubscription.objects.bulk_create([UserSubscription(id=uuid.uuid4(), user=self.customer)])
+        self.customer.user_type = "FREELANCER"
+        self.customer.verified = True
+        self.customer.last_login = timezone.now()
+        self.customer.save(update_fields=["last_login"])
+        self.assertFalse(FreelancerStats.objects.filter(user=self.customer).exists())
+        self.customer.save()
+        self.assertEqual(self.get_stats(self.customer).stars_count, 0)
+        #  a freelancer without reviews is listed with the zero stats
+        response = self.client.get("/api/v1/users/freelancers/", {"ordering": "-average_stars"})
+        self.assertEqual([freelancer["user"]["id"] for freelancer in response.json()["results"]],
+                         [str(self.customer.id)])
+
+    def test_reconcile_freelancer_stats(self):
+        self.create_review(self.jobs[0], self.freelancer, 4)
+        FreelancerStats.objects.filter(user=self.freelancer).update(stars_count=3, stars_sum=1)
+        call_command("reconcile_freelancer_stats", stdout=StringIO())
+        stats = self.get_stats(self.freelancer)
+        self.assertEqual((stats.stars_count, stats.stars_sum, stats.average_stars), (1, 4, 4.0))
+        #  the freelancer without stats gets a row
+        self.assertEqual(self.get_stats(self.other_freelancer).stars_count, 0)
+
+
+class AuditQueryPlansTestCase(TestCase):
+    """This tests the EXPLAIN audit of the hot querysets"""
+
+    def test_hot_querysets_use_an_index(self):
+        out = StringIO()
+        call_command("audit_query_plans", stdout=out)
+        self.assertIn("hot querysets use an index", out.getvalue())
+
+    def test_sequential_scans(self):
+        self.assertEqual(get_sequential_scans("2 0 0 SCAN jobs_job", "sqlite"), ["jobs_job"])
+        self.assertEqual(get_sequential_scans("2 0 0 SCAN jobs_job USING INDEX jobs_job_ts_id_idx", "sqlite"), [])
+        self.assertEqual(get_sequential_scans("Seq Scan on jobs_job  (cost=0.00..1.01 rows=1)", "postgresql"),
+                         ["jobs_job"])
+
+
+class JobArchiveTestCase(TestCase):
+    """This tests moving the old completed jobs to the archive and reading them from the detail endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer, self.freelancer = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.category = Category.objects.create(id=uuid.uuid4(), name="Sewing")
+        self.jobs = []
+        for count in range(3):
+            job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name=f"Job {count}",
+                                     description="Job description", budget=100, location="Lagos", duration=10)
+            job.categorys.add(self.category)
+            job.project_stage = "COMPLETED"
+            job.save(update_fields=["project_stage"])
+            self.jobs.append(job)
+        #  the first two jobs were completed a year ago and the last one today
+        Job.objects.filter(id__in=[self.jobs[0].id, self.jobs[1].id]).update(
+            completed_at=timezone.now() - timedelta(days=365))
+        self.proposal = Proposal.objects.create(id=uuid.uuid4(), freelancer=self.freelancer, job=self.jobs[0],
+                                                amount=50, content="I can do it", proposal_stage="ACCEPTED")
+        self.job_invite = JobInvite.objects.create(id=uuid.uuid4(), customer=self.customer,
+                                                   freelancer=self.freelancer, job=self.jobs[0])
+        today = timezone.now().date()
+        self.contract = Contract.objects.create(id=uuid.uuid4(), customer=self.customer, freelancer=self.freelancer,
+                                                job=self.jobs[0], amount=50, start_date=today, end_date=today,
+                                                completed=True)
+        Review.objects.create(id=uuid.uuid4(), job=self.jobs[0], freelancer=self.freelancer, customer=self.customer,
+                              stars=5, description="Good job")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def test_completed_at(self):
+        self.assertIsNotNone(Job.objects.get(id=self.jobs[2].id).completed_at)
+
+    def test_archive_in_resumable_batches(self):
+        self.assertEqual(archive_completed_jobs(days=30, batch_size=1, max_batches=1), 1)
+        self.assertEqual(archive_completed_jobs(days=30, batch_size=1), 1)
+        self.assertEqual(archive_completed_jobs(days=30), 0)
+        self.assertEqual(set(Job.objects.values_list("id", flat=True)), {self.jobs[2].id})
+        self.assertEqual(ArchivedJob.objects.count(), 2)
+        self.assertFalse(Proposal.objects.exists())
+        self.assertFalse(JobInvite.objects.exists())
+        #  the contract, the review and the stats of the freelancer are kept
+        self.assertEqual(Contract.objects.get(id=self.contract.id).job_id, self.jobs[0].id)
+        self.assertEqual(Review.objects.count(), 1)
+        self.assertEqual(FreelancerStats.objects.get(user=self.freelancer).stars_count, 1)
+
+    def test_archived_job_detail(self):
+        archive_completed_jobs(days=30)
+        response = self.client.get(f"/api/v1/jobs/{self.jobs[0].id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Job 0")
+        self.assertEqual(response.json()["categorys"][0]["name"], "Sewing")
+        self.assertIsNotNone(response.json()["archived_at"])
+        response = self.client.get(f"/api/v1/jobs/proposals/{self.jobs[0].id}/{self.proposal.id}/")
+        self.assertEqual(response.json()["proposal_stage"], "ACCEPTED")
+        response = self.client.get(f"/api/v1/jobs/job_invites/{self.jobs[0].id}/{self.job_invite.id}/")
+        self.assertEqual(response.json()["freelancer"]["id"], str(self.freelancer.id))
+        response = self.client.get(f"/api/v1/jobs/{uuid.uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_contract_and_review_of_archived_job(self):
+        archive_completed_jobs(days=30)
+        #  the job of the contract and of the review is the archived job
+        contract = Contract.objects.get(id=self.contract.id)
+        self.assertIsInstance(contract.job, ArchivedJob)
+        self.assertEqual(contract.job.name, "Job 0")
+        self.assertIsInstance(Review.objects.get(job_id=self.jobs[0].id).job, ArchivedJob)
+        response = self.client.get(f"/api/v1/jobs/contracts/{self.contract.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job_id"], str(self.jobs[0].id))
+        response = self.client.get(f"/api/v1/jobs/reviews/given/{self.customer.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["job_id"], str(self.jobs[0].id))
+        #  a job which is in neither table still raises
+        Contract.objects.filter(id=self.contract.id).update(job_id=uuid.uuid4())
+        with self.assertRaises(Job.DoesNotExist):
+            Contract.objects.get(id=self.contract.id).job
+
+
+class JobAutocompleteTestCase(TestCase):
+    """This tests the job autocomplete served from the prefix index of the worker"""
+
+    def setUp(self):
+        #  the index of the process is built again from the jobs of the test
+        job_autocomplete.built = False
+        self.customer = bulk_create_users("CUSTOMER")[0]
+        self.category = Category.objects.create(id=uuid.uuid4(), name="Wedding Dresses")
+        self.jobs = [
+            Job.objects.create(id=uuid.uuid4(), customer=self.customer, name=name, description="Job description",
+                               budget=100, location="Lagos", duration=10)
+            for name in ["Wedding gown", "Wedding suit", "Golf shirt"]
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def autocomplete(self, q):
+        response = self.client.get("/api/v1/jobs/autocomplete/", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_autocomplete(self):
+        self.assertEqual(self.autocomplete("wed")["suggestions"], ["wedding"])
+        self.assertEqual(self.autocomplete("wed")["categorys"], [{"id": str(self.category.id), "name": "Wedding Dresses"}])
+        #  the last word is completed
+        with self.assertNumQueries(0):
+            self.assertEqual(self.autocomplete("wedding g")["suggestions"], ["wedding golf", "wedding gown"])
+        self.assertEqual(self.autocomplete(""), {"suggestions": [], "categorys": []})
+
+    def test_index_follows_the_jobs(self):
+        self.autocomplete("g")
+        with self.captureOnCommitCallbacks(execute=True):
+            job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Gele", description="Head tie",
+                                     budget=100, location="Lagos", duration=10)
+        self.assertIn("gele", self.autocomplete("ge")["suggestions"])
+        with self.captureOnCommitCallbacks(execute=True):
+            job.project_stage = "PROCESSING"
+            job.save(update_fields=["project_stage"])
+            self.jobs[2].delete()
+        self.assertEqual(self.autocomplete("g")["suggestions"], ["gown"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Bridal"
+            self.category.save()
+        self.assertEqual(self.autocomplete("wed")["categorys"], [])
+
+    def test_background_build(self):
+        #  the lookups build the index without a background thread when redis is not set
+        self.autocomplete("wed")
+        self.assertIsNone(job_autocomplete.listener)
+        #  the app starts the background build once it is loaded if it is set,
+        #  the index is already built since the thread doesn't see the jobs of the test transaction
+        with override_settings(JOB_AUTOCOMPLETE_PRELOAD=True):
+            apps.get_app_config("jobs").ready()
+        listener = job_autocomplete.listener
+        self.assertEqual(listener.name, "job-autocomplete")
+        job_autocomplete.stop()
+        self.assertFalse(listener.is_alive())
+        self.assertIsNone(job_autocomplete.listener)
+
+    def test_memory_cap(self):
+        index = PrefixIndex(max_terms=2)
+        index.build([("1", {"wedding", "gown"}), ("2", {"wedding", "suit"})])
+        #  the terms of the most keys are kept
+        self.assertIn("wedding", index.terms)
+        self.assertEqual((len(index), index.dropped_terms), (2, 1))
+        index.remove("1")
+        index.remove("2")
+        index.add("3", ["golf", "shirt", "polo"])
+        self.assertEqual(len(index), 2)
+
+    def test_every_match_is_ranked(self):
+        index = PrefixIndex(max_terms=2000)
+        index.build([(str(number), {f"g{number:04}"}) for number in range(1500)])
+        #  the term of the most keys sorts after the first 1000 terms starting with the prefix
+        for key in range(3):
+            index.add(f"popular{key}", ["gzzz"])
+        self.assertEqual(index.search("g", 2), ["gzzz", "g0000"])
+        self.assertEqual(index.search("g149", 20), [f"g{number}" for number in range(1490, 1500)])
+        self.assertEqual(index.search("h", 2), [])
+        #  the ranking of a prefix with many terms is kept until one of its terms changes
+        self.assertIn("g", index.ranked_prefixes)
+        for key in range(4):
+            index.add(f"more{key}", ["g0001"])
+        self.assertEqual(index.search("g", 2), ["g0001", "gzzz"])
+        index.remove("more0")
+        index.remove("more1")
+        self.assertEqual(index.search("g", 1), ["gzzz"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTestCase(TransactionTestCase):
+    """
+    This tests the reads sent to the replica with the replica being a second sqlite database which is never
+    written to, so a read served by the replica doesn't see the rows of the primary
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        replica_lag_monitor.checks.clear()
+        self.customer, self.freelancer = bulk_create_users("CUSTOMER", "FREELANCER")
+        self.staff = bulk_create_users("CUSTOMER", is_staff=True)[0]
+        self.job = Job.objects.create(id=uuid.uuid4(), customer=self.customer, name="Wedding gown",
+                                      description="A long dress", budget=100, location="Lagos", duration=10)
+
+    def get_api_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def list_jobs(self, client):
+        response = client.get("/api/v1/jobs/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_read_your_writes(self):
+        customer_client = self.get_api_client(self.customer)
+        freelancer_client = self.get_api_client(self.freelancer)
+        self.assertEqual(self.list_jobs(customer_client), [])
+        response = customer_client.patch(f"/api/v1/jobs/{self.job.id}/", {"name": "Wedding suit"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        #  the customer reads from the primary after the write while the other users still read from the replica
+        self.assertEqual([job["name"] for job in self.list_jobs(customer_client)], ["Wedding suit"])
+        self.assertEqual(self.list_jobs(freelancer_client), [])
+        cache.clear()
+        self.assertEqual(self.list_jobs(customer_client), [])
+
+    def test_routing(self):
+        router = ReplicaRouter()
+        #  outside a request everything uses the primary
+        self.assertIsNone(router.db_for_read(Job))
+        token = _routing_state.set(ReplicaRoutingState(RequestFactory().get("/")))
+        try:
+            self.assertEqual(router.db_for_read(Job), "replica")
+            router.db_for_write(Job)
+            self.assertEqual(router.db_for_read(Job), "default")
+        finally:
+            _routing_state.reset(token)
+        #  a replica behind the primary is not read from
+        replica_lag_monitor.checks["replica"] = (time.monotonic(), 60, None)
+        token = _routing_state.set(ReplicaRoutingState(RequestFactory().get("/")))
+        try:
+            self.assertEqual(router.db_for_read(Job), "default")
+        finally:
+            _routing_state.reset(token)
+
+    def test_replica_health(self):
+        response = self.get_api_client(self.staff).get("/api/v1/health/replicas/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "replicas": {"replica": {"lag": None, "error": None, "healthy": True}}, "healthy": True})
+        self.assertEqual(self.get_api_client(self.customer).get("/api/v1/health/replicas/").status_code, 403)
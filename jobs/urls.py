@@ -4,7 +4,8 @@ from .views import JobCreateAPIView, JobRetrieveUpdateDestroyAPIView, JobCategor
     JobInviteListCreateAPIView, JobListAPIView, JobInviteRetrieveDestroyAPIView, ProposalRetrieveUpdateDestroyAPIView, \
     ProposalListAPIView, GivenReviewListAPIView, ReceivedReviewListAPIView, ReviewDetailAPIView, ModifyProposalAPIView, \
     CreateContractAPIView, CustomerContractListAPIView, FreelancerActiveContractsListAPIView, ContractRetrieveAPIView, \
-    MarkContractCompletedAPIView
+    MarkContractCompletedAPIView, RecommendedJobListAPIView, JobInviteBulkCreateAPIView, JobDetailCacheStatsAPIView, \
+    JobAutocompleteAPIView
 
 urlpatterns = [
     # Job routes
@@ -14,11 +15,19 @@ urlpatterns = [
     # for the CREATE it requires more verification)
     path("", JobListAPIView.as_view(), name="list_jobs"),
     path("create/", JobCreateAPIView.as_view(), name="create_job"),
+    # list the active jobs recommended to the logged in freelancer
+    path("recommendations/", RecommendedJobListAPIView.as_view(), name="list_recommended_jobs"),
+    # complete the job search box as the user types
+    path("autocomplete/", JobAutocompleteAPIView.as_view(), name="job_autocomplete"),
+    # the hit ratio of the job detail cache for staffs
+    path("cache_stats/", JobDetailCacheStatsAPIView.as_view(), name="job_detail_cache_stats"),
     path("<str:id>/", JobRetrieveUpdateDestroyAPIView.as_view(), name="retrieve_update_destroy_job"),
     path("<str:id>/update_category/", JobCategoryUpdateAPIView.as_view(), name="update_job_category"),
 
     #  Job invite routes
     path("job_invites/<str:id>/", JobInviteListCreateAPIView.as_view(), name="create_job_invite"),
+    #  invite many freelancers to a job at once
+    path("job_invites/<str:id>/bulk/", JobInviteBulkCreateAPIView.as_view(), name="bulk_create_job_invite"),
     #  retrieve and destroy a job invite
     path("job_invites/<str:job_id>/<str:job_invite_id>/", JobInviteRetrieveDestroyAPIView.as_view(),
          name="retrieve_destroy_job_invite"),
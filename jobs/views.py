@@ -1,47 +1,104 @@
 import uuid
 
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Exists
+from django.db.models.functions import Coalesce
 from django.http import Http404
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, \
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, get_object_or_404, \
     RetrieveDestroyAPIView, CreateAPIView, RetrieveAPIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from categorys.models import Category
-from jobs.models import Job, JobInvite, Contract, Review
+from instasaw_api.paginators import TimestampCursorPagination
+from jobs.autocomplete import job_autocomplete, DEFAULT_AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT
+from jobs.cache import get_cached_job_detail, cache_job_detail, job_detail_cache_stats, get_cached_proposal_stats, \
+    cache_proposal_stats, bump_job_versions
+from jobs.geo import JobLocationFilter
+from jobs.models import Job, JobInvite, Contract, Review, MAX_JOB_INVITES, ArchivedJob, ArchivedProposal, \
+    ArchivedJobInvite
+from jobs.recommendations import recommend_job_ids
+from jobs.search import JobSearchFilter
+from jobs.stats import get_proposal_bid_stats
 from jobs.serializers import CreateUpdateJobSerializers, RetrieveJobSerializer, UpdateJobCategorySerializer, \
     CreateJobInviteSerializer, RetrieveJobInviteSerializer, ListJobSerializers, CreateProposalSerializer, \
     RetrieveUpdateProposalSerializer, ModifyProposalSerializer, CreateContractSerializer, ReviewCreateSerializer, \
-    ReviewSerializer, ContractSerializer
+    ReviewSerializer, ContractSerializer, BulkCreateJobInviteSerializer, RetrieveArchivedJobSerializer, \
+    RetrieveArchivedProposalSerializer, RetrieveArchivedJobInviteSerializer
 from subscriptions.permissions import CustomerMembershipPermission
 from transactions.models import Transaction
 from users.models import User
-from users.permissions import LoggedInPermission
+from users.permissions import LoggedInPermission, FreelancerPermission, LoggedInStaffPermission
+from virtual_wallets.models import Wallet
+
+
+def get_job_uuid(job_id):
+    """
+    This returns the job id of the url as a uuid or raises a 404 if it is not one,
+    so the cache keys of a job are the same whatever the case the id is written in
+    """
+    try:
+        return uuid.UUID(job_id)
+    except ValueError:
+        raise Http404
 
 
 class JobListAPIView(ListAPIView):
-    """List all jobs """
+    """List all jobs
+    JobSearchFilter : used for the ranked full text search with ?search= and filtering with ?categorys=
+    JobLocationFilter : used for filtering the jobs within a ?radius= of ?latitude= and ?longitude=
+     and ordering them from the nearest with ?nearest=true
+    OrderingFilter : used for ordering
+    """
     permission_classes = [LoggedInPermission]
     serializer_class = ListJobSerializers
-    filter_backends = [SearchFilter, OrderingFilter]
-    queryset = Job.objects.all()
-    search_fields = [
-        "name",
-        "description",
-        "budget",
-        "categorys",
-        "location",
-        "project_stage",
-        "duration",
-    ]
+    filter_backends = [JobSearchFilter, JobLocationFilter, OrderingFilter]
+    pagination_class = TimestampCursorPagination
+    queryset = Job.objects.job_feed()
 
     def get_queryset(self):
-        """this is getting the filtered queryset from search filter
-                 then adding more filtering   """
-        queryset = self.filter_queryset(self.queryset.all())
-        # FIXME: ASK QUESTION ON HOW THE QUERY WILL LOOK LIKE
+        """the search and ordering filters are applied once by the list function,
+         so this only returns the job feed queryset"""
+        return self.queryset.all()
 
-        return queryset
+    @property
+    def paginator(self):
+        """
+        The feed is paginated with the cursor on the timestamp, but a search is ordered by relevance,
+        the nearest jobs are ordered by distance and the ordering param changes the order,
+        so they use the limit offset pagination
+        """
+        if not hasattr(self, "_paginator"):
+            query_params = self.request.query_params
+            if query_params.get(api_settings.SEARCH_PARAM) or query_params.get(api_settings.ORDERING_PARAM) or \
+                    JobLocationFilter().is_nearest(self.request):
+                self._paginator = LimitOffsetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class RecommendedJobListAPIView(ListAPIView):
+    """
+    This lists the active jobs recommended to the logged in freelancer from the best match.
+    the jobs are ranked by the categorys of the freelancer catalogues and past proposals
+    using the recommendation index, so it doesn't scan the jobs
+    """
+    permission_classes = [LoggedInPermission & FreelancerPermission]
+    serializer_class = ListJobSerializers
+    pagination_class = LimitOffsetPagination
+
+    def list(self, request, *args, **kwargs):
+        #  the recommended jobs are only the active jobs of the other customers, so the pages are full
+        job_ids = self.paginate_queryset(recommend_job_ids(self.request.user))
+        #  only the jobs of the page are loaded and they are returned in the order of the recommendations
+        jobs = Job.objects.job_feed().filter(id__in=job_ids)
+        jobs = sorted(jobs, key=lambda job: job_ids.index(job.id))
+        serializer = self.get_serializer(jobs, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class CustomerJobListAPIView(ListAPIView):
@@ -63,20 +120,38 @@ class CustomerJobListAPIView(ListAPIView):
         if not customer:
             # if the customer  does not exist I raise a 404 page
             raise Http404
+        #  the filtering was achieved through the related_names for job model to the customer
+        #  and the job feed loads the customer, categorys and invite counts used by the serializer
+        customer_jobs = customer.job_customers.job_feed()
         #  check the project stage
         # only if the project stage was passed
         if project_stage:
             # changing the project_stage to upper case to enable exact filtering
             project_stage = project_stage.upper()
             if project_stage == "ACTIVE":
-                #  the filtering was achieved through the related_names for job model to the customer
-                return customer.job_customers.filter(project_stage=project_stage)
+                return customer_jobs.filter(project_stage=project_stage)
             elif project_stage == "PROCESSING":
-                return customer.job_customers.filter(project_stage=project_stage)
+                return customer_jobs.filter(project_stage=project_stage)
             elif project_stage == "COMPLETED":
-                return customer.job_customers.filter(project_stage=project_stage)
+                return customer_jobs.filter(project_stage=project_stage)
         #  if the IF statement wasn't given it returns all the jobs for that particular customer
-        return customer.job_customers.all()
+        return customer_jobs
+
+
+class JobAutocompleteAPIView(APIView):
+    """
+    This completes the job search box as the user types with ?q= which is the text typed
+    and ?limit= which is the number of suggestions. the words of the active job names and the categorys
+    are looked up in the prefix index kept in memory by the worker, so it doesn't query the database
+    """
+    permission_classes = [LoggedInPermission]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get("limit", DEFAULT_AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+        except ValueError:
+            return Response({"error": "The limit must be a number"}, status=400)
+        return Response(job_autocomplete.lookup(request.query_params.get("q", ""), max(limit, 1)))
 
 
 class JobCreateAPIView(CreateAPIView):
@@ -98,13 +173,29 @@ class JobRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
     permission_classes = [LoggedInPermission]
     serializer_class = RetrieveJobSerializer
     lookup_field = "id"
-    queryset = Job.objects.all()
+    queryset = Job.objects.job_feed()
 
     def retrieve(self, request, *args, **kwargs):
-        """override the retrieve function to use our custom serializer"""
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        """
+        override the retrieve function to use our custom serializer.
+        the serialized job is cached with the version of the job, so a hot job is a single cache GET
+        and the X-Cache header tells if it was a HIT or a MISS
+        """
+        job_id = str(get_job_uuid(self.kwargs.get("id")))
+        data = get_cached_job_detail(job_id)
+        if data is not None:
+            return Response(data, headers={"X-Cache": "HIT"})
+        data = cache_job_detail(job_id, self.get_job_detail)
+        return Response(data, headers={"X-Cache": "MISS"})
+
+    def get_job_detail(self):
+        """this returns the detail of the job or of the archived job if the job was moved to the archive"""
+        try:
+            return self.get_serializer(self.get_object()).data
+        except Http404:
+            archived_job = get_object_or_404(
+                ArchivedJob.objects.select_related("customer").prefetch_related("categorys"), id=self.kwargs.get("id"))
+            return RetrieveArchivedJobSerializer(archived_job).data
 
     def update(self, request, *args, **kwargs):
         # instance we are updating
@@ -127,6 +218,14 @@ class JobRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         return Response(status=204)
 
 
+class JobDetailCacheStatsAPIView(APIView):
+    """This returns the hits, misses and hit ratio of the job detail cache"""
+    permission_classes = [LoggedInStaffPermission]
+
+    def get(self, request, *args, **kwargs):
+        return Response(job_detail_cache_stats.get_stats(), status=200)
+
+
 class JobCategoryUpdateAPIView(APIView):
     """
     The update job category only takes in the freelancer id and also the job id is passed in the params
@@ -191,7 +290,7 @@ class JobInviteListCreateAPIView(ListCreateAPIView):
         if job.customer != self.request.user:
             return Response({"error": "You are not allowed to create an invite on this job post."}, status=400)
         #  check if the user has created up to 20 invites for a job
-        if job.jobinvite_set.count() >= 20:
+        if job.invites_count >= MAX_JOB_INVITES:
             return Response({"error": "You are not allowed to create job invite above 20"}, status=400)
         serializer = CreateJobInviteSerializer(data=self.request.data)
         serializer.is_valid(raise_exception=True)
@@ -210,6 +309,61 @@ class JobInviteListCreateAPIView(ListCreateAPIView):
         return Response({"message": "Successfully create job Invite"}, status=201)
 
 
+class JobInviteBulkCreateAPIView(APIView):
+    """
+    This view is used to invite many freelancers to a job at once, it requires the list of freelancer_ids.
+    the freelancers are validated with one query and the invites are created with one insert,
+    the freelancers who were already invited are skipped
+    """
+    permission_classes = [LoggedInPermission]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BulkCreateJobInviteSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        freelancer_ids = set(serializer.validated_data.get("freelancer_ids"))
+        # check if the freelancer ids don't contain the logged-in user
+        if self.request.user.id in freelancer_ids:
+            return Response({"error": "You cant invite your self to work on this job"}, status=400)
+        with transaction.atomic():
+            #  the job is locked, so two bulk invites on the same job can't go above the invite limit
+            job = self.request.user.job_customers.filter_active_and_processing_jobs().select_for_update().filter(
+                id=self.kwargs.get("id")).first()
+            if not job:
+                return Response({"error": "Job doesnt exist with the id provided"}, status=404)
+            # check the freelancer ids if they exist in the database and the users must also be freelancers
+            freelancers = set(User.objects.filter(
+                id__in=freelancer_ids, user_type="FREELANCER").values_list("id", flat=True))
+            if freelancers != freelancer_ids:
+                return Response({
+                    "error": "Freelancer does not exist",
+                    "freelancer_ids": [str(freelancer_id) for freelancer_id in freelancer_ids - freelancers]
+                }, status=400)
+            invited = set(job.jobinvite_set.filter(
+                freelancer_id__in=freelancers).values_list("freelancer_id", flat=True))
+            new_freelancers = freelancers - invited
+            #  check if the new invites will take the job above 20 invites
+            if job.invites_count + len(new_freelancers) > MAX_JOB_INVITES:
+                return Response({"error": f"You are not allowed to create job invite above {MAX_JOB_INVITES}"},
+                                status=400)
+            #  the id is passed since the default id of the model is the same for every instance
+            JobInvite.objects.bulk_create([
+                JobInvite(id=uuid.uuid4(), customer=self.request.user, freelancer_id=freelancer_id, job=job)
+                for freelancer_id in new_freelancers
+            ], ignore_conflicts=True)
+            #  bulk_create doesn't send the post_save signals, so the invites counter is counted again
+            #  which also covers an invite created at the same time on the single invite endpoint
+            Job.objects.filter(id=job.id).update(invites_count=Coalesce(Subquery(
+                JobInvite.objects.filter(job_id=OuterRef("id")).values("job_id").annotate(
+                    count=Count("id")).values("count")), 0))
+            #  the update doesn't send the post_save signals either, so the cached job detail is invalidated here
+            bump_job_versions([job.id])
+        return Response({
+            "message": "Successfully create job Invites",
+            "invited": [str(freelancer_id) for freelancer_id in new_freelancers],
+            "already_invited": [str(freelancer_id) for freelancer_id in invited],
+        }, status=201)
+
+
 class JobInviteRetrieveDestroyAPIView(RetrieveDestroyAPIView):
     """
     This view is meant to delete or retrieve a job post
@@ -235,6 +389,17 @@ class JobInviteRetrieveDestroyAPIView(RetrieveDestroyAPIView):
             raise Http404
         return job_invite
 
+    def retrieve(self, request, *args, **kwargs):
+        #  the invite of an archived job is read from the archive
+        try:
+            instance = self.get_object()
+        except Http404:
+            archived_job_invite = get_object_or_404(
+                ArchivedJobInvite.objects.select_related("customer", "freelancer"),
+                id=self.kwargs.get("job_invite_id"), job_id=self.kwargs.get("job_id"), job__customer=request.user)
+            return Response(RetrieveArchivedJobInviteSerializer(archived_job_invite).data)
+        return Response(self.get_serializer(instance).data)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         #  check if the current user is the owner of the job invite
@@ -248,6 +413,7 @@ class ProposalListAPIView(ListCreateAPIView):
     """This view is meant to list all proposal of a job  and also create a proposal"""
     serializer_class = RetrieveUpdateProposalSerializer
     permission_classes = [LoggedInPermission]
+    pagination_class = TimestampCursorPagination
 
     def get_queryset(self):
         #  the job id is passed on the urls, so  we get it from the kwargs
@@ -256,8 +422,21 @@ class ProposalListAPIView(ListCreateAPIView):
         if not job:
             #  if the job does not exist I raise  a http 404 page
             raise Http404
-        #  returns all the proposal for that job post
-        return job.proposal_set.all()
+        #  returns all the proposal for that job post with their freelancer which is serialized
+        return job.proposal_set.select_related("freelancer")
+
+    def list(self, request, *args, **kwargs):
+        """
+        this adds the bid stats of all the proposals of the job to the page, they are cached
+        until a proposal of the job is saved or deleted
+        """
+        job_id = str(get_job_uuid(self.kwargs.get("job_id")))
+        response = super().list(request, *args, **kwargs)
+        bid_stats = get_cached_proposal_stats(job_id)
+        if bid_stats is None:
+            bid_stats = cache_proposal_stats(job_id, lambda: get_proposal_bid_stats(job_id))
+        response.data["bid_stats"] = bid_stats
+        return response
 
     def create(self, request, *args, **kwargs):
         job_id = self.kwargs.get("job_id")
@@ -303,6 +482,17 @@ class ProposalRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
             raise Http404
         return proposal
 
+    def retrieve(self, request, *args, **kwargs):
+        #  the proposal of an archived job is read from the archive
+        try:
+            instance = self.get_object()
+        except Http404:
+            archived_proposal = get_object_or_404(
+                ArchivedProposal.objects.select_related("freelancer"),
+                id=self.kwargs.get("proposal_id"), job_id=self.kwargs.get("job_id"))
+            return Response(RetrieveArchivedProposalSerializer(archived_proposal).data)
+        return Response(self.get_serializer(instance).data)
+
     def update(self, request, *args, **kwargs):
         #  override the default to enable us check if the freelancer updating this is then owner of the proposal
         instance = self.get_object()
@@ -408,67 +598,63 @@ class CreateContractAPIView(APIView):
         amount = serializer.validated_data.get("amount")
         start_date = serializer.validated_data.get("start_date")
         end_date = serializer.validated_data.get("end_date")
-        # customer wallet
-        customer_wallet = request.user.wallet
-        # check if the customer has up to the amount
-        if not customer_wallet.can_withdraw(amount):
-            return Response({"error": "You dont have up to this amount in your wallet"}, status=400)
-        #  check the job if it exists
-        job = Job.objects.filter(id=job_id, customer=self.request.user).first()
-        if not job:
-            return Response({"error": "Job does not exist"}, status=400)
-        #  get the freelancer id
-        proposal = job.proposal_set.filter(id=proposal_id).first()
-        if not proposal:
-            return Response({"error": "Proposal does not exist"}, status=400)
-        #   get the id of the freelancer
-        freelancer_id = proposal.freelancer.id
-        #  check if the freelance exist
-        freelancer = User.objects.filter(id=freelancer_id, user_type="FREELANCER").first()
-        if not freelancer:
-            return Response({"error": "Freelancer does not exist"}, status=400)
-
-        # check the freelancer proposal
-        freelancer_proposal = job.proposal_set.filter(freelancer=freelancer).first()
-        if not freelancer_proposal:
-            return Response(
-                {"error": "This freelancer hasn't made a proposal yet . please him/her to"}, status=400)
-        # Remove the money from the user balance
-        # check if a contract already exist
-        if Contract.objects.filter(job=job).exists():
-            return Response({"error": "This job already have a contract"}, status=400)
-        # before withdrawing i need to get the user previous balance
-        previous_balance = customer_wallet.balance
-        #  remove the money from the customer wallet for the project
-        if not customer_wallet.withdraw_balance(amount):
-            return Response({"error": "Error occurred"}, status=400)
-        #  the contract
-        contract = Contract.objects.create(
-            customer=self.request.user,
-            job=job,
-            freelancer=freelancer,
-            amount=amount,
-            start_date=start_date,
-            end_date=end_date,
-        )
-        #  once the contract has been created  we need to do three things which are
-        #  Accept the proposal if it is not
-        freelancer_proposal.proposal_stage = "ACCEPTED"
-        freelancer_proposal.save()
-        #  Create a transaction for the customer
-        transaction = Transaction.objects.create(
-            user=self.request.user,
-            transaction_id=uuid.uuid4(),
-            amount=amount,
-            transaction_stage="SUCCESSFUL",
-            transaction_type="DEBIT",
-            transaction_category="WITHDRAWAL",
-            previous_balance=previous_balance,
-            current_balance=customer_wallet.balance
-        )
-        #  Make the job_stage PROCESSING
-        job.project_stage = "PROCESSING"
-        job.save()
+        #  everything is done in one transaction, the job and the customer wallet are locked in this order
+        #  so two requests on the same job or wallet wait for each other instead of paying twice
+        with transaction.atomic():
+            #  check the job if it exists and if a contract already exist
+            job = Job.objects.select_for_update().filter(id=job_id, customer=self.request.user).annotate(
+                has_contract=Exists(Contract.objects.filter(job_id=OuterRef("id")))
+            ).first()
+            if not job:
+                return Response({"error": "Job does not exist"}, status=400)
+            if job.has_contract:
+                return Response({"error": "This job already have a contract"}, status=400)
+            #  get the proposal with the freelancer who made it
+            proposal = job.proposal_set.select_related("freelancer").filter(id=proposal_id).first()
+            if not proposal:
+                return Response({"error": "Proposal does not exist"}, status=400)
+            freelancer = proposal.freelancer
+            #  check if the freelance exist
+            if freelancer.user_type != "FREELANCER":
+                return Response({"error": "Freelancer does not exist"}, status=400)
+            # customer wallet
+            customer_wallet = Wallet.objects.select_for_update().filter(user=self.request.user).first()
+            # check if the customer has up to the amount
+            if not customer_wallet or not customer_wallet.can_withdraw(amount):
+                return Response({"error": "You dont have up to this amount in your wallet"}, status=400)
+            # before withdrawing i need to get the user previous balance
+            previous_balance = customer_wallet.balance
+            #  remove the money from the customer wallet for the project
+            customer_wallet.balance -= amount
+            customer_wallet.save(update_fields=["balance"])
+            #  the contract
+            Contract.objects.create(
+                id=uuid.uuid4(),
+                customer=self.request.user,
+                job=job,
+                freelancer=freelancer,
+                amount=amount,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            #  once the contract has been created  we need to do three things which are
+            #  Accept the proposal if it is not
+            proposal.proposal_stage = "ACCEPTED"
+            proposal.save(update_fields=["proposal_stage"])
+            #  Create a transaction for the customer
+            Transaction.objects.create(
+                user=self.request.user,
+                transaction_id=uuid.uuid4(),
+                amount=amount,
+                transaction_stage="SUCCESSFUL",
+                transaction_type="DEBIT",
+                transaction_category="WITHDRAWAL",
+                previous_balance=previous_balance,
+                current_balance=customer_wallet.balance
+            )
+            #  Make the job_stage PROCESSING
+            job.project_stage = "PROCESSING"
+            job.save(update_fields=["project_stage"])
         return Response({"message": "Contract successfully created"}, status=201)
 
 
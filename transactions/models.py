@@ -42,6 +42,12 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            #  used by the cursor pagination of the user transactions
+            models.Index(fields=["user", "-timestamp", "-id"], name="transactions_user_ts_id_idx"),
+            #  used by the payment approval and the webhooks which look up the transaction of the provider
+            models.Index(fields=["transaction_id", "transaction_stage"], name="transactions_provider_id_idx"),
+        ]
 
     def refund_balance(self):
         """
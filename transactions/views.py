@@ -3,6 +3,7 @@ from django.shortcuts import render
 # Create your views here.
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 
+from instasaw_api.paginators import TimestampCursorPagination
 from transactions.serializers import TransactionSerializer
 from users.permissions import LoggedInPermission
 
@@ -13,6 +14,7 @@ class TransactionListAPIView(ListAPIView):
     """
     serializer_class = TransactionSerializer
     permission_classes = [LoggedInPermission]
+    pagination_class = TimestampCursorPagination
 
     def get_queryset(self):
         #  show only the user transaction
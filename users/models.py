@@ -5,13 +5,34 @@ from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 from django.core.cache import cache
 from django.db import models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.db.models.signals import post_save
+from django.dispatch import Signal
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 
 
-class UserManager(BaseUserManager):
+#  sent with the ids of the users updated by a queryset update, which doesn't send post_save
+post_queryset_update = Signal()
+
+
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """
+        This sends post_queryset_update with the ids of the updated users,
+        so the caches of the users are invalidated like they are once a user is saved
+        """
+        user_ids = list(self.values_list("id", flat=True))
+        rows = super().update(**kwargs)
+        if user_ids:
+            post_queryset_update.send(sender=self.model, user_ids=user_ids)
+        return rows
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """
     This is used to add extra queryset or add more functionality to the user models
     by creating helper functions
@@ -174,3 +195,64 @@ def post_save_create_user_profile(sender, instance, *args, **kwargs):
 
 
 post_save.connect(post_save_create_user_profile, sender=User)
+
+
+#  the field counting the reviews of every number of stars
+STAR_COUNT_FIELDS = {
+    1: "one_star_count",
+    2: "two_stars_count",
+    3: "three_stars_count",
+    4: "four_stars_count",
+    5: "five_stars_count",
+}
+
+
+class FreelancerStatsManager(models.Manager):
+
+    def increment(self, user_id, **deltas):
+        """
+        This adds the deltas to the counters of the freelancer in one UPDATE and recomputes the average
+        from the new sum and count, the row is created if the freelancer doesn't have one yet
+        """
+        updates = {field: F(field) + delta for field, delta in deltas.items()}
+        #  the F() are the values before the update, so the deltas are added to compute the average
+        stars_sum = Cast(F("stars_sum") + deltas.get("stars_sum", 0), FloatField())
+        stars_count = F("stars_count") + deltas.get("stars_count", 0)
+        updates["average_stars"] = Coalesce(stars_sum / NullIf(stars_count, 0), Value(0.0))
+        if not self.filter(user_id=user_id).update(**updates):
+            self.get_or_create(user_id=user_id)
+            self.filter(user_id=user_id).update(**updates)
+
+
+class FreelancerStats(models.Model):
+    """
+    The rating summary of a freelancer which is updated once a review or a contract of the freelancer
+    is written, so the freelancers can be ordered by their rating without aggregating their reviews
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="freelancer_stats")
+    stars_count = models.PositiveIntegerField(default=0)
+    stars_sum = models.PositiveIntegerField(default=0)
+    average_stars = models.FloatField(default=0, db_index=True)
+    one_star_count = models.PositiveIntegerField(default=0)
+    two_stars_count = models.PositiveIntegerField(default=0)
+    three_stars_count = models.PositiveIntegerField(default=0)
+    four_stars_count = models.PositiveIntegerField(default=0)
+    five_stars_count = models.PositiveIntegerField(default=0)
+    completed_contracts_count = models.PositiveIntegerField(default=0, db_index=True)
+    objects = FreelancerStatsManager()
+
+
+def post_save_create_freelancer_stats(sender, instance, created, update_fields=None, *args, **kwargs):
+    """
+    This creates the stats of a freelancer once the user is created or switched to a freelancer, so every
+    freelancer has a stats row to order the directory on
+    """
+    if instance.user_type != "FREELANCER":
+        return
+    #  a save which doesn't touch the user type (e.g. the last login) can't have made a freelancer
+    if not created and update_fields is not None and "user_type" not in update_fields:
+        return
+    FreelancerStats.objects.get_or_create(user=instance)
+
+
+post_save.connect(post_save_create_freelancer_stats, sender=User)
@@ -1,5 +1,5 @@
 from allauth.account.adapter import get_adapter
-from users.models import User, UserProfile
+from users.models import User, UserProfile, FreelancerStats, STAR_COUNT_FIELDS
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import serializers
@@ -217,6 +217,36 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+class FreelancerStatsSerializer(serializers.ModelSerializer):
+    """
+    The rating summary of a freelancer, the histogram is the number of reviews of every number of stars
+    """
+    stars_histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FreelancerStats
+        fields = [
+            "stars_count",
+            "stars_sum",
+            "average_stars",
+            "stars_histogram",
+            "completed_contracts_count",
+        ]
+
+    def get_stars_histogram(self, obj):
+        return {stars: getattr(obj, field) for stars, field in STAR_COUNT_FIELDS.items()}
+
+
+class FreelancerProfileDetailSerializer(UserProfileDetailSerializer):
+    """
+    The profile of a freelancer with the rating summary of the freelancer
+    """
+    stats = FreelancerStatsSerializer(source="user.freelancer_stats", read_only=True)
+
+    class Meta(UserProfileDetailSerializer.Meta):
+        fields = UserProfileDetailSerializer.Meta.fields + ["stats"]
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     This returns little detail of the user which is currently used in blog post
@@ -1,6 +1,10 @@
+import uuid
+
 import requests
 from django.conf import settings
 
+from users.models import User
+
 PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
 PAYPAL_SECRET_KEY = settings.PAYPAL_SECRET_KEY
 PAYPAL_URL = settings.PAYPAL_URL
@@ -37,3 +41,17 @@ def generate_client_token():
     if response.status_code == 200:
         return response.json().get('client_token')
     return None
+
+
+def bulk_create_users(*user_types, email_prefix="user", **fields):
+    """
+    This creates a user of every user type passed with one query and returns them in the same order,
+    it is used to seed the tests and the benchmarks since bulk_create doesn't send the post_save signals
+    which contact PayPal. the fields passed are set on every user
+    """
+    users = []
+    for number, user_type in enumerate(user_types, start=1):
+        user_id = uuid.uuid4()
+        users.append(User(id=user_id, email=f"{email_prefix}-{user_id.hex}@instasaw.co", first_name=f"First{number}",
+                          last_name=f"Last{number}", user_type=user_type, **fields))
+    return User.objects.bulk_create(users)
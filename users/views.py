@@ -1,6 +1,7 @@
 from dj_rest_auth.registration.views import RegisterView
 from dj_rest_auth.views import LoginView
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import F
 from rest_framework import status
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.generics import ListAPIView, RetrieveAPIView
@@ -10,7 +11,7 @@ from rest_framework.views import APIView
 from users.models import User, UserProfile
 from users.permissions import NotLoggedInPermission, LoggedInPermission
 from users.serializers import VerifyEmailSerializer, UserProfileUpdateSerializer, UserProfileDetailSerializer, \
-    UserDetailSerializer, UserUpdateSerializer, TokenSerializer
+    UserDetailSerializer, UserUpdateSerializer, TokenSerializer, FreelancerProfileDetailSerializer
 
 
 class InstasawLoginAPIView(LoginView):
@@ -165,6 +166,25 @@ class UserProfileUpdateAPIView(APIView):
                   })
 
 
+def get_freelancer_profiles():
+    """
+    This returns the verified freelancers profiles with their stats which can be ordered by
+    ?ordering=-average_stars, -stars_count or -completed_contracts_count.
+    the stats are read from the freelancer stats table and ordered on its indexed columns, so there is
+    no aggregation of the reviews. every freelancer has a stats row (created with the freelancer or by
+    reconcile_freelancer_stats), which makes the join an inner join
+    """
+    return UserProfile.objects.verified_freelancers_profiles().filter(
+        user__freelancer_stats__isnull=False
+    ).select_related(
+        "user", "user__freelancer_stats"
+    ).annotate(
+        average_stars=F("user__freelancer_stats__average_stars"),
+        stars_count=F("user__freelancer_stats__stars_count"),
+        completed_contracts_count=F("user__freelancer_stats__completed_contracts_count"),
+    )
+
+
 class FreelancerListAPIView(ListAPIView):
     """
     This view returns list of all the freelancers, and it also has some filtering base
@@ -172,15 +192,17 @@ class FreelancerListAPIView(ListAPIView):
 
     using a filter backend for the filtering of the user and also the ordering filter
     SearchFilter : used for query
-    OrderingFilter : used for ordering
+    OrderingFilter : used for ordering, the freelancers can also be ordered by their stats
     DjangoFilterBackend : used for filtering with  keys like ?gender=MALE
     """
     model = UserProfile
-    queryset = UserProfile.objects.verified_freelancers_profiles()
+    queryset = get_freelancer_profiles()
     permission_classes = [LoggedInPermission]
-    serializer_class = UserProfileDetailSerializer
+    serializer_class = FreelancerProfileDetailSerializer
 
     filter_backends = [SearchFilter, OrderingFilter]
+    ordering_fields = [field for field in UserProfileDetailSerializer.Meta.fields if field != "user"] + [
+        "average_stars", "stars_count", "completed_contracts_count"]
     search_fields = [
         'user__first_name',
         'user__last_name',
@@ -195,17 +217,14 @@ class FreelancerListAPIView(ListAPIView):
     ]
 
     def get_queryset(self):
-        """this is getting the filtered queryset from search filter
-                 then adding more filtering   """
-        queryset = self.filter_queryset(self.queryset.all())
+        """the search filter and the ordering filter are applied by the list"""
         # FIXME: ASK QUESTION ON HOW THE QUERY WILL LOOK LIKE
-
-        return queryset
+        return self.queryset.all()
 
 
 class FreelancerDetailAPIView(RetrieveAPIView):
     # Get the detail of a freelancer using the id
     permission_classes = [LoggedInPermission]
-    serializer_class = UserProfileDetailSerializer
-    queryset = UserProfile.objects.verified_freelancers_profiles()
+    serializer_class = FreelancerProfileDetailSerializer
+    queryset = get_freelancer_profiles()
     lookup_field = "id"
@@ -18,3 +18,7 @@ class WebhookEvent(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            #  used by the cursor pagination of the webhook events
+            models.Index(fields=["-timestamp", "-id"], name="webhooks_event_ts_id_idx"),
+        ]
@@ -2,6 +2,7 @@ from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from instasaw_api.paginators import TimestampCursorPagination
 from transactions.models import Transaction
 from users.permissions import LoggedInPermission, LoggedInStaffPermission
 from webhooks.models import Webhook, WebhookEvent
@@ -119,6 +120,7 @@ class WebhookEventListAPIView(ListAPIView):
     serializer_class = WebhookEventSerializer
     queryset = WebhookEvent.objects.all()
     permission_classes = [LoggedInPermission & LoggedInStaffPermission]
+    pagination_class = TimestampCursorPagination
 
 
 class WebhookEventDetailAPIView(RetrieveAPIView):